@@ -26,13 +26,14 @@ export default function App() {
 
     fetch('/api/metadata/info')
       .then(r => r.ok ? r.json() : Promise.reject(r.statusText))
-      .then((data: { metadata: { database_name: string; tables: { table_name: string; columns: string[] }[] }[] }) => {
+      .then((data: { metadata: { database_name: string; tables: { schema_name: string; table_name: string; columns: string[] }[] }[] }) => {
         console.log("/api/metadata/info:", data.metadata);
 
         const formatted = data.metadata.map((db): DatabaseMetadataInfo => ({
           databaseName: db.database_name,
           tables: db.tables.map((t): TableInfo => ({
-            tableName: t.table_name,
+            // Tables of other schemas are shown qualified, as they are written in SQL.
+            tableName: t.schema_name === "public" ? t.table_name : `${t.schema_name}.${t.table_name}`,
             columns: t.columns
           }))
         }));
@@ -50,6 +50,11 @@ export const QueryResultModal: React.FC<QueryResultModalProps> = ({ isOpen, onCl
             <div className="qrm-modal" onClick={(e) => e.stopPropagation()}>
                 <div className="qrm-header">
                     <h3>Query Result</h3>
+                    {data?.has_more && (
+                        <span className="qrm-note">
+                            First {data.result.length} rows of ~{data.total_estimate}
+                        </span>
+                    )}
                     <button className="qrm-close" onClick={onClose}>×</button>
                 </div>
                 <div className="qrm-content">
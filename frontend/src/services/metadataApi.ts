@@ -28,33 +28,110 @@ export async function getDatabaseAddress(name: string): Promise<string> {
 }
 
 export async function getDatabasesWithAddress(): Promise<DatabaseInfo[]> {
-  const rows = await getDatabaseRows();
-
-  const settled = await Promise.allSettled(
-    rows.map((r) => getDatabaseAddress(r.name))
-  );
-
-  return rows.map((r, i) => {
-    const s = settled[i];
-    return {
-      id: r.id,
-      name: r.name,
-      address: s.status === "fulfilled" ? s.value : "(unavailable)",
-    };
+  // One request for the whole list instead of one address request per database.
+  const res = await api.get<(DatabaseRow & { address: string | null })[]>("/databases", {
+    params: { include: "address" },
   });
+  return res.data.map((r) => ({
+    id: r.id,
+    name: r.name,
+    address: r.address ?? "(unavailable)",
+  }));
 }
 
 export async function getDatabases(): Promise<DatabaseInfo[]> {
   return getDatabasesWithAddress();
 }
 
-export async function addDatabaseByDsn(dsn: string): Promise<void> {
+/** One page of a drill-down list; `nextCursor` is null on the last page. */
+export interface Page<T> {
+  items: T[];
+  nextCursor: string | null;
+}
+
+/** /api/databases/{name}/tables */
+export interface TableRow {
+  id: number;
+  database_id: number;
+  schema_name: string;
+  name: string;
+}
+
+/** /api/tables/{id}/columns */
+export interface ColumnRow {
+  id: number;
+  table_id: number;
+  name: string;
+  data_type: string;
+}
+
+async function getPage<T>(url: string, limit?: number, cursor?: string | null): Promise<Page<T>> {
+  const res = await api.get<T[]>(url, { params: { limit, cursor: cursor ?? undefined } });
+  return { items: res.data, nextCursor: res.headers["x-next-cursor"] ?? null };
+}
+
+export async function getDatabaseTables(name: string, limit?: number, cursor?: string | null): Promise<Page<TableRow>> {
+  return getPage<TableRow>(`/databases/${encodeURIComponent(name)}/tables`, limit, cursor);
+}
+
+export async function getTableColumns(tableId: number, limit?: number, cursor?: string | null): Promise<Page<ColumnRow>> {
+  return getPage<ColumnRow>(`/tables/${tableId}/columns`, limit, cursor);
+}
+
+/** /api/metadata/search */
+export interface SearchHit {
+  kind: "table" | "column";
+  database_id: number;
+  database_name: string;
+  schema_name: string;
+  table_name: string;
+  column_name: string | null;
+  data_type: string | null;
+  score: number;
+}
+
+export async function searchMetadata(
+  q: string,
+  options: { limit?: number; database?: string; kind?: "table" | "column" } = {}
+): Promise<SearchHit[]> {
+  const res = await api.get<SearchHit[]>("/metadata/search", { params: { q, ...options } });
+  return res.data;
+}
+
+/** /api/metadata/fill/jobs/{id} */
+export interface FillJob {
+  id: number;
+  status: "queued" | "running" | "done" | "failed";
+  phase: string | null;
+  progress: Record<string, number>;
+  result: Record<string, number> | null;
+  error: string | null;
+}
+
+const FILL_JOB_POLL_MS = 500;
+
+export async function getFillJob(id: number): Promise<FillJob> {
+  const res = await api.get<FillJob>(`/metadata/fill/jobs/${id}`);
+  return res.data;
+}
+
+/** Fill runs as background job on server: queue it and wait until it is finished. */
+export async function addDatabaseByDsn(dsn: string, onProgress?: (job: FillJob) => void): Promise<void> {
+  let job: FillJob;
   try {
-    await api.post("/metadata/fill", { dsn });
+    job = (await api.post<FillJob>("/metadata/fill/jobs", { dsn })).data;
+    while (job.status === "queued" || job.status === "running") {
+      onProgress?.(job);
+      await new Promise((resolve) => setTimeout(resolve, FILL_JOB_POLL_MS));
+      job = await getFillJob(job.id);
+    }
   } catch (err: any) {
     console.error("Failed to fill metadata:", err);
     throw new Error(err.response?.data?.detail ?? "Request failed");
   }
+  if (job.status === "failed") {
+    throw new Error(job.error ?? "Fill failed");
+  }
 }
 
 export async function executeQuery(databaseName: string, sqlQuery: string) {
@@ -1,7 +1,15 @@
 from fastapi import APIRouter
 
+from manager.services.metadata_db.pool import get_pool
+from manager.services.metadata_db.target_pool import target_pools
+
 router = APIRouter()
 
 @router.get("/health")
-def health():
-    return {"status": "ok"}
\ No newline at end of file
+async def health():
+    return {"status": "ok"}
+
+@router.get("/health/pools")
+async def pools():
+    """Live connection pool stats: metadata database and every target database."""
+    return {"metadata": get_pool().stats(), "targets": target_pools.stats()}
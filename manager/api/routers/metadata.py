@@ -1,40 +1,260 @@
+import anyio
+import base64
+import json
+import time
 from datetime import datetime
-from typing import List
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
-from manager.schemas.metadata import Database 
-from manager.services.metadata_db.query import execute_query
-from manager.services.metadata_db.repo import list_databases, get_database_address_by_name, list_saved_query, list_tables, list_columns
+from manager.schemas.metadata import Column, Database, DatabaseView, FillJob, SavedQueryView, SearchHit, Table
+from manager.services.metadata_db.aio import iterate_target, run_metadata, run_target
+from manager.services.metadata_db.cache import metadata_cache
+from manager.services.metadata_db.history import query_log
+from manager.services.metadata_db.lookup import database_lookup
+from manager.services.metadata_db.jobs import FINISHED, enqueue_fill_job, get_fill_job
+from manager.config import settings
+from manager.services.metadata_db.query import QueryPage, decode_page_cursor, encode_page_cursor, execute_query_page, stream_query
+from manager.services.metadata_db.result_cache import query_cache
+from manager.services.metadata_db.search import search_index
+from manager.services.metadata_db.tx import pinned
+from manager.services.metadata_db.repo import get_table, list_columns, list_saved_query, list_tables
 
-from manager.services.metadata_db.writer import fill_metadata_from_dsn, save_query
+from manager.services.metadata_db.writer import FillOutcome, SyncResult, fill_metadata_batch, fill_metadata_from_dsn, resync_database
 
 router = APIRouter()
 
-@router.get("/databases", response_model=List[Database])
-def get_databases():
-    dbs: List[Database] = list_databases()
-    return dbs
+def _not_modified(request: Request, etag: str) -> bool:
+    """Check If-None-Match of request against current ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+def _encode_cursor(payload: Dict[str, Any]) -> str:
+    """Opaque page token: keyset of the last row of a page."""
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str, keyset: Callable[[Dict[str, Any]], Any]) -> Any:
+    """Keyset of page token, built by `keyset` from decoded payload; 400 on a foreign token."""
+    try:
+        return keyset(json.loads(base64.urlsafe_b64decode(cursor.encode("ascii"))))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Malformed cursor.")
+
+def _page(response: Response, rows: list, limit: int, keyset) -> list:
+    """Cut one extra row fetched past `limit`; token of the next page goes to X-Next-Cursor header."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(keyset(rows[-1]))
+    return rows
+
+async def _database_by_name(name: str) -> Database:
+    _, dbs = await run_metadata(metadata_cache.databases)
+    for db in dbs:
+        if db.name == name:
+            return db
+    raise HTTPException(status_code=404, detail=f"Database {name} not found.")
+
+def _database_views(include: Optional[str]) -> List[DatabaseView]:
+    if include == "address":
+        # Whole list from the lookup cache: one query instead of one request per database.
+        return [DatabaseView(id=entry.database.id, name=entry.database.name, address=entry.address)
+                for entry in database_lookup.entries()]
+    _, dbs = metadata_cache.databases()
+    return [DatabaseView(id=db.id, name=db.name) for db in dbs]
+
+@router.get("/databases", response_model=List[DatabaseView], response_model_exclude_unset=True)
+async def get_databases(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=settings.METADATA_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    include: Optional[Literal["address"]] = None,
+):
+    """
+    All databases, or one page of them when `limit` is given (next page token in X-Next-Cursor).
+    `include=address` adds domain:port of every database.
+    """
+    etag = metadata_cache.etag
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    dbs = await run_metadata(_database_views, include)
+    response.headers["ETag"] = etag
+    if limit is None:
+        return dbs
+    after = None if cursor is None else _decode_cursor(cursor, lambda payload: int(payload["id"]))
+    dbs = [db for db in dbs if after is None or db.id > after]
+    return _page(response, dbs[:limit + 1], limit, lambda db: {"id": db.id})
+
+@router.get("/databases/{name}/tables", response_model=List[Table])
+async def get_database_tables(
+    name: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(settings.METADATA_PAGE_DEFAULT_LIMIT, ge=1, le=settings.METADATA_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+):
+    """Tables of one database ordered by schema and name, one page at a time."""
+    etag = metadata_cache.etag
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    db = await _database_by_name(name)
+    after = None if cursor is None else _decode_cursor(
+        cursor, lambda payload: (str(payload["schema_name"]), str(payload["name"])))
+    # One extra row tells whether there is a next page.
+    tables = await run_metadata(list_tables, db, limit=limit + 1, after=after)
+    response.headers["ETag"] = etag
+    return _page(response, tables, limit, lambda table: {"schema_name": table.schema_name, "name": table.name})
+
+def _table_columns(table_id: int, limit: int, after: Optional[int]) -> Optional[List[Column]]:
+    # Both lookups on one connection.
+    with pinned(readonly=True):
+        table = get_table(table_id)
+        return None if table is None else list_columns(table, limit=limit, after=after)
+
+@router.get("/tables/{table_id}/columns", response_model=List[Column])
+async def get_table_columns(
+    table_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(settings.METADATA_PAGE_DEFAULT_LIMIT, ge=1, le=settings.METADATA_PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+):
+    """Columns of one table in catalog order, one page at a time."""
+    etag = metadata_cache.etag
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    after = None if cursor is None else _decode_cursor(cursor, lambda payload: int(payload["id"]))
+    columns = await run_metadata(_table_columns, table_id, limit + 1, after)
+    if columns is None:
+        raise HTTPException(status_code=404, detail=f"Table {table_id} not found.")
+    response.headers["ETag"] = etag
+    return _page(response, columns, limit, lambda column: {"id": column.id})
 
 @router.get("/databases/{name}/address", response_model=str)
-def get_database_address(name: str):
-    addr = get_database_address_by_name(name)
-    return addr
+async def get_database_address(name: str):
+    entry = await run_metadata(database_lookup.get, name)
+    if entry is None or entry.address is None:
+        raise HTTPException(status_code=404, detail=f"Database {name} not found.")
+    return entry.address
 
 class FillRequest(BaseModel):
     dsn: str
 
 @router.post("/metadata/fill")
-def fill_metadata(req: FillRequest):
+async def fill_metadata(req: FillRequest):
     try:
-        fill_metadata_from_dsn(req.dsn)
+        await run_target(fill_metadata_from_dsn, req.dsn)
         return {"status": "ok", "dsn": req.dsn}
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/metadata/fill/jobs", response_model=FillJob, status_code=202)
+async def enqueue_fill_job_endpoint(req: FillRequest):
+    """Queue fill in background; poll GET /metadata/fill/jobs/{id} (or its /events stream) for progress."""
+    return await run_metadata(enqueue_fill_job, req.dsn)
+
+@router.get("/metadata/fill/jobs/{job_id}", response_model=FillJob)
+async def get_fill_job_endpoint(job_id: int):
+    job = await run_metadata(get_fill_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Fill job {job_id} not found.")
+    return job
+
+async def _job_events(job: FillJob) -> AsyncIterator[str]:
+    job_id = job.id
+    while True:
+        yield f"data: {job.model_dump_json()}\n\n"
+        if job.status in FINISHED:
+            return
+        previous = job
+        while job == previous:
+            await anyio.sleep(settings.FILL_JOB_EVENTS_INTERVAL)
+            job = await run_metadata(get_fill_job, job_id)
+        if job is None:
+            # Row deleted while streaming: final event instead of a broken stream.
+            yield f"event: gone\ndata: {json.dumps({'id': job_id})}\n\n"
+            return
+
+@router.get("/metadata/fill/jobs/{job_id}/events")
+async def fill_job_events(job_id: int):
+    """Server-sent events: job state on every change, until job is finished."""
+    job = await run_metadata(get_fill_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Fill job {job_id} not found.")
+    return StreamingResponse(_job_events(job), media_type="text/event-stream")
+
+class FillBatchRequest(BaseModel):
+    dsns: List[str] = Field(..., min_length=1)
+    # Sources filled at the same time; FILL_BATCH_WORKERS when not set.
+    workers: Optional[int] = Field(None, ge=1)
+
+class FillOutcomeView(BaseModel):
+    dsn: str
+    status: str
+    seconds: float
+    error: Optional[str] = None
+    tables_inserted: int = 0
+    tables_updated: int = 0
+    tables_deleted: int = 0
+    tables_unchanged: int = 0
+
+class FillBatchView(BaseModel):
+    status: str
+    seconds: float
+    results: List[FillOutcomeView]
+
+@router.post("/metadata/fill/batch", response_model=FillBatchView)
+async def fill_metadata_batch_endpoint(req: FillBatchRequest):
+    """Fill metadata from many DSNs concurrently; failure of one source is reported, not raised."""
+    workers = min(req.workers or settings.FILL_BATCH_WORKERS, settings.FILL_BATCH_WORKERS)
+    started = time.monotonic()
+    outcomes: List[FillOutcome] = await run_target(fill_metadata_batch, req.dsns, workers)
+    results = []
+    for outcome in outcomes:
+        if outcome.result is None:
+            results.append(FillOutcomeView(dsn=outcome.dsn, status="error", seconds=outcome.seconds, error=outcome.error))
+            continue
+        results.append(FillOutcomeView(dsn=outcome.dsn, status="ok", seconds=outcome.seconds,
+                                       tables_inserted=outcome.result.tables_inserted,
+                                       tables_updated=outcome.result.tables_updated,
+                                       tables_deleted=outcome.result.tables_deleted,
+                                       tables_unchanged=outcome.result.tables_unchanged))
+    status = "ok" if all(r.status == "ok" for r in results) else "partial"
+    return FillBatchView(status=status, seconds=time.monotonic() - started, results=results)
+
+class ResyncView(BaseModel):
+    database_name: str
+    tables_inserted: int
+    tables_updated: int
+    tables_deleted: int
+    tables_unchanged: int
+
+@router.post("/databases/{name}/resync", response_model=ResyncView)
+async def resync_metadata(name: str):
+    entry = await run_metadata(database_lookup.get, name)
+    if entry is None or entry.credentials is None:
+        raise HTTPException(status_code=404, detail=f"Database {name} not found or registered without credentials.")
+    try:
+        result: SyncResult = await run_target(resync_database, name)
+        return ResyncView(database_name=result.database.name,
+                          tables_inserted=result.tables_inserted,
+                          tables_updated=result.tables_updated,
+                          tables_deleted=result.tables_deleted,
+                          tables_unchanged=result.tables_unchanged)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=400, detail=str(e))
     
 class TableSimpleView(BaseModel):
+    schema_name: str
     table_name: str
     columns: List[str]
 
@@ -46,48 +266,130 @@ class MetadataInfoSimpleView(BaseModel):
     metadata: List[DatabaseMetadataInfo]
 
 @router.get("/metadata/info", response_model=MetadataInfoSimpleView)
-def get_metadata_info():
-    metadata_info_simple_view: MetadataInfoSimpleView = MetadataInfoSimpleView(metadata=[])
-    databases: List[Database] = list_databases()
-    for db in databases:
-        db_metadata_info: DatabaseMetadataInfo = DatabaseMetadataInfo(database_name=db.name, tables=[])
-        tables = list_tables(db)
-        for table in tables:
-            columns = list_columns(table)
-            columns_names: List[str] = [col.name for col in columns]
-            db_metadata_info.tables.append(TableSimpleView(table_name=table.name, columns=columns_names))
-        metadata_info_simple_view.metadata.append(db_metadata_info)
-    return metadata_info_simple_view
+async def get_metadata_info(request: Request, response: Response):
+    etag, trees = await run_metadata(metadata_cache.trees)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return MetadataInfoSimpleView(metadata=[
+        DatabaseMetadataInfo(
+            database_name=tree.database.name,
+            tables=[
+                TableSimpleView(schema_name=table_tree.table.schema_name, table_name=table_tree.table.name,
+                                columns=[col.name for col in table_tree.columns])
+                for table_tree in tree.tables
+            ],
+        )
+        for tree in trees
+    ])
+
+@router.get("/metadata/search", response_model=List[SearchHit])
+async def search_metadata(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(settings.SEARCH_DEFAULT_LIMIT, ge=1, le=settings.SEARCH_MAX_LIMIT),
+    database: Optional[str] = None,
+    kind: Optional[Literal["table", "column"]] = None,
+):
+    """Tables and columns whose name (or data type) matches `q`, best match first, fuzzy."""
+    return await run_metadata(search_index.search, q, limit=limit, database_name=database, kind=kind)
 
 class ExecuteSqlRequest(BaseModel):
     database_name: str
     sql_query: str
+    # Page of result; QUERY_DEFAULT_LIMIT rows when not set.
+    limit: Optional[int] = Field(None, ge=1)
+    offset: int = Field(0, ge=0)
+    # Continuation token from previous page (next_cursor), overrides offset.
+    cursor: Optional[str] = None
+    # Oldest cached result (in seconds) that is acceptable; 0 always runs the query.
+    max_staleness: Optional[float] = Field(None, ge=0)
 
 @router.post("/metadata/execute")
-def fill_metadata(req: ExecuteSqlRequest):
+async def fill_metadata(req: ExecuteSqlRequest, response: Response):
+    try:
+        limit = min(req.limit or settings.QUERY_DEFAULT_LIMIT, settings.QUERY_MAX_LIMIT)
+        offset = req.offset if req.cursor is None else decode_page_cursor(req.sql_query, req.cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         # TODO: SQL Injection can be here?
-        query_execution_result = execute_query(req.database_name, req.sql_query)
-        save_query(req.database_name, req.sql_query)
-        return {"status": "ok", "result": query_execution_result }
+        use_cache = query_cache.enabled and query_cache.cacheable(req.sql_query)
+        cache_key = query_cache.key(req.database_name, req.sql_query, offset, limit)
+        cached = query_cache.get(cache_key, req.max_staleness) if use_cache else None
+        if cached is not None:
+            page, age = cached
+            response.headers["X-Cache"] = "HIT"
+            response.headers["Age"] = str(int(age))
+        else:
+            try:
+                page: QueryPage = await run_target(execute_query_page, req.database_name, req.sql_query, limit, offset)
+            except Exception as e:
+                # Same shape as before: query errors are reported inside result.
+                return {"status": "ok", "result": {"status": "error", "message": str(e)}}
+            if use_cache:
+                query_cache.put(cache_key, page)
+                response.headers["X-Cache"] = "MISS"
+        await run_metadata(query_log.log, req.database_name, req.sql_query)
+        return {
+            "status": "ok",
+            "result": page.rows,
+            "offset": page.offset,
+            "has_more": page.has_more,
+            "next_cursor": encode_page_cursor(req.sql_query, offset + len(page.rows)) if page.has_more else None,
+            "total_estimate": page.total_estimate,
+        }
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=400, detail=str(e))
 
+async def _ndjson(first: Optional[Dict[str, Any]], rows: Iterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    if first is None:
+        await run_target(rows.close)
+        return
+    yield json.dumps(jsonable_encoder(first)) + "\n"
+    async for chunk in iterate_target(rows, settings.QUERY_STREAM_ITERSIZE):
+        yield "".join(json.dumps(jsonable_encoder(row)) + "\n" for row in chunk)
+
+@router.post("/metadata/execute/stream")
+async def execute_stream(req: ExecuteSqlRequest):
+    """Stream result rows as NDJSON (one JSON object per line); memory use doesn't depend on result size."""
+    rows = stream_query(req.database_name, req.sql_query)
+    try:
+        # Run query before response starts, so errors still become HTTP 400.
+        first = await run_target(next, rows, None)
+        await run_metadata(query_log.log, req.database_name, req.sql_query)
+    except Exception as e:
+        await run_target(rows.close)
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(_ndjson(first, rows), media_type="application/x-ndjson")
+
 class DatabaseExecuteSqlRequest(BaseModel):
     database_name: str
     sql_query: str
     created_at: datetime
     
 @router.get("/metadata/query_list", response_model=List[DatabaseExecuteSqlRequest])
-def get_metadata_info():
-    query_list = list_saved_query()
-    result: List[DatabaseExecuteSqlRequest] = []
-    
-    databases = list_databases()
-    id_to_name = {item.id: item.name for item in databases}
-    for query in query_list:
-        database_name = id_to_name[query.database_id]
-        result.append(DatabaseExecuteSqlRequest(database_name=database_name, sql_query=query.sql_query, created_at=query.created_at))
-    return result
\ No newline at end of file
+async def get_metadata_info(
+    response: Response,
+    limit: int = Query(settings.QUERY_HISTORY_DEFAULT_LIMIT, ge=1, le=settings.QUERY_HISTORY_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    database: Optional[str] = None,
+    q: Optional[str] = None,
+):
+    """
+    Saved queries, newest first, one page at a time.
+    Token for the next page (if any) is returned in X-Next-Cursor header.
+    """
+    before = None if cursor is None else _decode_cursor(
+        cursor, lambda payload: (datetime.fromisoformat(payload["created_at"]), int(payload["id"])))
+    # One extra row tells whether there is a next page.
+    query_list = await run_metadata(list_saved_query, limit=limit + 1, before=before,
+                                    database_name=database, search=q or None)
+    query_list = _page(response, query_list, limit,
+                       lambda query: {"created_at": query.created_at.isoformat(), "id": query.id})
+    return [DatabaseExecuteSqlRequest(database_name=query.database_name, sql_query=query.sql_query, created_at=query.created_at)
+            for query in query_list]
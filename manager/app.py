@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+import anyio
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
@@ -5,16 +7,45 @@ from fastapi.staticfiles import StaticFiles
 from manager.config import settings
 from manager.api.routers import health
 from manager.api.routers import metadata
+from manager.services.metadata_db.history import query_log
+from manager.services.metadata_db.jobs import FillJobWorker
+from manager.services.metadata_db.migrate import migrate
+from manager.services.metadata_db.notify import MetadataListener
 from manager.services.metadata_db.pool import init_pool
+from manager.services.metadata_db.target_pool import target_pools
 
 def create_app(test_dsn: str | None = None) -> FastAPI:
-    app = FastAPI(title="meta-database manager", debug=settings.DEBUG)
+    dsn = settings.METADB_DSN if test_dsn is None else test_dsn
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if settings.MIGRATE_ON_STARTUP:
+            await anyio.to_thread.run_sync(migrate, dsn)
+        # Other workers change metadata too: keep local caches coherent via LISTEN/NOTIFY.
+        listener = None
+        if settings.METADATA_LISTEN:
+            listener = MetadataListener(dsn)
+            listener.start()
+        workers = [FillJobWorker() for _ in range(settings.FILL_JOB_WORKERS)]
+        for worker in workers:
+            worker.start()
+        query_log.start()
+        yield
+        for worker in workers:
+            worker.stop()
+        # Pending query history is written before exit.
+        query_log.stop()
+        if listener is not None:
+            listener.stop()
+        target_pools.close_all()
+
+    app = FastAPI(title="meta-database manager", debug=settings.DEBUG, lifespan=lifespan)
     
     # TODO: Initialize pool with db connection. Is it correct?
-    if test_dsn is None:
-        init_pool(settings.METADB_DSN)
-    else:
-        init_pool(test_dsn)
+    # Every worker thread (see services/metadata_db/aio.py) and batch fill worker may hold one metadata connection,
+    # fill job worker two of them (fill transaction and progress reports), query history writer one.
+    init_pool(dsn, maxconn=settings.METADATA_DB_THREADS + settings.TARGET_DB_THREADS + settings.FILL_BATCH_WORKERS
+              + 2 * settings.FILL_JOB_WORKERS + 1)
 
     app.include_router(health.router, tags=["health"])
     app.include_router(metadata.router, tags=["metadata"], prefix="/api")
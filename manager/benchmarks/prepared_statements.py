@@ -0,0 +1,102 @@
+"""
+Latency of hot metadata endpoints with and without prepared statements.
+
+    python -m manager.benchmarks.prepared_statements [--dsn DSN] [--fill DSN ...] [--requests N]
+
+App runs in process (TestClient, no network) against metadata database `--dsn`, which is
+migrated first; `--fill` registers given sources. Metadata tree cache is dropped before every
+/api/metadata/info request and database lookup cache before every address request, so each
+one reaches the database. Repo functions behind the endpoints are measured directly as well:
+there the difference isn't diluted by HTTP handling.
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List, Optional
+
+from fastapi.testclient import TestClient
+
+from manager.app import create_app
+from manager.config import settings
+from manager.services.metadata_db.cache import metadata_cache
+from manager.services.metadata_db.lookup import database_lookup
+from manager.services.metadata_db.migrate import migrate
+from manager.services.metadata_db.repo import get_database_address_by_name, load_metadata_tree
+from manager.services.metadata_db.writer import fill_metadata_from_dsn
+
+
+def _measure(client: TestClient, url: str, requests: int, before: Optional[Callable[[], None]] = None) -> List[float]:
+    timings = []
+    for _ in range(requests):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - started)
+        response.raise_for_status()
+    return timings
+
+
+def _measure_call(call: Callable[[], object], requests: int) -> List[float]:
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _summary(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    return {
+        "mean": statistics.fmean(timings) * 1000,
+        "p50": timings[len(timings) // 2] * 1000,
+        "p95": timings[int(len(timings) * 0.95)] * 1000,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dsn", default=settings.METADB_DSN, help="metadata database (METADB_DSN by default)")
+    parser.add_argument("--fill", nargs="*", default=[], help="sources to register before measuring")
+    parser.add_argument("--database", default=None, help="database of address endpoint (first one by default)")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint and mode")
+    args = parser.parse_args(argv)
+
+    migrate(args.dsn)
+    client = TestClient(create_app(test_dsn=args.dsn))
+    for dsn in args.fill:
+        fill_metadata_from_dsn(dsn)
+    database = args.database or client.get("/api/databases").json()[0]["name"]
+
+    endpoints = {
+        "/api/metadata/info": metadata_cache.invalidate,
+        # Served from the lookup cache otherwise: both modes would time cache hits.
+        f"/api/databases/{database}/address": database_lookup.invalidate,
+    }
+    calls = {
+        "repo: load_metadata_tree()": load_metadata_tree,
+        "repo: get_database_address_by_name()": lambda: get_database_address_by_name(database),
+    }
+    results = {}
+    for enabled in (False, True):
+        settings.METADATA_PREPARED_STATEMENTS = enabled
+        for url, before in endpoints.items():
+            # Warm up: pool connections, PREPARE on each of them.
+            _measure(client, url, 20, before)
+            results[url, enabled] = _summary(_measure(client, url, args.requests, before))
+        for name, call in calls.items():
+            _measure_call(call, 20)
+            results[name, enabled] = _summary(_measure_call(call, args.requests))
+
+    print(f"{'endpoint':45} {'mode':9} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for name in [*endpoints, *calls]:
+        for enabled in (False, True):
+            row = results[name, enabled]
+            print(f"{name:45} {'prepared' if enabled else 'plain':9} {row['mean']:8.3f} {row['p50']:8.3f} {row['p95']:8.3f}")
+        plain, prepared = results[name, False]["mean"], results[name, True]["mean"]
+        print(f"{name:45} {'speedup':9} {plain / prepared:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -35,6 +35,17 @@ class ForeignKeyInfo(TypedDict):
     column_pairs: List[Tuple[str, str]]
 
 
+class TableMetadata(TypedDict):
+    """Everything extracted for one table: columns, primary keys and foreign keys."""
+    columns: List[ColumnInfo]
+    primary_keys: List[PrimaryKeyInfo]
+    foreign_keys: List[ForeignKeyInfo]
+
+
+# (schema, table_name) -> TableMetadata
+Catalog = Dict[Tuple[str, str], TableMetadata]
+
+
 class BaseExtractor(ABC):
     """
     Abstract base class for metadata extractors across engines (Postgres/MySQL/MSSQL/...).
@@ -131,3 +142,21 @@ class BaseExtractor(ABC):
     ) -> Iterable[TableInfo]:
         """Default wrapper over list_tables; override for cursor-based streaming if needed."""
         return iter(self.list_tables(database, schemas=schemas, include_system_schemas=include_system_schemas))
+
+    # ---- optional: bulk variant for big catalogs ----
+    def extract_catalog(self, database: Optional[str] = None) -> Catalog:
+        """
+        Return columns, primary keys and foreign keys of every table keyed by (schema, table_name).
+
+        Default implementation calls the per-table methods; engines should override it
+        with a few catalog-wide queries to avoid a round trip per table.
+        """
+        catalog: Catalog = {}
+        for table in self.list_tables(database):
+            schema, table_name = table["schema"], table["table_name"]
+            catalog[(schema, table_name)] = TableMetadata(
+                columns=self.list_columns(schema, table_name),
+                primary_keys=self.list_primary_keys(schema, table_name),
+                foreign_keys=self.list_foreign_keys(schema, table_name),
+            )
+        return catalog
@@ -1,17 +1,28 @@
 import psycopg2
-from typing import List, Dict, Any
-from manager.core.extractor.base import BaseExtractor, ColumnInfo, ForeignKeyInfo, PrimaryKeyInfo
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+from manager.core.extractor.base import BaseExtractor, Catalog, ColumnInfo, ForeignKeyInfo, PrimaryKeyInfo, TableMetadata
 
 class PostgresExtractor(BaseExtractor):
     """
     PostgreSQL implementation of BaseExtractor.
     Provides methods to extract metadata using information_schema and pg_catalog.
+
+    Columns, primary keys and foreign keys are read for the whole database at once
+    (see extract_catalog()); per-table methods are views over that snapshot.
+
+    With `workers` > 1 schemas are split between several connections that share
+    one exported snapshot; `max_connections` caps connections opened to the source.
     """
 
-    def __init__(self, conn_params: Dict[str, Any]):
+    def __init__(self, conn_params: Dict[str, Any], workers: int = 1, max_connections: int = 1):
         super().__init__(conn_params)
         self.conn = None
         self.cursor = None
+        self.workers = workers
+        self.max_connections = max_connections
+        # Bulk snapshot of the catalog, see extract_catalog().
+        self._catalog: Optional[Catalog] = None
 
     def connect(self):
         """Establish connection to the PostgreSQL database."""
@@ -27,6 +38,7 @@ class PostgresExtractor(BaseExtractor):
             self.conn.close()
         self.cursor = None
         self.conn = None
+        self._catalog = None
 
     # -------------------------
     # Metadata extraction
@@ -70,40 +82,9 @@ class PostgresExtractor(BaseExtractor):
     ) -> List[ColumnInfo]:
         """
         Return columns with types and nullability. Include ordinal_position for stable ordering.
+        Thin view over extract_catalog().
         """
-        self.connect()
-
-        query = """--sql
-            SELECT
-                a.attnum AS ordinal_position,
-                a.attname AS column_name,
-                pg_catalog.format_type(a.atttypid, a.atttypmod) AS formatted_type,
-                NOT a.attnotnull AS is_nullable,
-                pg_catalog.pg_get_expr(ad.adbin, ad.adrelid) AS column_default
-            FROM pg_catalog.pg_attribute a
-            JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
-            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
-            LEFT JOIN pg_catalog.pg_attrdef ad
-                ON ad.adrelid = a.attrelid AND ad.adnum = a.attnum
-            WHERE n.nspname = %s
-            AND c.relname = %s
-            AND a.attnum > 0
-            AND NOT a.attisdropped
-            ORDER BY a.attnum;
-        """
-        self.cursor.execute(query, (table_schema, table_name))
-        rows = self.cursor.fetchall()
-
-        return [
-            ColumnInfo(
-                name=r[1],
-                data_type=r[2],
-                is_nullable=bool(r[3]),
-                ordinal_position=int(r[0]),
-                default=r[4],
-            )
-            for r in rows
-        ]
+        return self._table_metadata(table_schema, table_name)["columns"]
 
     def list_primary_keys(
         self,
@@ -113,41 +94,9 @@ class PostgresExtractor(BaseExtractor):
         """
         Return primary key definitions. For most engines it's 0 or 1 rows per table,
         but keep List for flexibility and future extension.
+        Thin view over extract_catalog().
         """
-        query = """--sql
-            SELECT
-                tc.constraint_name,
-                kcu.column_name,
-                kcu.ordinal_position
-            FROM information_schema.table_constraints AS tc
-            JOIN information_schema.key_column_usage AS kcu
-                ON tc.constraint_name = kcu.constraint_name
-                AND tc.table_schema = kcu.table_schema
-            WHERE tc.constraint_type = 'PRIMARY KEY'
-            AND tc.table_schema = %s
-            AND tc.table_name = %s
-            ORDER BY kcu.ordinal_position;
-        """
-
-        with self.conn.cursor() as cur:
-            cur.execute(query, (table_schema, table_name))
-            rows = cur.fetchall()
-
-        if not rows:
-            return []
-
-        pk_map = {}
-        for constraint_name, column_name, ordinal_position in rows:
-            if constraint_name not in pk_map:
-                pk_map[constraint_name] = {
-                    "constraint_name": constraint_name,
-                    "columns": [],
-                    "ordinal_positions": [],
-                }
-            pk_map[constraint_name]["columns"].append(column_name)
-            pk_map[constraint_name]["ordinal_positions"].append(ordinal_position)
-
-        return list(pk_map.values())
+        return self._table_metadata(table_schema, table_name)["primary_keys"]
 
     def list_foreign_keys(
         self,
@@ -157,46 +106,145 @@ class PostgresExtractor(BaseExtractor):
         """
         Return foreign keys, preserving column order. Include referenced schema/table
         and a column mapping (src->tgt).
+        Thin view over extract_catalog().
         """
-        sql = """--sql
-            SELECT
-                con.conname AS constraint_name,
-                src_ns.nspname AS src_schema,
-                src_rel.relname AS src_table,
-                tgt_ns.nspname AS tgt_schema,
-                tgt_rel.relname AS tgt_table,
-                src_att.attname AS src_col,
-                tgt_att.attname AS tgt_col,
-                ord.n AS position
-            FROM pg_constraint con
-            JOIN pg_class src_rel ON con.conrelid = src_rel.oid
-            JOIN pg_namespace src_ns ON src_rel.relnamespace = src_ns.oid
-            JOIN pg_class tgt_rel ON con.confrelid = tgt_rel.oid
-            JOIN pg_namespace tgt_ns ON tgt_rel.relnamespace = tgt_ns.oid
-            -- align i-th key of conkey with i-th key of confkey
-            JOIN LATERAL generate_subscripts(con.conkey, 1) AS ord(n) ON TRUE
-            LEFT JOIN pg_attribute src_att
-                ON src_att.attrelid = src_rel.oid
-            AND src_att.attnum   = con.conkey[ord.n]
-            LEFT JOIN pg_attribute tgt_att
-                ON tgt_att.attrelid = tgt_rel.oid
-            AND tgt_att.attnum   = con.confkey[ord.n]
-            WHERE con.contype = 'f'
-            AND src_ns.nspname = %s
-            AND src_rel.relname = %s
-            ORDER BY con.conname, ord.n;
+        return self._table_metadata(table_schema, table_name)["foreign_keys"]
+
+    # -------------------------
+    # Bulk extraction
+    # -------------------------
+
+    def extract_catalog(self, database: str = None) -> Catalog:
+        """
+        Read columns, primary keys and foreign keys of every user table with three
+        pg_catalog queries and group the rows by (schema, table_name).
+
+        The result is kept on the extractor, so per-table methods don't hit the server again.
+        Call it once more to refresh the snapshot.
         """
+        self.connect()
 
-        with self.conn.cursor() as cur:
-            cur.execute(sql, (table_schema, table_name))
-            rows = cur.fetchall()
+        workers = min(self.workers, self.max_connections - 1)
+        rows = None
+        if workers > 1:
+            rows = self._fetch_catalog_rows_parallel(workers)
+        if rows is None:
+            rows = self._fetch_catalog_rows(self.conn, None)
 
-        # rows cols order as in SELECT
-        # (constraint_name, src_schema, src_table, tgt_schema, tgt_table, src_col, tgt_col, position)
-        fks: dict[str, ForeignKeyInfo] = {}
-        for constraint_name, _src_schema, _src_table, tgt_schema, tgt_table, src_col, tgt_col, _pos in rows:
-            if constraint_name not in fks:
-                fks[constraint_name] = {
+        self._catalog = self._build_catalog(*rows)
+        return self._catalog
+
+    # -------------------------
+    # Parallel extraction
+    # -------------------------
+
+    def _fetch_catalog_rows(self, conn, schemas: Optional[List[str]]) -> Tuple[List[Tuple], List[Tuple], List[Tuple]]:
+        """Rows of columns, primary keys and foreign keys of `schemas` (all user schemas if None)."""
+        params = {"schemas": schemas}
+        return (
+            self._fetch_all(self._COLUMNS_SQL, params, conn),
+            self._fetch_all(self._PRIMARY_KEYS_SQL, params, conn),
+            self._fetch_all(self._FOREIGN_KEYS_SQL, params, conn),
+        )
+
+    def _fetch_catalog_rows_parallel(self, workers: int) -> Optional[Tuple[List[Tuple], List[Tuple], List[Tuple]]]:
+        """
+        Export snapshot on own connection and read schemas over `workers` more connections
+        that import it, so result is as consistent as a single-connection read.
+        Returns None when there is nothing to split or snapshot can't be exported.
+        """
+        # Snapshot can be exported only by a transaction that is still open while others import it.
+        self.conn.rollback()
+        self.conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        try:
+            try:
+                snapshot_id = self._fetch_all("SELECT pg_catalog.pg_export_snapshot();")[0][0]
+            except psycopg2.Error:
+                # e.g. hot standby of old versions: fall back to one connection.
+                return None
+            relations = self._fetch_all(self._SCHEMA_SIZES_SQL)
+            if len(relations) < 2:
+                return None
+            chunks = self._split_schemas(relations, min(workers, len(relations)))
+
+            with ThreadPoolExecutor(max_workers=len(chunks), thread_name_prefix="extract") as executor:
+                parts = list(executor.map(lambda chunk: self._fetch_in_snapshot(snapshot_id, chunk), chunks))
+        finally:
+            self.conn.rollback()
+            self.conn.set_session(isolation_level="DEFAULT", readonly="DEFAULT")
+
+        # Stable sort by schema: same row order as a single-connection read.
+        return tuple(
+            sorted((row for part in parts for row in part[i]), key=lambda row: row[0])
+            for i in range(3)
+        )
+
+    @staticmethod
+    def _split_schemas(relations: Sequence[Tuple[str, int]], workers: int) -> List[List[str]]:
+        """Greedy split of (schema, relation count), biggest first, to the least loaded worker."""
+        chunks: List[List[str]] = [[] for _ in range(workers)]
+        loads = [0] * workers
+        for schema, count in sorted(relations, key=lambda r: r[1], reverse=True):
+            i = loads.index(min(loads))
+            chunks[i].append(schema)
+            loads[i] += count
+        return chunks
+
+    def _fetch_in_snapshot(self, snapshot_id: str, schemas: List[str]) -> Tuple[List[Tuple], List[Tuple], List[Tuple]]:
+        conn = psycopg2.connect(**self.conn_params)
+        try:
+            conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+            with conn.cursor() as cur:
+                # Must be the first statement of transaction.
+                cur.execute("SET TRANSACTION SNAPSHOT %s;", (snapshot_id,))
+            return self._fetch_catalog_rows(conn, schemas)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _build_catalog(column_rows: List[Tuple], pk_rows: List[Tuple], fk_rows: List[Tuple]) -> Catalog:
+        """Group rows of the three catalog queries by (schema, table_name)."""
+        catalog: Catalog = {}
+
+        def entry(schema: str, table_name: str) -> TableMetadata:
+            key = (schema, table_name)
+            if key not in catalog:
+                catalog[key] = TableMetadata(columns=[], primary_keys=[], foreign_keys=[])
+            return catalog[key]
+
+        for schema, table_name, ordinal_position, column_name, formatted_type, is_nullable, column_default \
+                in column_rows:
+            entry(schema, table_name)["columns"].append(
+                ColumnInfo(
+                    name=column_name,
+                    data_type=formatted_type,
+                    is_nullable=bool(is_nullable),
+                    ordinal_position=int(ordinal_position),
+                    default=column_default,
+                )
+            )
+
+        # rows are ordered by (schema, table, constraint, position)
+        pks: Dict[Tuple[str, str, str], PrimaryKeyInfo] = {}
+        for schema, table_name, constraint_name, column_name, ordinal_position in pk_rows:
+            key = (schema, table_name, constraint_name)
+            if key not in pks:
+                pks[key] = {
+                    "constraint_name": constraint_name,
+                    "columns": [],
+                    "ordinal_positions": [],
+                }
+                entry(schema, table_name)["primary_keys"].append(pks[key])
+            pks[key]["columns"].append(column_name)
+            pks[key]["ordinal_positions"].append(int(ordinal_position))
+
+        # (src_schema, src_table, constraint_name, tgt_schema, tgt_table, src_col, tgt_col, position)
+        fks: Dict[Tuple[str, str, str], ForeignKeyInfo] = {}
+        for src_schema, src_table, constraint_name, tgt_schema, tgt_table, src_col, tgt_col, _pos \
+                in fk_rows:
+            key = (src_schema, src_table, constraint_name)
+            if key not in fks:
+                fks[key] = {
                     "constraint_name": constraint_name,
                     "columns": [],
                     "referenced_schema": tgt_schema,
@@ -204,11 +252,107 @@ class PostgresExtractor(BaseExtractor):
                     "referenced_columns": [],
                     "column_pairs": [],
                 }
-            fks[constraint_name]["columns"].append(src_col)
-            fks[constraint_name]["referenced_columns"].append(tgt_col)
+                entry(src_schema, src_table)["foreign_keys"].append(fks[key])
+            fks[key]["columns"].append(src_col)
+            fks[key]["referenced_columns"].append(tgt_col)
 
         # fill pairs preserving order
         for fk in fks.values():
             fk["column_pairs"] = list(zip(fk["columns"], fk["referenced_columns"]))
 
-        return list(fks.values())
\ No newline at end of file
+        return catalog
+
+    def _table_metadata(self, table_schema: str, table_name: str) -> TableMetadata:
+        """Return metadata of one table from the bulk snapshot (loaded on first use)."""
+        if self._catalog is None:
+            self.extract_catalog()
+        return self._catalog.get(
+            (table_schema, table_name),
+            TableMetadata(columns=[], primary_keys=[], foreign_keys=[]),
+        )
+
+    def _fetch_all(self, query: str, params: Any = (), conn=None) -> List[Tuple]:
+        with (conn or self.conn).cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+
+    # Schemas with user relations and their sizes, to split work between connections.
+    _SCHEMA_SIZES_SQL = """--sql
+        SELECT n.nspname, count(*)
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname NOT IN ('pg_catalog', 'information_schema')
+        AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+        GROUP BY n.nspname;
+    """
+
+    _COLUMNS_SQL = """--sql
+        SELECT
+            n.nspname AS table_schema,
+            c.relname AS table_name,
+            a.attnum AS ordinal_position,
+            a.attname AS column_name,
+            pg_catalog.format_type(a.atttypid, a.atttypmod) AS formatted_type,
+            NOT a.attnotnull AS is_nullable,
+            pg_catalog.pg_get_expr(ad.adbin, ad.adrelid) AS column_default
+        FROM pg_catalog.pg_attribute a
+        JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_catalog.pg_attrdef ad
+            ON ad.adrelid = a.attrelid AND ad.adnum = a.attnum
+        WHERE n.nspname NOT IN ('pg_catalog', 'information_schema')
+        AND (%(schemas)s::text[] IS NULL OR n.nspname = ANY(%(schemas)s))
+        AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+        AND a.attnum > 0
+        AND NOT a.attisdropped
+        ORDER BY n.nspname, c.relname, a.attnum;
+    """
+
+    _PRIMARY_KEYS_SQL = """--sql
+        SELECT
+            n.nspname AS table_schema,
+            c.relname AS table_name,
+            con.conname AS constraint_name,
+            a.attname AS column_name,
+            k.ordinal_position
+        FROM pg_catalog.pg_constraint con
+        JOIN pg_catalog.pg_class c ON c.oid = con.conrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        JOIN LATERAL unnest(con.conkey) WITH ORDINALITY AS k(attnum, ordinal_position) ON TRUE
+        JOIN pg_catalog.pg_attribute a
+            ON a.attrelid = con.conrelid
+        AND a.attnum = k.attnum
+        WHERE con.contype = 'p'
+        AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+        AND (%(schemas)s::text[] IS NULL OR n.nspname = ANY(%(schemas)s))
+        ORDER BY n.nspname, c.relname, con.conname, k.ordinal_position;
+    """
+
+    _FOREIGN_KEYS_SQL = """--sql
+        SELECT
+            src_ns.nspname AS src_schema,
+            src_rel.relname AS src_table,
+            con.conname AS constraint_name,
+            tgt_ns.nspname AS tgt_schema,
+            tgt_rel.relname AS tgt_table,
+            src_att.attname AS src_col,
+            tgt_att.attname AS tgt_col,
+            ord.n AS position
+        FROM pg_constraint con
+        JOIN pg_class src_rel ON con.conrelid = src_rel.oid
+        JOIN pg_namespace src_ns ON src_rel.relnamespace = src_ns.oid
+        JOIN pg_class tgt_rel ON con.confrelid = tgt_rel.oid
+        JOIN pg_namespace tgt_ns ON tgt_rel.relnamespace = tgt_ns.oid
+        -- align i-th key of conkey with i-th key of confkey
+        JOIN LATERAL generate_subscripts(con.conkey, 1) AS ord(n) ON TRUE
+        LEFT JOIN pg_attribute src_att
+            ON src_att.attrelid = src_rel.oid
+        AND src_att.attnum   = con.conkey[ord.n]
+        LEFT JOIN pg_attribute tgt_att
+            ON tgt_att.attrelid = tgt_rel.oid
+        AND tgt_att.attnum   = con.confkey[ord.n]
+        WHERE con.contype = 'f'
+        AND src_ns.nspname NOT IN ('pg_catalog', 'information_schema')
+        AND (%(schemas)s::text[] IS NULL OR src_ns.nspname = ANY(%(schemas)s))
+        ORDER BY src_ns.nspname, src_rel.relname, con.conname, ord.n;
+    """
@@ -1,7 +1,7 @@
 # manager/schemas/metadata.py
 from __future__ import annotations
 from datetime import datetime
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 from pydantic import BaseModel, Field, ConfigDict
 
 
@@ -17,6 +17,15 @@ class Database(BaseModel):
     name: str
 
 
+class DatabaseView(BaseModel):
+    """Database row of /api/databases; `address` only with include=address (read-only)."""
+    model_config = ConfigDict(frozen=True)
+
+    id: int
+    name: str
+    address: Optional[str] = None    # domain:port, None without credentials
+
+
 class Table(BaseModel):
     """Table row (read-only)."""
     model_config = ConfigDict(frozen=True)
@@ -24,6 +33,7 @@ class Table(BaseModel):
     id: int
     database_id: int
     name: str
+    schema_name: str = "public"
 
 
 class Column(BaseModel):
@@ -88,4 +98,59 @@ class SavedQuery(BaseModel):
     id: int
     database_id: int
     sql_query: str
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
+
+
+class SavedQueryView(SavedQuery):
+    """Saved query row with name of its database (read-only)."""
+    database_name: str
+
+
+class FillJob(BaseModel):
+    """Background fill job row without its DSN (read-only)."""
+    model_config = ConfigDict(frozen=True)
+
+    id: int
+    status: str                   # queued / running / done / failed
+    phase: Optional[str]          # last finished step
+    progress: Dict[str, int]      # step -> number of source objects
+    result: Optional[Dict[str, int]]
+    error: Optional[str]
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+
+# -----------------------------------------------------------------------------
+# Aggregates (read-only trees built from several tables at once)
+# -----------------------------------------------------------------------------
+
+class TableTree(BaseModel):
+    """Table with its columns (read-only)."""
+    model_config = ConfigDict(frozen=True)
+
+    table: Table
+    columns: List[Column]
+
+
+class DatabaseTree(BaseModel):
+    """Database with its tables and their columns (read-only)."""
+    model_config = ConfigDict(frozen=True)
+
+    database: Database
+    tables: List[TableTree]
+
+
+class SearchHit(BaseModel):
+    """Table or column found by metadata search, with its path (read-only)."""
+    model_config = ConfigDict(frozen=True)
+
+    kind: str                     # table / column
+    database_id: int
+    database_name: str
+    schema_name: str
+    table_name: str
+    column_name: Optional[str]    # None for tables
+    data_type: Optional[str]
+    score: float
@@ -0,0 +1,40 @@
+from functools import partial
+from itertools import islice
+from typing import AsyncIterator, Callable, Iterator, List, TypeVar
+
+from anyio import CapacityLimiter, to_thread
+
+from manager.config import settings
+
+T = TypeVar("T")
+
+# psycopg2 is blocking, so every data layer call runs on a worker thread.
+# Threads are split per workload (bulkheads): slow target databases can occupy
+# at most TARGET_DB_THREADS threads and never starve metadata reads or /health,
+# which don't wait for Starlette's shared threadpool anymore.
+_metadata_limiter = CapacityLimiter(settings.METADATA_DB_THREADS)
+_target_limiter = CapacityLimiter(settings.TARGET_DB_THREADS)
+
+
+async def run_metadata(func: Callable[..., T], *args, **kwargs) -> T:
+    """Await blocking call that only talks to the metadata DB (repo, cache, writer bookkeeping)."""
+    return await to_thread.run_sync(partial(func, *args, **kwargs), limiter=_metadata_limiter)
+
+
+async def run_target(func: Callable[..., T], *args, **kwargs) -> T:
+    """Await blocking call that talks to a target database (queries, extraction)."""
+    return await to_thread.run_sync(partial(func, *args, **kwargs), limiter=_target_limiter)
+
+
+async def iterate_target(items: Iterator[T], chunk_size: int) -> AsyncIterator[List[T]]:
+    """Drain blocking iterator (e.g. server-side cursor) in chunks, one thread hop per chunk."""
+    try:
+        while True:
+            chunk = await run_target(lambda: list(islice(items, chunk_size)))
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        close = getattr(items, "close", None)
+        if close is not None:
+            await run_target(close)
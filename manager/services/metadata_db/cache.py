@@ -0,0 +1,120 @@
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from manager.config import settings
+from manager.schemas.metadata import Database, DatabaseTree
+from .notify import METADATA, MetadataEvent, subscribe
+from .repo import list_databases, load_metadata_tree
+
+
+def _tree_size(tree: DatabaseTree) -> int:
+    """Cost of cached tree: number of tables plus columns."""
+    return len(tree.tables) + sum(len(table_tree.columns) for table_tree in tree.tables)
+
+
+class MetadataTreeCache:
+    """
+    Versioned in-memory copy of the metadata tree.
+
+    Data changes only when metadata is written, so cache is invalidated on METADATA
+    events (local after commit, or from other workers via LISTEN/NOTIFY). Every invalidation bumps the version, which is exposed as ETag.
+    Trees are kept per database in LRU order and evicted when total size
+    exceeds `max_items` (tables + columns); databases list is always kept.
+    """
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        # Distinguish processes: equal versions of two workers don't mean equal data.
+        self._epoch = uuid.uuid4().hex[:8]
+        self._version = 0
+        self._databases: Optional[List[Database]] = None
+        self._trees: "OrderedDict[int, DatabaseTree]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self._size = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def etag(self) -> str:
+        return f'"{self._epoch}-{self._version}"'
+
+    def invalidate(self, database_id: Optional[int] = None) -> None:
+        """Forget cached data of one database (or everything) and bump version."""
+        with self._lock:
+            self._version += 1
+            self._databases = None
+            if database_id is None:
+                self._trees.clear()
+                self._sizes.clear()
+                self._size = 0
+            else:
+                self._evict(database_id)
+
+    def databases(self) -> Tuple[str, List[Database]]:
+        """Return (etag, databases)."""
+        with self._lock:
+            etag, version, databases = self.etag, self._version, self._databases
+        if databases is not None:
+            return etag, databases
+
+        databases = list_databases()
+        with self._lock:
+            # Don't store data read before a concurrent invalidation.
+            if version == self._version:
+                self._databases = databases
+        return etag, databases
+
+    def trees(self) -> Tuple[str, List[DatabaseTree]]:
+        """Return (etag, trees of all databases); missing trees are loaded with one query."""
+        etag, databases = self.databases()
+        with self._lock:
+            version = self._version
+            cached: Dict[int, DatabaseTree] = {}
+            for database in databases:
+                if database.id in self._trees:
+                    self._trees.move_to_end(database.id)
+                    cached[database.id] = self._trees[database.id]
+
+        missing = [database.id for database in databases if database.id not in cached]
+        if missing:
+            loaded = load_metadata_tree(missing)
+            with self._lock:
+                if version == self._version:
+                    for tree in loaded:
+                        self._put(tree)
+            cached.update({tree.database.id: tree for tree in loaded})
+
+        return etag, [cached[database.id] for database in databases if database.id in cached]
+
+    def _put(self, tree: DatabaseTree) -> None:
+        size = _tree_size(tree)
+        if size > self.max_items:
+            # Too big to cache at all: served straight from the database.
+            return
+        self._evict(tree.database.id)
+        self._trees[tree.database.id] = tree
+        self._sizes[tree.database.id] = size
+        self._size += size
+        while self._size > self.max_items:
+            self._evict(next(iter(self._trees)))
+
+    def _evict(self, database_id: int) -> None:
+        if database_id in self._trees:
+            del self._trees[database_id]
+            self._size -= self._sizes.pop(database_id)
+
+
+# Global variable, like connection pool.
+metadata_cache = MetadataTreeCache(settings.METADATA_CACHE_MAX_ITEMS)
+
+
+def _on_event(event: MetadataEvent) -> None:
+    if event.kind == METADATA:
+        metadata_cache.invalidate(event.database_id)
+
+subscribe(_on_event)
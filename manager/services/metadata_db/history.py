@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2 import pool
+
+from manager.config import settings
+from .lookup import database_lookup
+from .writer import save_queries
+
+logger = logging.getLogger(__name__)
+
+# Metadata database unreachable: entries are fine, keep them and retry. Any other error may be
+# caused by an entry itself (e.g. FK violation after its database was deleted).
+_CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, pool.PoolError)
+
+Entry = Tuple[int, str, float]  # (database_id, sql_query, logged at)
+
+
+class QueryLog:
+    """
+    Buffer of saved query history, written by a background thread in batches.
+
+    Execution endpoints only append to memory: the metadata database gets one multi-row INSERT
+    per `batch_size` entries or per `flush_interval` seconds instead of a transaction per query.
+    - back-pressure: with `max_pending` entries unwritten (metadata database slow or down) callers
+      wait up to `put_timeout` seconds for room, then the entry is dropped with a warning; while
+      writes keep failing, entries are dropped at once instead of holding every request;
+    - batch failing for a reason other than connection, or `max_attempts` times in a row, is
+      written entry by entry: entries the database rejects are dropped, the rest are saved;
+    - the same query repeated against the same database within `dedup_window` seconds (paging,
+      refresh) is saved once;
+    - stop() writes whatever is pending. Until start() (scripts, tests) entries are written at once.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.QUERY_LOG_BATCH_SIZE,
+        flush_interval: float = settings.QUERY_LOG_FLUSH_INTERVAL,
+        max_pending: int = settings.QUERY_LOG_MAX_PENDING,
+        put_timeout: float = settings.QUERY_LOG_PUT_TIMEOUT,
+        max_attempts: int = settings.QUERY_LOG_MAX_ATTEMPTS,
+        dedup_window: float = settings.QUERY_LOG_DEDUP_WINDOW,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+        self.max_attempts = max_attempts
+        self.dedup_window = dedup_window
+        self._cond = threading.Condition()
+        self._pending: Deque[Entry] = deque()
+        # database_id -> (last logged query, logged at), oldest first: expired ones are pruned from the front.
+        self._last: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+        self._writing = threading.Lock()  # one batch in flight, in log order
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._stopped = threading.Event()  # interrupts pause after a failed batch
+        self._attempts = 0  # failed attempts to write the oldest batch
+        self._failing = False  # last write failed
+        self._logged = 0
+        self._deduplicated = 0
+        self._dropped = 0
+        self._rejected = 0
+        self._batches = 0
+        self._failures = 0
+
+    def log(self, database_name: str, sql_query: str) -> bool:
+        """Queue query for history; False when it repeats the previous one or was dropped."""
+        entry = database_lookup.get(database_name)
+        if entry is None:
+            raise ValueError(f"Database {database_name} is not registered.")
+        database_id = entry.database.id
+
+        deadline = time.monotonic() + self.put_timeout
+        with self._cond:
+            now = time.monotonic()  # under lock: keeps `_last` in time order
+            while self._last and now - next(iter(self._last.values()))[1] >= self.dedup_window:
+                self._last.popitem(last=False)
+            if self._last.get(database_id, (None,))[0] == sql_query:
+                self._deduplicated += 1
+                return False
+            while len(self._pending) >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._failing:
+                    self._dropped += 1
+                    logger.warning("saved query history is full, query of %s dropped", database_name)
+                    return False
+                self._cond.wait(remaining)
+            self._pending.append((database_id, sql_query, time.monotonic()))
+            self._last.pop(database_id, None)
+            self._last[database_id] = (sql_query, now)
+            self._logged += 1
+            # First entry: writer waits without timeout on an empty buffer, let it start the interval.
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+            running = self._thread is not None
+
+        if not running:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        """Write every pending entry now."""
+        while self._write_batch():
+            pass
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Write pending entries and stop the writer thread."""
+        with self._cond:
+            thread, self._stopping = self._thread, True
+            self._stopped.set()
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            self._thread = None
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "logged": self._logged,
+                "deduplicated": self._deduplicated,
+                "dropped": self._dropped,
+                "rejected": self._rejected,
+                "batches": self._batches,
+                "failures": self._failures,
+            }
+
+    # ---- internals ----
+
+    def _write_batch(self) -> bool:
+        """
+        Write the oldest `batch_size` entries; False when nothing was pending.
+        Entries leave the buffer only after commit, so a batch failed on connection is retried as is.
+        """
+        with self._writing:
+            with self._cond:
+                batch = list(islice(self._pending, self.batch_size))
+            if not batch:
+                return False
+            try:
+                self._save(batch)
+            except Exception as e:
+                with self._cond:
+                    self._failures += 1
+                    self._attempts += 1
+                    if isinstance(e, _CONNECTION_ERRORS) and self._attempts < self.max_attempts:
+                        self._failing = True
+                        raise
+                logger.warning("saved query batch failed (%s), writing entry by entry", e)
+                self._write_one_by_one(batch)
+            else:
+                self._remove(len(batch), batches=1)
+            return True
+
+    def _write_one_by_one(self, batch: List[Entry]) -> None:
+        """Save entries of a failed batch separately, dropping those the database rejects."""
+        for entry in batch:
+            try:
+                self._save([entry])
+            except _CONNECTION_ERRORS:
+                # Entries before this one are saved and removed already.
+                with self._cond:
+                    self._failing = True
+                raise
+            except Exception:
+                logger.exception("saved query of database %d rejected, dropped", entry[0])
+                with self._cond:
+                    self._rejected += 1
+            self._remove(1)
+
+    @staticmethod
+    def _save(entries: List[Entry]) -> None:
+        now = time.monotonic()
+        save_queries([(database_id, sql_query, now - logged_at) for database_id, sql_query, logged_at in entries])
+
+    def _remove(self, count: int, batches: int = 0) -> None:
+        """Drop `count` oldest entries after they were written (or rejected)."""
+        with self._cond:
+            for _ in range(count):
+                self._pending.popleft()
+            self._batches += batches
+            self._attempts = 0
+            self._failing = False
+            # Room for callers waiting on a full buffer.
+            self._cond.notify_all()
+
+    def _due(self) -> bool:
+        """Under lock: whether the writer thread should write a batch now."""
+        if not self._pending:
+            return False
+        return (self._stopping or len(self._pending) >= self.batch_size
+                or time.monotonic() - self._pending[0][2] >= self.flush_interval)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._due():
+                    if self._stopping:
+                        return
+                    timeout = None
+                    if self._pending:
+                        timeout = self.flush_interval - (time.monotonic() - self._pending[0][2])
+                    self._cond.wait(timeout)
+            try:
+                self._write_batch()
+            except Exception:
+                # Metadata database unavailable: keep entries and try again later.
+                logger.exception("saved query history batch failed")
+                with self._cond:
+                    if self._stopping:
+                        logger.error("%d saved queries lost on shutdown", len(self._pending))
+                        return
+                # Not woken by new entries: under load they would turn this into a busy loop.
+                self._stopped.wait(self.flush_interval)
+
+
+# Global variable, like connection pool.
+query_log = QueryLog()
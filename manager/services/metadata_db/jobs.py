@@ -0,0 +1,148 @@
+import logging
+import threading
+from dataclasses import asdict
+from typing import Optional, Tuple
+
+from psycopg2.extras import Json, RealDictCursor
+
+from manager.config import settings
+from manager.schemas.metadata import FillJob
+from .tx import tx
+from .writer import SyncResult, sync_metadata_from_dsn
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+logger = logging.getLogger(__name__)
+
+# Steps of fill in order, as reported to `progress` of sync_metadata_from_dsn.
+PHASES = ("extract", "tables", "columns", "primary_keys", "foreign_keys")
+
+_JOB_COLUMNS = "id, status, phase, progress, result, error, attempts, created_at, started_at, finished_at"
+
+# Wakes local workers right after enqueue; workers of other processes notice new jobs by polling.
+_wakeup = threading.Event()
+
+
+def _to_job(row) -> FillJob:
+    return FillJob(**row)
+
+
+def enqueue_fill_job(dsn: str) -> FillJob:
+    """Persist fill job for `dsn`; one of the workers picks it up."""
+    with tx() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"""--sql
+            INSERT INTO fill_jobs (dsn) VALUES (%s)
+            RETURNING {_JOB_COLUMNS};
+        """, (dsn,))
+        job = _to_job(cur.fetchone())
+    _wakeup.set()
+    return job
+
+
+def get_fill_job(job_id: int) -> Optional[FillJob]:
+    with tx(readonly=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"SELECT {_JOB_COLUMNS} FROM fill_jobs WHERE id = %s;", (job_id,))
+        row = cur.fetchone()
+        return None if row is None else _to_job(row)
+
+
+def _claim_job(stale_after: float, max_attempts: int) -> Optional[Tuple[int, str]]:
+    """
+    Take the oldest queued job, or a running one whose worker stopped reporting
+    (process died: job survives restart). SKIP LOCKED lets many workers poll one table.
+    """
+    with tx() as conn, conn.cursor() as cur:
+        cur.execute("""--sql
+            UPDATE fill_jobs
+            SET status = %(failed)s, error = 'Worker lost too many times.', finished_at = NOW(), dsn = NULL
+            WHERE status = %(running)s
+              AND heartbeat_at < NOW() - make_interval(secs => %(stale_after)s)
+              AND attempts >= %(max_attempts)s;
+
+            UPDATE fill_jobs
+            SET status = %(running)s, attempts = attempts + 1, started_at = NOW(), heartbeat_at = NOW()
+            WHERE id = (
+                SELECT id FROM fill_jobs
+                WHERE status = %(queued)s
+                   OR (status = %(running)s AND heartbeat_at < NOW() - make_interval(secs => %(stale_after)s))
+                ORDER BY id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, dsn;
+        """, {"queued": QUEUED, "running": RUNNING, "failed": FAILED,
+              "stale_after": stale_after, "max_attempts": max_attempts})
+        row = cur.fetchone()
+        return None if row is None else (row[0], row[1])
+
+
+def _report(job_id: int, phase: str, count: int) -> None:
+    # Own transaction: fill itself commits only at the end.
+    with tx() as conn, conn.cursor() as cur:
+        cur.execute("""--sql
+            UPDATE fill_jobs
+            SET phase = %s, progress = progress || jsonb_build_object(%s::text, %s::int), heartbeat_at = NOW()
+            WHERE id = %s;
+        """, (phase, phase, count, job_id))
+
+
+def _finish(job_id: int, result: Optional[SyncResult], error: Optional[str]) -> None:
+    """Record outcome; DSN (with password) is kept only while the job may still run."""
+    summary = None
+    if result is not None:
+        summary = {key: value for key, value in asdict(result).items() if key.startswith("tables_")}
+    with tx() as conn, conn.cursor() as cur:
+        cur.execute("""--sql
+            UPDATE fill_jobs
+            SET status = %s, result = %s, error = %s, finished_at = NOW(), dsn = NULL
+            WHERE id = %s;
+        """, (FAILED if result is None else DONE, None if summary is None else Json(summary), error, job_id))
+
+
+def run_next_job(stale_after: float = settings.FILL_JOB_STALE_AFTER,
+                 max_attempts: int = settings.FILL_JOB_MAX_ATTEMPTS) -> Optional[int]:
+    """Run one job from the queue to the end; return its id, or None if queue is empty."""
+    claimed = _claim_job(stale_after, max_attempts)
+    if claimed is None:
+        return None
+    job_id, dsn = claimed
+    try:
+        result = sync_metadata_from_dsn(dsn, progress=lambda phase, count: _report(job_id, phase, count))
+    except Exception as e:
+        # Not the DSN: it contains the password.
+        logger.exception("fill job %d failed", job_id)
+        _finish(job_id, None, str(e))
+    else:
+        _finish(job_id, result, None)
+    return job_id
+
+
+class FillJobWorker(threading.Thread):
+    """Background thread running fill jobs one by one."""
+
+    def __init__(self, poll_interval: float = settings.FILL_JOB_POLL_INTERVAL):
+        super().__init__(name="fill-job-worker", daemon=True)
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop after the current job (it is picked up again after restart otherwise)."""
+        self._stop_event.set()
+        _wakeup.set()
+        self.join(timeout)
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                job_id = run_next_job()
+            except Exception:
+                # Metadata database unavailable: try again later.
+                logger.exception("fill job worker failed to run next job")
+                job_id = None
+            if job_id is None:
+                _wakeup.wait(self.poll_interval)
+                _wakeup.clear()
@@ -0,0 +1,82 @@
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from manager.schemas.metadata import Credential, Database
+from .notify import METADATA, MetadataEvent, subscribe
+from .repo import list_database_credentials
+
+
+@dataclass(frozen=True)
+class DatabaseEntry:
+    database: Database
+    credentials: Optional[Credential]    # None for database registered without DSN
+
+    @property
+    def address(self) -> Optional[str]:
+        """Address in format domain:port."""
+        if self.credentials is None:
+            return None
+        return f"{self.credentials.host_ipv4}:{self.credentials.port}"
+
+
+class DatabaseLookupCache:
+    """
+    In-memory name -> (database, credentials) map used on every query execution.
+
+    Whole map is loaded with one query (there are few registered databases) and dropped
+    on METADATA events: fill and re-sync commit credentials together with metadata.
+    Unknown name triggers one reload, in case the database was registered by a process
+    whose notification hasn't arrived yet.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._entries: Optional[Dict[str, DatabaseEntry]] = None
+
+    def invalidate(self, database_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._version += 1
+            self._entries = None
+
+    def entries(self) -> List[DatabaseEntry]:
+        """All registered databases ordered by id."""
+        return list(self._load().values())
+
+    def get(self, name: str) -> Optional[DatabaseEntry]:
+        entry = self._load().get(name)
+        if entry is None:
+            entry = self._load(reload=True).get(name)
+        return entry
+
+    def credentials(self, name: str) -> Credential:
+        entry = self.get(name)
+        if entry is None or entry.credentials is None:
+            raise ValueError(f"Database {name} is not registered with credentials.")
+        return entry.credentials
+
+    def _load(self, reload: bool = False) -> Dict[str, DatabaseEntry]:
+        with self._lock:
+            version, entries = self._version, self._entries
+        if entries is not None and not reload:
+            return entries
+
+        entries = {database.name: DatabaseEntry(database=database, credentials=credentials)
+                   for database, credentials in list_database_credentials()}
+        with self._lock:
+            # Don't store data read before a concurrent invalidation.
+            if version == self._version:
+                self._entries = entries
+        return entries
+
+
+# Global variable, like connection pool.
+database_lookup = DatabaseLookupCache()
+
+
+def _on_event(event: MetadataEvent) -> None:
+    if event.kind == METADATA:
+        database_lookup.invalidate(event.database_id)
+
+subscribe(_on_event)
@@ -0,0 +1,257 @@
+"""
+Versioned migrations of the metadata database.
+
+Migrations live in `migrations/` as `NNNN_name.sql` or `NNNN_name.py` and are applied in
+version order; applied versions are recorded in `schema_migrations`.
+
+    python -m manager.services.metadata_db.migrate [--dsn DSN] [--list]
+
+SQL migration runs in one transaction, unless its first line is `-- migrate: no-transaction`:
+then statements run one by one in autocommit (needed for CREATE INDEX CONCURRENTLY).
+Python migration defines `upgrade(conn)` and optional `TRANSACTIONAL = False`.
+Non-transactional migrations may be interrupted half-way, so every step must be idempotent
+(IF NOT EXISTS, create_index_concurrently(), backfill()).
+
+DDL runs with a short lock_timeout: instead of queueing behind a long transaction
+(and blocking every query that comes after it) statement fails and the migration is retried.
+"""
+import argparse
+import importlib.util
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Set
+
+import psycopg2
+from psycopg2 import errors
+from psycopg2 import sql as pgsql
+
+from manager.config import settings
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Key of session advisory lock: one runner at a time when several workers start together.
+_ADVISORY_LOCK_KEY = 0x6D657461  # "meta"
+
+_NO_TRANSACTION = "-- migrate: no-transaction"
+_FILE_RE = re.compile(r"^(\d+)_(\w+)\.(sql|py)$")
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def transactional(self) -> bool:
+        if self.path.suffix == ".sql":
+            return not self.path.read_text(encoding="utf-8").startswith(_NO_TRANSACTION)
+        return getattr(self._module(), "TRANSACTIONAL", True)
+
+    def apply(self, conn) -> None:
+        """Run migration on `conn`; transaction handling is up to the caller."""
+        if self.path.suffix == ".sql":
+            sql = self.path.read_text(encoding="utf-8")
+            with conn.cursor() as cur:
+                if self.transactional:
+                    cur.execute(sql)
+                else:
+                    for statement in split_statements(sql):
+                        cur.execute(statement)
+        else:
+            self._module().upgrade(conn)
+
+    def _module(self):
+        spec = importlib.util.spec_from_file_location(f"migration_{self.version:04d}", self.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+
+def discover(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Migrations of `directory` ordered by version; versions must be unique."""
+    migrations = {}
+    for path in directory.iterdir():
+        match = _FILE_RE.match(path.name)
+        if match is None:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {migrations[version].path.name}, {path.name}")
+        migrations[version] = Migration(version=version, name=match.group(2), path=path)
+    return [migrations[version] for version in sorted(migrations)]
+
+
+# Quoted literal/identifier, dollar-quoted body, comment, or statement separator.
+_SPLIT_RE = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|\$(\w*)\$.*?\$\1\$|--[^\n]*|/\*.*?\*/|;""", re.DOTALL)
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split SQL script on top-level semicolons (not inside quotes, $$ bodies or comments)."""
+    statements: List[str] = []
+    start = 0
+    for match in _SPLIT_RE.finditer(sql):
+        if match.group(0) == ";":
+            statements.append(sql[start:match.end()])
+            start = match.end()
+    statements.append(sql[start:])
+    # Drop pieces that are only whitespace and comments.
+    return [statement.strip() for statement in statements if _strip_comments(statement).strip().strip(";").strip()]
+
+
+def _strip_comments(sql: str) -> str:
+    return _SPLIT_RE.sub(lambda m: "" if m.group(0).startswith(("--", "/*")) else m.group(0), sql)
+
+
+def create_index_concurrently(conn, name: str, definition: str) -> None:
+    """
+    CREATE INDEX CONCURRENTLY that can be repeated after interruption: an interrupted build
+    leaves an invalid index, which IF NOT EXISTS would silently keep. `conn` must be in autocommit.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""--sql
+            SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s);
+        """, (name,))
+        row = cur.fetchone()
+        if row is not None and row[0]:
+            cur.execute(pgsql.SQL("DROP INDEX CONCURRENTLY {};").format(pgsql.Identifier(name)))
+        cur.execute(definition)
+
+
+def backfill(conn, sql: str, batch_size: int = 10_000, pause: float = 0.0) -> int:
+    """
+    Run `sql` (UPDATE/INSERT/DELETE limited with `%(batch_size)s`) until it touches no rows,
+    committing every batch: locks are held for one batch only and vacuum keeps up.
+    Statement must skip rows it already changed. `conn` must be in autocommit. Return total rows.
+    """
+    total = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(sql, {"batch_size": batch_size})
+            if cur.rowcount <= 0:
+                return total
+            total += cur.rowcount
+        if pause:
+            time.sleep(pause)
+
+
+def _ensure_versions_table(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute("""--sql
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+        """)
+
+
+def applied_versions(conn) -> Set[int]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM schema_migrations;")
+        return {row[0] for row in cur.fetchall()}
+
+
+def _record(cur, migration: Migration) -> None:
+    cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s);", (migration.version, migration.name))
+
+
+def _apply_once(conn, migration: Migration, lock_timeout: float) -> None:
+    timeout = f"{int(lock_timeout * 1000)}ms"
+    if migration.transactional:
+        conn.autocommit = False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL lock_timeout = %s;", (timeout,))
+            migration.apply(conn)
+            with conn.cursor() as cur:
+                _record(cur, migration)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+    else:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SET lock_timeout = %s;", (timeout,))
+        try:
+            migration.apply(conn)
+            with conn.cursor() as cur:
+                _record(cur, migration)
+        finally:
+            with conn.cursor() as cur:
+                cur.execute("RESET lock_timeout;")
+
+
+def _apply_with_retries(conn, migration: Migration, lock_timeout: float, retries: int, retry_delay: float) -> None:
+    for attempt in range(retries + 1):
+        try:
+            _apply_once(conn, migration, lock_timeout)
+            return
+        except errors.LockNotAvailable:
+            if attempt == retries:
+                raise
+            # Somebody holds a conflicting lock (long transaction): let it finish.
+            time.sleep(retry_delay * (attempt + 1))
+
+
+def migrate(
+    dsn: str,
+    directory: Path = MIGRATIONS_DIR,
+    target: Optional[int] = None,
+    lock_timeout: float = settings.MIGRATIONS_LOCK_TIMEOUT,
+    retries: int = settings.MIGRATIONS_LOCK_RETRIES,
+    retry_delay: float = 1.0,
+) -> List[Migration]:
+    """Apply pending migrations (up to `target` version); return the applied ones."""
+    conn = psycopg2.connect(dsn)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s);", (_ADVISORY_LOCK_KEY,))
+        try:
+            _ensure_versions_table(conn)
+            done = applied_versions(conn)
+            applied = []
+            for migration in discover(directory):
+                if migration.version in done or (target is not None and migration.version > target):
+                    continue
+                _apply_with_retries(conn, migration, lock_timeout, retries, retry_delay)
+                applied.append(migration)
+            return applied
+        finally:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s);", (_ADVISORY_LOCK_KEY,))
+    finally:
+        conn.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Apply migrations of the metadata database.")
+    parser.add_argument("--dsn", default=settings.METADB_DSN, help="metadata database (METADB_DSN by default)")
+    parser.add_argument("--target", type=int, default=None, help="stop after this version")
+    parser.add_argument("--list", action="store_true", help="show migrations and whether they are applied")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        conn = psycopg2.connect(args.dsn)
+        try:
+            conn.autocommit = True
+            _ensure_versions_table(conn)
+            done = applied_versions(conn)
+        finally:
+            conn.close()
+        for migration in discover():
+            print(f"{'applied' if migration.version in done else 'pending':8} {migration.version:04d} {migration.name}")
+        return
+
+    for migration in migrate(args.dsn, target=args.target):
+        print(f"applied  {migration.version:04d} {migration.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,96 +1,85 @@
--- =======================
--- DROP EXISTING TABLES (если уже есть)
--- =======================
-DROP TABLE IF EXISTS
-    credentials,
-    foreign_key_columns,
-    foreign_keys,
-    primary_key_columns,
-    primary_keys,
-    columns,
-    tables,
-    databases
-CASCADE;
-
--- =======================
--- DATABASES
--- =======================
-CREATE TABLE databases (
-    id SERIAL PRIMARY KEY,
-    name VARCHAR(255) NOT NULL
-);
-
--- =======================
--- TABLES
--- =======================
-CREATE TABLE tables (
-    id SERIAL PRIMARY KEY,
-    database_id INT NOT NULL REFERENCES databases(id) ON DELETE CASCADE,
-    name VARCHAR(255) NOT NULL
-);
-
--- =======================
--- COLUMNS
--- =======================
-CREATE TABLE columns (
-    id SERIAL PRIMARY KEY,
-    table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE,
-    name VARCHAR(255) NOT NULL,
-    data_type VARCHAR(50) NOT NULL
-);
-
--- =======================
--- PRIMARY KEYS
--- =======================
-CREATE TABLE primary_keys (
-    id SERIAL PRIMARY KEY,
-    table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE
-);
-
-CREATE TABLE primary_key_columns (
-    pk_id INT NOT NULL REFERENCES primary_keys(id) ON DELETE CASCADE,
-    column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE,
-    ordinal_position INT NOT NULL,                  -- порядок колонки внутри PK
-    PRIMARY KEY (pk_id, ordinal_position),
-    UNIQUE (pk_id, column_id)
-);
-
--- =======================
--- FOREIGN KEYS
--- =======================
-CREATE TABLE foreign_keys (
-    id SERIAL PRIMARY KEY,
-    table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE,            -- таблица-источник
-    referenced_table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE  -- таблица-цель
-);
-
-CREATE TABLE foreign_key_columns (
-    fk_id INT NOT NULL REFERENCES foreign_keys(id) ON DELETE CASCADE,
-    column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE,            -- колонка-источник
-    referenced_column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE, -- колонка-цель
-    ordinal_position INT NOT NULL,                                              -- порядок в составе FK
-    PRIMARY KEY (fk_id, ordinal_position),
-    UNIQUE (fk_id, column_id, referenced_column_id)
-);
-
--- =======================
--- CREDENTIALS
--- =======================
-CREATE TABLE credentials (
-    id SERIAL PRIMARY KEY,
-    database_id INT NOT NULL REFERENCES databases(id) ON DELETE CASCADE,
-    host_ipv4 VARCHAR(255) NOT NULL,
-    port INT NOT NULL CHECK (port > 0 AND port <= 65535),
-    username VARCHAR(255) NOT NULL,
-    password VARCHAR(255) NOT NULL
-);
-
--- =========================================
--- SAVED QUERIES
--- =========================================
-CREATE TABLE saved_queries (
-    id SERIAL PRIMARY KEY,
-    database_id INTEGER NOT NULL REFERENCES databases(id) ON DELETE CASCADE,
-    sql_query TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT NOW()
+-- Исходная схема метаданных (как в schema/initial.sql до появления миграций).
+-- IF NOT EXISTS: базы, созданные старым initial.sql, проходят эту миграцию без изменений.
+
+-- =======================
+-- DATABASES
+-- =======================
+CREATE TABLE IF NOT EXISTS databases (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) NOT NULL
+);
+
+-- =======================
+-- TABLES
+-- =======================
+CREATE TABLE IF NOT EXISTS tables (
+    id SERIAL PRIMARY KEY,
+    database_id INT NOT NULL REFERENCES databases(id) ON DELETE CASCADE,
+    name VARCHAR(255) NOT NULL
+);
+
+-- =======================
+-- COLUMNS
+-- =======================
+CREATE TABLE IF NOT EXISTS columns (
+    id SERIAL PRIMARY KEY,
+    table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE,
+    name VARCHAR(255) NOT NULL,
+    data_type VARCHAR(50) NOT NULL
+);
+
+-- =======================
+-- PRIMARY KEYS
+-- =======================
+CREATE TABLE IF NOT EXISTS primary_keys (
+    id SERIAL PRIMARY KEY,
+    table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS primary_key_columns (
+    pk_id INT NOT NULL REFERENCES primary_keys(id) ON DELETE CASCADE,
+    column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE,
+    ordinal_position INT NOT NULL,                  -- порядок колонки внутри PK
+    PRIMARY KEY (pk_id, ordinal_position),
+    UNIQUE (pk_id, column_id)
+);
+
+-- =======================
+-- FOREIGN KEYS
+-- =======================
+CREATE TABLE IF NOT EXISTS foreign_keys (
+    id SERIAL PRIMARY KEY,
+    table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE,            -- таблица-источник
+    referenced_table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE  -- таблица-цель
+);
+
+CREATE TABLE IF NOT EXISTS foreign_key_columns (
+    fk_id INT NOT NULL REFERENCES foreign_keys(id) ON DELETE CASCADE,
+    column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE,            -- колонка-источник
+    referenced_column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE, -- колонка-цель
+    ordinal_position INT NOT NULL,                                              -- порядок в составе FK
+    PRIMARY KEY (fk_id, ordinal_position),
+    UNIQUE (fk_id, column_id, referenced_column_id)
+);
+
+-- =======================
+-- CREDENTIALS
+-- =======================
+CREATE TABLE IF NOT EXISTS credentials (
+    id SERIAL PRIMARY KEY,
+    database_id INT NOT NULL REFERENCES databases(id) ON DELETE CASCADE,
+    host_ipv4 VARCHAR(255) NOT NULL,
+    port INT NOT NULL CHECK (port > 0 AND port <= 65535),
+    username VARCHAR(255) NOT NULL,
+    password VARCHAR(255) NOT NULL
+);
+
+-- =========================================
+-- SAVED QUERIES
+-- =========================================
+CREATE TABLE IF NOT EXISTS saved_queries (
+    id SERIAL PRIMARY KEY,
+    database_id INTEGER NOT NULL REFERENCES databases(id) ON DELETE CASCADE,
+    sql_query TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW()
 );
\ No newline at end of file
@@ -0,0 +1,25 @@
+-- Хэш колонок и ключей (для инкрементальной синхронизации) и схема таблицы в исходной базе.
+-- ADD COLUMN с константным DEFAULT не переписывает таблицу: блокировка короткая.
+ALTER TABLE tables ADD COLUMN IF NOT EXISTS fingerprint VARCHAR(64);
+ALTER TABLE tables ADD COLUMN IF NOT EXISTS schema_name VARCHAR(255) NOT NULL DEFAULT 'public';
+
+-- =========================================
+-- FILL JOBS (фоновое заполнение метаданных)
+-- =========================================
+CREATE TABLE IF NOT EXISTS fill_jobs (
+    id SERIAL PRIMARY KEY,
+    dsn TEXT NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',   -- queued / running / done / failed
+    phase VARCHAR(32),                              -- последний завершённый шаг
+    progress JSONB NOT NULL DEFAULT '{}',           -- шаг -> количество объектов
+    result JSONB,
+    error TEXT,
+    attempts INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMP,
+    heartbeat_at TIMESTAMP,                         -- живой воркер обновляет при каждом шаге
+    finished_at TIMESTAMP
+);
+
+-- Воркеры выбирают задачи из очереди по статусу (таблица новая, блокировать нечего)
+CREATE INDEX IF NOT EXISTS fill_jobs_status_id_idx ON fill_jobs (status, id);
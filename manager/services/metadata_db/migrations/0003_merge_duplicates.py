@@ -0,0 +1,65 @@
+"""
+Remove duplicates left by fills before the unique constraints of 0004.
+
+Old fill inserted a new `databases` row on every run and stored same-named tables of
+different schemas as 'public', so columns, primary keys and credentials got duplicates too.
+The newest row of every group is kept (children of merged databases are moved to it),
+older ones are deleted in committed batches. Tables of affected databases lose their
+fingerprint, so the next re-sync rewrites them (tables merged from several schemas get split back).
+"""
+from manager.services.metadata_db.migrate import backfill
+
+# Deletes and updates in batches can be interrupted and repeated.
+TRANSACTIONAL = False
+
+# Children of `databases` moved to the newest row with the same name.
+_MOVE_TO_NEWEST_DATABASE = """--sql
+    WITH databases_keep AS (
+        SELECT id, max(id) OVER (PARTITION BY name) AS keep_id FROM databases
+    ), batch AS (
+        SELECT child.id, databases_keep.keep_id
+        FROM {table} AS child
+        JOIN databases_keep ON databases_keep.id = child.database_id
+        WHERE databases_keep.id <> databases_keep.keep_id
+        LIMIT %(batch_size)s
+    )
+    UPDATE {table} SET database_id = batch.keep_id FROM batch WHERE {table}.id = batch.id;
+"""
+
+# Rows of `table` sharing `key` except the newest one.
+_DELETE_OLDER = """--sql
+    DELETE FROM {table} WHERE id IN (
+        SELECT id FROM (
+            SELECT id, row_number() OVER (PARTITION BY {key} ORDER BY id DESC) AS n FROM {table}
+        ) AS ranked
+        WHERE n > 1
+        LIMIT %(batch_size)s
+    );
+"""
+
+
+def upgrade(conn) -> None:
+    for table in ("tables", "credentials", "saved_queries"):
+        backfill(conn, _MOVE_TO_NEWEST_DATABASE.format(table=table))
+    backfill(conn, _DELETE_OLDER.format(table="databases", key="name"))
+
+    with conn.cursor() as cur:
+        # Kept tables may lose columns and keys with their duplicates: force full re-sync.
+        cur.execute("""--sql
+            UPDATE tables SET fingerprint = NULL
+            WHERE fingerprint IS NOT NULL AND database_id IN (
+                SELECT database_id FROM tables GROUP BY database_id, schema_name, name HAVING count(*) > 1
+                UNION
+                SELECT t.database_id FROM columns AS c JOIN tables AS t ON t.id = c.table_id
+                GROUP BY t.database_id, c.table_id, c.name HAVING count(*) > 1
+                UNION
+                SELECT t.database_id FROM primary_keys AS pk JOIN tables AS t ON t.id = pk.table_id
+                GROUP BY t.database_id, pk.table_id HAVING count(*) > 1
+            );
+        """)
+
+    # Parents first: deleting a table takes its columns and keys along (ON DELETE CASCADE).
+    backfill(conn, _DELETE_OLDER.format(table="tables", key="database_id, schema_name, name"))
+    backfill(conn, _DELETE_OLDER.format(table="columns", key="table_id, name"))
+    backfill(conn, _DELETE_OLDER.format(table="primary_keys", key="table_id"))
+    backfill(conn, _DELETE_OLDER.format(table="credentials", key="database_id"))
@@ -0,0 +1,69 @@
+-- migrate: no-transaction
+-- Индексы и уникальные ограничения под запросы repo.py и writer.py.
+-- Бывший schema/upgrade.sql: отдельный скрипт был временным, до появления migrate.py; другого пути обновления нет.
+-- Выполняется вне транзакции, по одному оператору: CREATE INDEX CONCURRENTLY не блокирует запись
+-- в большие таблицы. Каждый шаг проверяет, что уже сделан, поэтому прерванную миграцию можно повторить.
+-- Дубли, оставленные старым заполнением, убирает предыдущая миграция (0003_merge_duplicates.py).
+-- Если уникальный индекс всё же не строится (дубли записаны во время миграции), её и эту нужно повторить.
+
+-- =======================
+-- LEFTOVERS OF FAILED RUNS
+-- =======================
+-- Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс, который IF NOT EXISTS пропустил бы.
+DO $$
+DECLARE
+    idx regclass;
+BEGIN
+    FOR idx IN
+        SELECT i.indexrelid::regclass
+        FROM pg_index AS i
+        JOIN pg_class AS c ON c.oid = i.indrelid
+        WHERE NOT i.indisvalid
+          AND c.relnamespace = current_schema()::regnamespace
+          AND c.relname IN ('databases', 'tables', 'columns', 'primary_keys', 'primary_key_columns',
+                            'foreign_keys', 'foreign_key_columns', 'credentials', 'saved_queries')
+    LOOP
+        EXECUTE format('DROP INDEX %s', idx);
+    END LOOP;
+END $$;
+
+-- =======================
+-- UNIQUE CONSTRAINTS
+-- =======================
+-- Индекс строится без блокировки записи, затем становится ограничением (это быстро).
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS databases_name_key ON databases (name);
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS tables_database_schema_name_idx ON tables (database_id, schema_name, name);
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS columns_table_id_name_key ON columns (table_id, name);
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS primary_keys_table_id_key ON primary_keys (table_id);
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS credentials_database_id_key ON credentials (database_id);
+
+DO $$
+DECLARE
+    item RECORD;
+BEGIN
+    FOR item IN
+        SELECT * FROM (VALUES
+            ('databases', 'databases_name_key'),
+            ('columns', 'columns_table_id_name_key'),
+            ('primary_keys', 'primary_keys_table_id_key'),
+            ('credentials', 'credentials_database_id_key')
+        ) AS v(table_name, index_name)
+    LOOP
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                       WHERE conrelid = item.table_name::regclass AND conname = item.index_name) THEN
+            EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I UNIQUE USING INDEX %I',
+                           item.table_name, item.index_name, item.index_name);
+        END IF;
+    END LOOP;
+END $$;
+
+-- =======================
+-- INDEXES
+-- =======================
+CREATE INDEX CONCURRENTLY IF NOT EXISTS primary_key_columns_column_id_idx ON primary_key_columns (column_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS foreign_keys_table_id_idx ON foreign_keys (table_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS foreign_keys_referenced_table_id_idx ON foreign_keys (referenced_table_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS foreign_key_columns_column_id_idx ON foreign_key_columns (column_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS foreign_key_columns_referenced_column_id_idx ON foreign_key_columns (referenced_column_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS saved_queries_created_at_id_idx ON saved_queries (created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS saved_queries_database_created_at_id_idx ON saved_queries (database_id, created_at DESC, id DESC);
@@ -0,0 +1,32 @@
+"""Trigram index for substring search in saved query history (ILIKE '%...%')."""
+import logging
+
+from psycopg2 import errors
+
+from manager.services.metadata_db.migrate import create_index_concurrently
+
+# Loaded by file path (module name is "migration_0005"): log under the runner package instead.
+logger = logging.getLogger("manager.services.metadata_db.migrations")
+
+# CREATE INDEX CONCURRENTLY can't run inside a transaction.
+TRANSACTIONAL = False
+
+
+def upgrade(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm';")
+        available = cur.fetchone() is not None
+        if available:
+            try:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+            except errors.InsufficientPrivilege:
+                # Role may not create extensions: don't fail startup over an optional index.
+                available = False
+    if not available:
+        # Search still works, just without index.
+        logger.warning("pg_trgm is not available: saved_queries.sql_query is left without trigram index.")
+        return
+    create_index_concurrently(conn, "saved_queries_sql_query_trgm_idx", """--sql
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS saved_queries_sql_query_trgm_idx
+        ON saved_queries USING gin (sql_query gin_trgm_ops);
+    """)
@@ -0,0 +1,4 @@
+-- DSN задачи заполнения содержит пароль: хранится, только пока задача в очереди или выполняется.
+ALTER TABLE fill_jobs ALTER COLUMN dsn DROP NOT NULL;
+
+UPDATE fill_jobs SET dsn = NULL WHERE status IN ('done', 'failed') AND dsn IS NOT NULL;
@@ -0,0 +1,117 @@
+import json
+import logging
+import select
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "metadata_changed"
+
+# Identifies this process in payloads, so the listener can skip own notifications.
+ORIGIN = uuid.uuid4().hex
+
+# Event kinds.
+METADATA = "metadata"   # fill / re-sync of a database committed
+QUERY = "query"         # saved query added
+
+
+@dataclass(frozen=True)
+class MetadataEvent:
+    """Change of metadata DB content; database_id None means "anything may have changed"."""
+    kind: str
+    database_id: Optional[int]
+    origin: str = ORIGIN
+
+
+_handlers: List[Callable[[MetadataEvent], None]] = []
+
+
+def subscribe(handler: Callable[[MetadataEvent], None]) -> None:
+    """Register handler called for local and remote events (e.g. cache invalidation)."""
+    _handlers.append(handler)
+
+
+def unsubscribe(handler: Callable[[MetadataEvent], None]) -> None:
+    _handlers.remove(handler)
+
+
+def dispatch(event: MetadataEvent) -> None:
+    """Call every handler; one failing handler doesn't stop others."""
+    for handler in list(_handlers):
+        try:
+            handler(event)
+        except Exception:
+            logger.exception("metadata event handler failed: %r", event)
+
+
+def notify(cur, kind: str, database_id: Optional[int]) -> MetadataEvent:
+    """
+    Queue NOTIFY inside current transaction: other workers get it only after commit.
+    Caller dispatches returned event locally once the transaction is committed.
+    """
+    event = MetadataEvent(kind=kind, database_id=database_id)
+    payload = json.dumps({"kind": event.kind, "database_id": event.database_id, "origin": event.origin})
+    cur.execute("SELECT pg_notify(%s, %s);", (CHANNEL, payload))
+    return event
+
+
+class MetadataListener(threading.Thread):
+    """
+    Background thread: LISTEN on metadata channel and dispatch events from other processes.
+    On (re)connect everything is invalidated, because notifications may have been missed.
+    """
+
+    def __init__(self, dsn: str, poll_timeout: float = 1.0, reconnect_delay: float = 5.0):
+        super().__init__(name="metadata-listener", daemon=True)
+        self.dsn = dsn
+        self.poll_timeout = poll_timeout
+        self.reconnect_delay = reconnect_delay
+        self._stopped = threading.Event()
+        self.ready = threading.Event()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join(timeout=self.poll_timeout + 1)
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("metadata listener failed, reconnecting in %ss", self.reconnect_delay)
+                self._stopped.wait(self.reconnect_delay)
+
+    def _listen(self) -> None:
+        conn = psycopg2.connect(self.dsn)
+        try:
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL};")
+            dispatch(MetadataEvent(kind=METADATA, database_id=None, origin=""))
+            self.ready.set()
+
+            while not self._stopped.is_set():
+                if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._handle(conn.notifies.pop(0).payload)
+        finally:
+            self.ready.clear()
+            conn.close()
+
+    def _handle(self, payload: str) -> None:
+        try:
+            data = json.loads(payload)
+            event = MetadataEvent(kind=data["kind"], database_id=data.get("database_id"), origin=data.get("origin", ""))
+        except (ValueError, KeyError, TypeError):
+            logger.warning("bad payload on %s: %r", CHANNEL, payload)
+            return
+        if event.origin != ORIGIN:
+            dispatch(event)
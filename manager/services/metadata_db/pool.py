@@ -1,21 +1,212 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import psycopg2
 from psycopg2 import pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN, connection
+
+from manager.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataPool:
+    """
+    Thread-safe bounded pool of connections to the metadata database.
+
+    Drop-in replacement of SimpleConnectionPool (getconn/putconn/closeall), which isn't
+    thread-safe and fails at once when exhausted. Here:
+    - checkout waits up to `checkout_timeout` seconds for a connection, then raises PoolError;
+    - connection returned inside a transaction is rolled back, a broken one is closed;
+    - checkout validates connection (ping if it was idle more than `ping_after` seconds);
+    - connections older than `max_lifetime` seconds are replaced (server-side memory, failover).
+    """
+
+    def __init__(
+        self,
+        minconn: int,
+        maxconn: int,
+        dsn: str,
+        checkout_timeout: float = settings.METADATA_POOL_CHECKOUT_TIMEOUT,
+        max_lifetime: float = settings.METADATA_POOL_MAX_LIFETIME,
+        ping_after: float = settings.METADATA_POOL_PING_AFTER,
+    ):
+        self.maxconn = maxconn
+        self.dsn = dsn
+        self.checkout_timeout = checkout_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.closed = False
+        self._cond = threading.Condition()
+        self._idle: Deque[Tuple[connection, float]] = deque()  # (conn, returned at)
+        self._created: Dict[int, float] = {}  # id(conn) -> opened at, for every open connection
+        self._in_use = 0
+        self._waiters = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        for _ in range(minconn):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic()))
+
+    def getconn(self, timeout: Optional[float] = None) -> connection:
+        """Checkout connection, waiting up to `timeout` (checkout_timeout by default) when all are in use."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            with self._cond:
+                conn, returned_at = self._acquire(deadline)
+
+            # Network I/O happens without holding the lock.
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._release()
+                    raise
+            elif not self._healthy(conn, time.monotonic() - returned_at):
+                self._release(conn)
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return conn
 
-_pool: pool.SimpleConnectionPool | None = None
+    def putconn(self, conn: connection, close: bool = False) -> None:
+        """Give connection back; open transaction is rolled back, broken or too old connection is closed."""
+        status = TRANSACTION_STATUS_UNKNOWN if conn.closed else conn.get_transaction_status()
+        if status not in (TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN):
+            try:
+                conn.rollback()
+                status = TRANSACTION_STATUS_IDLE
+            except psycopg2.Error:
+                status = TRANSACTION_STATUS_UNKNOWN
+        if close or status != TRANSACTION_STATUS_IDLE or self._expired(conn):
+            self._release(conn)
+            return
+        with self._cond:
+            if self.closed:
+                reusable = False
+            else:
+                reusable = True
+                self._in_use -= 1
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+        if not reusable:
+            self._release(conn)
+
+    def closeall(self) -> None:
+        """Close idle connections; connections in use are closed when returned."""
+        with self._cond:
+            self.closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._created.pop(id(conn), None)
+                conn.close()
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "max": self.maxconn,
+                "waiters": self._waiters,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "wait_seconds_total": round(self._wait_total, 6),
+                "wait_seconds_max": round(self._wait_max, 6),
+            }
+
+    # ---- internals ----
+
+    def _acquire(self, deadline: float) -> Tuple[Optional[connection], float]:
+        """
+        Under lock: take idle connection, or reserve a slot for a new one (None),
+        waiting until `deadline` when the pool is full.
+        """
+        while True:
+            if self.closed:
+                raise pool.PoolError("connection pool is closed")
+            if self._idle:
+                conn, returned_at = self._idle.pop()
+                self._in_use += 1
+                return conn, returned_at
+            if self._in_use < self.maxconn:
+                self._in_use += 1
+                return None, 0.0
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._timeouts += 1
+                raise pool.PoolError(f"connection pool exhausted: {self._in_use} connections in use")
+            self._waiters += 1
+            try:
+                self._cond.wait(remaining)
+            finally:
+                self._waiters -= 1
+
+    def _connect(self) -> connection:
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._created[id(conn)] = time.monotonic()
+        return conn
+
+    def _release(self, conn: Optional[connection] = None) -> None:
+        """Forget in-use slot, closing its connection. Takes the lock itself."""
+        if conn is not None and not conn.closed:
+            conn.close()
+        with self._cond:
+            if conn is not None:
+                self._created.pop(id(conn), None)
+            self._in_use -= 1
+            self._cond.notify()
+
+    def _expired(self, conn: connection) -> bool:
+        with self._cond:
+            created = self._created.get(id(conn))
+        return created is None or time.monotonic() - created > self.max_lifetime
+
+    def _healthy(self, conn: connection, idle_for: float) -> bool:
+        """Validate connection on checkout. No lock needed: connection isn't shared."""
+        if conn.closed or conn.get_transaction_status() != TRANSACTION_STATUS_IDLE or self._expired(conn):
+            return False
+        if idle_for < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            logger.info("dropping broken metadata connection")
+            return False
+
+
+_pool: MetadataPool | None = None
 
 def init_pool(dsn: str, minconn: int = 1, maxconn: int = 10):
     """
     Initialising global pool of database connections.
     NOTE: Must call from layer where we know DSN (for example from services/__init__.py).
+    Closed pool (e.g. by tearDown of a previous test class) is replaced with a new one.
     """
     global _pool
-    if _pool is None:
-        _pool = pool.SimpleConnectionPool(
+    if _pool is None or _pool.closed:
+        _pool = MetadataPool(
             minconn,
             maxconn,
             dsn=dsn,
         )
 
-def get_pool() -> pool.SimpleConnectionPool:
+def get_pool() -> MetadataPool:
     if _pool is None:
         raise RuntimeError("Connection pool is not initialized. Call init_pool(dsn) first.")
-    return _pool
\ No newline at end of file
+    return _pool
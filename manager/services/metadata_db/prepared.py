@@ -0,0 +1,60 @@
+import re
+import threading
+import weakref
+from dataclasses import dataclass, field
+from typing import Sequence, Set, Tuple
+
+from psycopg2.extensions import connection, cursor
+
+from manager.config import settings
+
+_PLACEHOLDER_RE = re.compile(r"%s")
+
+# Connection -> names of statements prepared in its session. Weak keys: closed connections
+# dropped by the pool take their entries with them.
+_prepared: "weakref.WeakKeyDictionary[connection, Set[str]]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Prepared:
+    """
+    Query parsed and planned by the server once per pooled connection (PREPARE),
+    then run by name (EXECUTE) with its cached plan.
+
+    `sql` uses positional %s placeholders like cur.execute(); `types` are SQL types of the parameters.
+    Queries with optional filters should be split into one statement per shape: a generic
+    plan of `$1 IS NULL OR col = $1` can't use an index.
+    """
+    name: str
+    types: Tuple[str, ...]
+    sql: str
+    server_sql: str = field(init=False, repr=False)
+
+    def __post_init__(self):
+        placeholders = len(_PLACEHOLDER_RE.findall(self.sql))
+        if placeholders != len(self.types):
+            raise ValueError(f"{self.name}: {placeholders} placeholders, {len(self.types)} types.")
+        numbers = iter(range(1, placeholders + 1))
+        object.__setattr__(self, "server_sql", _PLACEHOLDER_RE.sub(lambda _: f"${next(numbers)}", self.sql))
+
+    def execute(self, cur: cursor, params: Sequence = ()) -> None:
+        if not settings.METADATA_PREPARED_STATEMENTS:
+            cur.execute(self.sql, params)
+            return
+        self._prepare(cur.connection)
+        if params:
+            cur.execute(f"EXECUTE {self.name} ({', '.join(['%s'] * len(params))});", params)
+        else:
+            cur.execute(f"EXECUTE {self.name};")
+
+    def _prepare(self, conn: connection) -> None:
+        with _lock:
+            names = _prepared.setdefault(conn, set())
+        if self.name in names:
+            return
+        # PREPARE isn't transactional: statement outlives rollback of the current transaction.
+        types = f" ({', '.join(self.types)})" if self.types else ""
+        with conn.cursor() as cur:
+            cur.execute(f"PREPARE {self.name}{types} AS {self.server_sql}")
+        names.add(self.name)
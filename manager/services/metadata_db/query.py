@@ -1,22 +1,26 @@
-import psycopg2
+import base64
+import binascii
+import hashlib
+import json
+import re
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
 from psycopg2.extras import RealDictCursor
 
+from manager.config import settings
 from manager.schemas.metadata import Credential
-from manager.services.metadata_db.repo import get_credentials
+from manager.services.metadata_db.lookup import database_lookup
+from manager.services.metadata_db.migrate import split_statements
+from manager.services.metadata_db.target_pool import target_pools
 
 def execute_query(database_name: str, sql_query: str):
-    db_creds: Credential = get_credentials(database_name)
-    
-    dsn = (
-        f"host={db_creds.host_ipv4} "
-        f"port={db_creds.port} "
-        f"dbname={database_name} "
-        f"user={db_creds.username} "
-        f"password={db_creds.password}"
-    )
+    db_creds: Credential = database_lookup.credentials(database_name)
 
     try:
-        with psycopg2.connect(dsn) as conn:
+        # Pooled connection: no TCP/TLS/auth handshake per query.
+        with target_pools.connection(database_name, db_creds) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(sql_query)
 
@@ -27,3 +31,89 @@ def execute_query(database_name: str, sql_query: str):
                     raise Exception("Problems with SQL Query. (Can be only SELECT query.)")
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+def stream_query(database_name: str, sql_query: str, itersize: int = settings.QUERY_STREAM_ITERSIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Yield rows one by one using a server-side (named) cursor: only `itersize` rows
+    are held in memory whatever the result size. Query runs when the first row is requested;
+    connection goes back to the pool when generator is exhausted or closed.
+    """
+    db_creds: Credential = database_lookup.credentials(database_name)
+
+    with target_pools.connection(database_name, db_creds) as conn:
+        # Named cursor -> DECLARE ... CURSOR FOR <sql>, so only one SELECT statement is accepted.
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as cur:
+            cur.itersize = itersize
+            cur.execute(sql_query.strip().rstrip(";"))
+            for row in cur:
+                yield row
+
+# Quoted literal/identifier/dollar-quoted string (kept as is) or run of whitespace (collapsed).
+_SQL_TOKEN_RE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|\$(\w*)\$.*?\$\2\$)|\s+""", re.DOTALL)
+
+def normalize_sql(sql_query: str) -> str:
+    """Collapse whitespace outside of quotes and drop trailing semicolons: equal queries give equal text."""
+    collapsed = _SQL_TOKEN_RE.sub(lambda m: m.group(1) or " ", sql_query)
+    return collapsed.strip().rstrip(";").strip()
+
+def _sql_digest(sql_query: str) -> str:
+    return hashlib.sha256(normalize_sql(sql_query).encode("utf-8")).hexdigest()[:16]
+
+def encode_page_cursor(sql_query: str, offset: int) -> str:
+    """Opaque continuation token: position in result, bound to the query it came from."""
+    payload = json.dumps({"offset": offset, "sql": _sql_digest(sql_query)})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_page_cursor(sql_query: str, cursor: str) -> int:
+    """Return offset stored in token; ValueError if token is malformed or belongs to another query."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        offset, digest = int(payload["offset"]), payload["sql"]
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+        raise ValueError("Malformed cursor.")
+    if digest != _sql_digest(sql_query) or offset < 0:
+        raise ValueError("Cursor doesn't belong to this query.")
+    return offset
+
+@dataclass
+class QueryPage:
+    """One page of query result."""
+    rows: List[Dict[str, Any]]
+    offset: int
+    has_more: bool
+    total_estimate: Optional[int]   # planner row estimate, not exact count
+    database_id: Optional[int] = None
+
+def _estimate_rows(conn, sql_query: str) -> Optional[int]:
+    """Planner's row estimate for query (EXPLAIN without ANALYZE: nothing is executed)."""
+    # EXPLAIN covers only the first statement, the rest would run as is.
+    if len(split_statements(sql_query)) > 1:
+        raise ValueError("Only one SQL statement can be executed at a time.")
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql_query)
+        plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def execute_query_page(database_name: str, sql_query: str, limit: int, offset: int = 0) -> QueryPage:
+    """
+    Fetch at most `limit` rows starting at `offset` through a server-side cursor:
+    target database produces only offset + limit + 1 rows, never the whole result.
+    """
+    db_creds: Credential = database_lookup.credentials(database_name)
+    sql_query = sql_query.strip().rstrip(";")
+
+    with target_pools.connection(database_name, db_creds) as conn:
+        total_estimate = _estimate_rows(conn, sql_query)
+        # Named cursor -> DECLARE ... CURSOR FOR <sql>, so only one SELECT statement is accepted.
+        with conn.cursor(name=f"page_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as cur:
+            cur.execute(sql_query)
+            if offset:
+                # MOVE on server side: skipped rows are not sent to us.
+                cur.scroll(offset)
+            # One extra row tells whether there is a next page.
+            rows = cur.fetchmany(limit + 1)
+
+    return QueryPage(rows=rows[:limit], offset=offset, has_more=len(rows) > limit, total_estimate=total_estimate,
+                     database_id=db_creds.database_id)
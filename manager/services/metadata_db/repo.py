@@ -1,60 +1,179 @@
 from psycopg2.extras import RealDictCursor
 
-from typing import List
+from datetime import datetime
+from typing import List, Optional, Tuple
 
-from manager.schemas.metadata import Column, Credential, Database, SavedQuery, Table
+from manager.schemas.metadata import Column, Credential, Database, DatabaseTree, SavedQuery, SavedQueryView, Table, TableTree
+from .prepared import Prepared
 from .tx import tx
 
 # --- DATABASES ---
 def insert_database(name: str) -> Database:
-    """Insert a new database row and return it as a Pydantic model."""
-    # TODO: DDL doesn't have UNIQUE(name), so duplicates are possible.
+    """Insert a new database row and return it as a Pydantic model; existing row when name is taken."""
     with tx() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
         cur.execute(
-            "INSERT INTO databases(name) VALUES (%s) RETURNING id, name;",
+            "INSERT INTO databases(name) VALUES (%s) ON CONFLICT (name) DO NOTHING RETURNING id, name;",
             (name,),
         )
         row = cur.fetchone()
+        if row is None:
+            # Conflicting row is committed (READ COMMITTED: next statement sees it).
+            cur.execute("SELECT id, name FROM databases WHERE name = %s;", (name,))
+            row = cur.fetchone()
         # Database is frozen (read-only), safe to return
         return Database(id=row["id"], name=row["name"])
 
+_LIST_DATABASES = Prepared("repo_list_databases", (), "SELECT id, name FROM databases ORDER BY id;")
+
 def list_databases() -> List[Database]:
     """Return all databases as view models (name only)."""
     with tx(readonly=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("SELECT id, name FROM databases ORDER BY id;")
+        _LIST_DATABASES.execute(cur)
         rows = cur.fetchall()
         return [Database(id=r["id"], name=r["name"]) for r in rows]
 
-def list_tables(database: Database) -> List[Table]:
-    """Return all tables from database as view models."""
+_LIST_DATABASE_CREDENTIALS = Prepared("repo_list_database_credentials", (), """--sql
+                    SELECT
+                        d.id AS database_id, d.name,
+                        c.id, c.host_ipv4, c.port, c.username, c.password
+                    FROM databases AS d
+                    LEFT JOIN credentials AS c ON c.database_id = d.id
+                    ORDER BY d.id;
+                    """)
+
+def list_database_credentials() -> List[Tuple[Database, Optional[Credential]]]:
+    """Return every database with its credentials (None when it has none) in one query."""
     with tx(readonly=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("SELECT id, database_id, name FROM tables WHERE database_id = %s;", (database.id,))
+        _LIST_DATABASE_CREDENTIALS.execute(cur)
         rows = cur.fetchall()
-        return [Table(id=r["id"], database_id=r["database_id"], name=r["name"]) for r in rows] 
+        return [(Database(id=r["database_id"], name=r["name"]),
+                 None if r["id"] is None else Credential(id=r["id"], database_id=r["database_id"], host_ipv4=r["host_ipv4"],
+                                                         port=r["port"], username=r["username"], password=r["password"]))
+                for r in rows]
+
+# Order matches tables_database_schema_name_idx: a page is one index range scan.
+_LIST_TABLES = Prepared("repo_list_tables", ("int", "bigint"), """--sql
+                    SELECT id, database_id, schema_name, name
+                    FROM tables
+                    WHERE database_id = %s
+                    ORDER BY schema_name, name
+                    LIMIT %s;
+                    """)
+_LIST_TABLES_AFTER = Prepared("repo_list_tables_after", ("int", "text", "text", "bigint"), """--sql
+                    SELECT id, database_id, schema_name, name
+                    FROM tables
+                    WHERE database_id = %s AND (schema_name, name) > (%s, %s)
+                    ORDER BY schema_name, name
+                    LIMIT %s;
+                    """)
 
-def list_columns(table: Table) -> List[Column]:
-    """Return all columns from table as view models."""
+def list_tables(database: Database, limit: Optional[int] = None, after: Optional[Tuple[str, str]] = None) -> List[Table]:
+    """
+    Return tables of database ordered by (schema_name, name) as view models.
+    Keyset pagination: `after` is (schema_name, name) of the last row of previous page.
+    """
     with tx(readonly=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("SELECT id, table_id, name, data_type FROM columns WHERE table_id = %s;", (table.id,))
+        if after is None:
+            _LIST_TABLES.execute(cur, (database.id, limit))
+        else:
+            _LIST_TABLES_AFTER.execute(cur, (database.id, after[0], after[1], limit))
         rows = cur.fetchall()
-        return [Column(id=r["id"], table_id=r["table_id"], name=r["name"], data_type=r["data_type"]) for r in rows]    
+        return [Table(id=r["id"], database_id=r["database_id"], schema_name=r["schema_name"], name=r["name"]) for r in rows]
+
+_GET_TABLE = Prepared("repo_get_table", ("int",), "SELECT id, database_id, schema_name, name FROM tables WHERE id = %s;")
 
-def get_database_address_by_name(name: str) -> str:
-    """Return address of database in format domain:port."""
+def get_table(table_id: int) -> Optional[Table]:
     with tx(readonly=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""--sql
+        _GET_TABLE.execute(cur, (table_id,))
+        r = cur.fetchone()
+        return None if r is None else Table(id=r["id"], database_id=r["database_id"], schema_name=r["schema_name"], name=r["name"])
+
+_LIST_COLUMNS = Prepared("repo_list_columns", ("int", "int", "bigint"), """--sql
+                    SELECT id, table_id, name, data_type
+                    FROM columns
+                    WHERE table_id = %s AND id > %s
+                    ORDER BY id
+                    LIMIT %s;
+                    """)
+
+def list_columns(table: Table, limit: Optional[int] = None, after: Optional[int] = None) -> List[Column]:
+    """
+    Return columns of table in catalog order (by id) as view models.
+    Keyset pagination: `after` is id of the last row of previous page.
+    """
+    with tx(readonly=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # Ids are positive, so the first page is "after 0".
+        _LIST_COLUMNS.execute(cur, (table.id, 0 if after is None else after, limit))
+        rows = cur.fetchall()
+        return [Column(id=r["id"], table_id=r["table_id"], name=r["name"], data_type=r["data_type"]) for r in rows]
+
+_TREE_SQL = """--sql
+                    SELECT
+                        d.id, d.name,
+                        t.id, t.schema_name, t.name,
+                        c.id, c.name, c.data_type
+                    FROM databases AS d
+                    LEFT JOIN tables AS t ON t.database_id = d.id
+                    LEFT JOIN columns AS c ON c.table_id = t.id
+                    {where}
+                    ORDER BY d.id, t.id, c.id;
+                    """
+_LOAD_TREE = Prepared("repo_load_tree", (), _TREE_SQL.format(where=""))
+_LOAD_TREE_OF = Prepared("repo_load_tree_of", ("int[]",), _TREE_SQL.format(where="WHERE d.id = ANY(%s)"))
+
+def load_metadata_tree(database_ids: Optional[List[int]] = None) -> List[DatabaseTree]:
+    """
+    Return databases -> tables -> columns with one joined query.
+    `database_ids` limits the tree to given databases (all when None).
+    """
+    with tx(readonly=True) as conn, conn.cursor() as cur:
+        if database_ids is None:
+            _LOAD_TREE.execute(cur)
+        else:
+            _LOAD_TREE_OF.execute(cur, (list(database_ids),))
+        rows = cur.fetchall()
+
+    # Rows are ordered, so every database/table is a contiguous run.
+    trees: List[DatabaseTree] = []
+    tables: List[TableTree] = []
+    columns: List[Column] = []
+    database: Optional[Database] = None
+    table: Optional[Table] = None
+    for db_id, db_name, table_id, schema_name, table_name, column_id, column_name, data_type in rows:
+        if database is None or database.id != db_id:
+            if table is not None:
+                tables.append(TableTree(table=table, columns=columns))
+            if database is not None:
+                trees.append(DatabaseTree(database=database, tables=tables))
+            database, table, tables, columns = Database(id=db_id, name=db_name), None, [], []
+        if table_id is not None and (table is None or table.id != table_id):
+            if table is not None:
+                tables.append(TableTree(table=table, columns=columns))
+            table, columns = Table(id=table_id, database_id=db_id, schema_name=schema_name, name=table_name), []
+        if column_id is not None:
+            columns.append(Column(id=column_id, table_id=table_id, name=column_name, data_type=data_type))
+
+    if table is not None:
+        tables.append(TableTree(table=table, columns=columns))
+    if database is not None:
+        trees.append(DatabaseTree(database=database, tables=tables))
+    return trees
+
+_GET_DATABASE_ADDRESS = Prepared("repo_get_database_address", ("text",), """--sql
                     SELECT c.host_ipv4, c.port
                     FROM credentials AS c
                     JOIN databases AS d ON d.id = c.database_id
                     WHERE d.name = %s;
-                    """, (name,))
-        rows = cur.fetchone()
-        return f"{rows["host_ipv4"]}:{rows["port"]}"
-    
-def get_credentials(database_name: str) -> Credential:
-    """Return credential of database as view models."""
+                    """)
+
+def get_database_address_by_name(name: str) -> Optional[str]:
+    """Return address of database in format domain:port, None for unknown database."""
     with tx(readonly=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""--sql
+        _GET_DATABASE_ADDRESS.execute(cur, (name,))
+        row = cur.fetchone()
+        return None if row is None else f"{row['host_ipv4']}:{row['port']}"
+    
+_GET_CREDENTIALS = Prepared("repo_get_credentials", ("text",), """--sql
                    SELECT
                         d.id AS database_id,
                         c.id,
@@ -65,9 +184,16 @@ def get_credentials(database_name: str) -> Credential:
                     FROM credentials AS c
                     JOIN databases AS d ON c.database_id = d.id
                     WHERE d.name = %s;
-                    """, (database_name,))
+                    """)
+
+def get_credentials(database_name: str) -> Credential:
+    """Return credential of database as view models."""
+    with tx(readonly=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        _GET_CREDENTIALS.execute(cur, (database_name,))
         row = cur.fetchone()
-        
+        if row is None:
+            raise ValueError(f"Database {database_name} is not registered with credentials.")
+
         return Credential(id=row["id"], 
                           database_id=row["database_id"], 
                           host_ipv4=row["host_ipv4"], 
@@ -75,13 +201,41 @@ def get_credentials(database_name: str) -> Credential:
                           username=row["username"], 
                           password=row["password"])
         
-def list_saved_query() -> List[SavedQuery]:
-    """Return saved query as view models."""
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def list_saved_query(
+    limit: Optional[int] = None,
+    before: Optional[Tuple[datetime, int]] = None,
+    database_name: Optional[str] = None,
+    search: Optional[str] = None,
+) -> List[SavedQueryView]:
+    """
+    Return saved queries, newest first, with names of their databases.
+
+    Keyset pagination: `before` is (created_at, id) of the last row of previous page.
+    `database_name` filters by database, `search` by substring of SQL text (case-insensitive).
+    """
     with tx(readonly=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # psycopg2 inlines parameters, so unused filters fold to TRUE at plan time.
         cur.execute("""--sql
                    SELECT
-                        id, database_id, sql_query, created_at
-                    FROM saved_queries ORDER BY created_at DESC;
-                    """)
+                        q.id, q.database_id, d.name AS database_name, q.sql_query, q.created_at
+                    FROM saved_queries AS q
+                    JOIN databases AS d ON d.id = q.database_id
+                    WHERE (%(database_name)s::text IS NULL OR d.name = %(database_name)s)
+                    AND (%(search)s::text IS NULL OR q.sql_query ILIKE %(search)s)
+                    AND (%(before_created_at)s::timestamp IS NULL
+                         OR (q.created_at, q.id) < (%(before_created_at)s, %(before_id)s))
+                    ORDER BY q.created_at DESC, q.id DESC
+                    LIMIT %(limit)s;
+                    """, {
+                        "database_name": database_name,
+                        "search": None if search is None else f"%{_escape_like(search)}%",
+                        "before_created_at": None if before is None else before[0],
+                        "before_id": None if before is None else before[1],
+                        "limit": limit,
+                    })
         rows = cur.fetchall()
-        return [SavedQuery(id=r["id"], database_id=r["database_id"], sql_query=r["sql_query"], created_at=r["created_at"]) for r in rows]    
\ No newline at end of file
+        return [SavedQueryView(id=r["id"], database_id=r["database_id"], database_name=r["database_name"],
+                               sql_query=r["sql_query"], created_at=r["created_at"]) for r in rows]
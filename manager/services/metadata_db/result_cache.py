@@ -0,0 +1,137 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from manager.config import settings
+from .notify import METADATA, MetadataEvent, subscribe
+from .query import _SQL_TOKEN_RE, QueryPage, normalize_sql
+
+# (database name, normalized SQL, offset, limit): cached unit is one page of result.
+CacheKey = Tuple[str, str, int, int]
+
+# Functions whose result differs between runs of the same query: its result is never cached.
+_VOLATILE_RE = re.compile(
+    r"\b(?:(?:now|random|setseed|nextval|setval|currval|lastval|clock_timestamp|statement_timestamp|"
+    r"transaction_timestamp|timeofday|gen_random_uuid|uuid_generate_v[14]|txid_current|pg_sleep)\s*\(|"
+    r"current_(?:date|time|timestamp)\b|localtime(?:stamp)?\b)",
+    re.IGNORECASE,
+)
+
+
+def _page_size(page: QueryPage) -> int:
+    """Approximate cost of cached page in bytes: size of its JSON."""
+    return len(json.dumps(page.rows, default=str).encode("utf-8"))
+
+
+@dataclass
+class _Entry:
+    page: QueryPage
+    stored_at: float
+    size: int
+
+
+class QueryResultCache:
+    """
+    In-memory cache of query result pages, keyed by database and normalized SQL.
+
+    Entries live at most `ttl` seconds (a request may ask for fresher data with `max_staleness`)
+    and are evicted in LRU order when total size exceeds `max_bytes`.
+    Target databases don't tell us when their data changes, so cache is opt-in;
+    entries of a database are dropped when its metadata is re-synced (METADATA event).
+    Callers skip the cache for queries that are not `cacheable`.
+    """
+
+    def __init__(self, ttl: float, max_bytes: int, enabled: bool = True, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._by_database: Dict[int, Set[CacheKey]] = {}
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cacheable(sql_query: str) -> bool:
+        """False for queries calling volatile functions (now(), random(), nextval() ...) outside of quotes."""
+        unquoted = _SQL_TOKEN_RE.sub(lambda m: " " if m.group(1) else m.group(0), sql_query)
+        return _VOLATILE_RE.search(unquoted) is None
+
+    @staticmethod
+    def key(database_name: str, sql_query: str, offset: int, limit: int) -> CacheKey:
+        return database_name, normalize_sql(sql_query), offset, limit
+
+    def get(self, key: CacheKey, max_staleness: Optional[float] = None) -> Optional[Tuple[QueryPage, float]]:
+        """Return (page, age in seconds) or None if there is no entry fresh enough."""
+        max_age = self.ttl if max_staleness is None else min(self.ttl, max_staleness)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.stored_at > self.ttl:
+                self._evict(key)
+                entry = None
+            if entry is None or now - entry.stored_at > max_age:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.page, now - entry.stored_at
+
+    def put(self, key: CacheKey, page: QueryPage) -> None:
+        size = _page_size(page)
+        if size > self.max_bytes:
+            # Too big to cache at all.
+            return
+        with self._lock:
+            self._evict(key)
+            self._entries[key] = _Entry(page=page, stored_at=self._clock(), size=size)
+            if page.database_id is not None:
+                self._by_database.setdefault(page.database_id, set()).add(key)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+
+    def invalidate(self, database_id: Optional[int] = None) -> None:
+        """Drop entries of one database (or everything)."""
+        with self._lock:
+            if database_id is None:
+                self._entries.clear()
+                self._by_database.clear()
+                self._size = 0
+                return
+            for key in list(self._by_database.get(database_id, ())):
+                self._evict(key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+    def _evict(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= entry.size
+        keys = self._by_database.get(entry.page.database_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_database[entry.page.database_id]
+
+
+# Global variable, like connection pool.
+query_cache = QueryResultCache(ttl=settings.QUERY_CACHE_TTL,
+                               max_bytes=settings.QUERY_CACHE_MAX_BYTES,
+                               enabled=settings.QUERY_CACHE_ENABLED)
+
+
+def _on_event(event: MetadataEvent) -> None:
+    if event.kind == METADATA:
+        query_cache.invalidate(event.database_id)
+
+subscribe(_on_event)
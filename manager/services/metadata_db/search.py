@@ -0,0 +1,274 @@
+import re
+import sys
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from manager.config import settings
+from manager.schemas.metadata import Database, DatabaseTree, SearchHit
+from .cache import metadata_cache
+from .notify import METADATA, MetadataEvent, subscribe
+from .repo import load_metadata_tree
+
+TABLE = "table"
+COLUMN = "column"
+
+# Where a term was taken from. Matches by data type rank below matches by name.
+_TABLE_NAME, _COLUMN_NAME, _DATA_TYPE = 0, 1, 2
+_FIELD_WEIGHT = (1.0, 1.0, 0.5)
+_KIND_FIELDS = {
+    None: (_TABLE_NAME, _COLUMN_NAME, _DATA_TYPE),
+    TABLE: (_TABLE_NAME,),
+    COLUMN: (_COLUMN_NAME, _DATA_TYPE),
+}
+
+# Letters and digits only: like pg_trgm, snake_case names are split into words.
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# (field, lowercased text).
+Term = Tuple[int, str]
+# (schema, table, column, data type); column and data type are None for a table.
+Entry = Tuple[str, str, Optional[str], Optional[str]]
+
+
+def trigrams(text: str) -> Set[str]:
+    """Trigrams of every word of `text`, padded as in pg_trgm (two spaces before, one after)."""
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class _Segment:
+    """Entries of one database (ordered by schema and table) and entries of every term."""
+
+    def __init__(self, tree: DatabaseTree):
+        self.database = tree.database
+        self.entries: List[Entry] = []
+        self.postings: Dict[Term, List[int]] = {}
+        intern = sys.intern
+        for table_tree in sorted(tree.tables, key=lambda t: (t.table.schema_name, t.table.name)):
+            schema, table = intern(table_tree.table.schema_name), intern(table_tree.table.name)
+            self._add((_TABLE_NAME, table.lower()), (schema, table, None, None))
+            for column in table_tree.columns:
+                data_type = intern(column.data_type)
+                index = self._add((_COLUMN_NAME, column.name.lower()), (schema, table, intern(column.name), data_type))
+                self.postings.setdefault((_DATA_TYPE, data_type.lower()), []).append(index)
+
+    def _add(self, term: Term, entry: Entry) -> int:
+        self.entries.append(entry)
+        self.postings.setdefault(term, []).append(len(self.entries) - 1)
+        return len(self.entries) - 1
+
+
+class _Vocabulary:
+    """
+    Distinct terms of indexed databases with their trigrams. Shared by segments: the same names
+    and types repeat across tables and databases, so there are far fewer terms than columns.
+    Terms are counted per segment and removed with the last segment using them.
+    """
+
+    def __init__(self):
+        self.grams: Dict[str, Set[Term]] = {}
+        self.gram_counts: Dict[Term, int] = {}
+        self.refs: Dict[Term, int] = {}
+
+    def add(self, terms: Iterable[Term]) -> None:
+        for term in terms:
+            if term in self.refs:
+                self.refs[term] += 1
+                continue
+            self.refs[term] = 1
+            grams = trigrams(term[1])
+            self.gram_counts[term] = len(grams)
+            for gram in grams:
+                self.grams.setdefault(gram, set()).add(term)
+
+    def remove(self, terms: Iterable[Term]) -> None:
+        for term in terms:
+            self.refs[term] -= 1
+            if self.refs[term]:
+                continue
+            del self.refs[term]
+            del self.gram_counts[term]
+            for gram in trigrams(term[1]):
+                holders = self.grams[gram]
+                holders.discard(term)
+                if not holders:
+                    del self.grams[gram]
+
+    def match(self, query: str, grams: Set[str], fields: Iterable[int], threshold: float) -> List[Tuple[float, Term]]:
+        """
+        Terms sharing trigrams with `query`, scored by trigram similarity (as pg_trgm similarity())
+        plus a bonus for exact, prefix and substring match. Substring matches are kept even when
+        similarity is below `threshold` (short query in a long name).
+        """
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+
+        # Cheap filter before exact checks. Similarity is at most count / len(grams); a term
+        # containing the query lacks at most three of its grams (padding at both ends).
+        least = min(threshold * len(grams), len(grams) - 3)
+        matches = []
+        for term, count in shared.items():
+            if count < least or term[0] not in fields:
+                continue
+            text = term[1]
+            similarity = count / (len(grams) + self.gram_counts[term] - count)
+            if text == query:
+                bonus = 1.0
+            elif text.startswith(query):
+                bonus = 0.5
+            elif query in text:
+                bonus = 0.25
+            elif similarity >= threshold:
+                bonus = 0.0
+            else:
+                continue
+            matches.append(((similarity + bonus) * _FIELD_WEIGHT[term[0]], term))
+        return matches
+
+
+class MetadataSearchIndex:
+    """
+    In-memory trigram index over table names, column names and data types.
+
+    Segments are built per database from the metadata tree on first search and dropped on
+    METADATA events, like trees of MetadataTreeCache, and like them are kept in LRU order
+    within `max_items` entries (tables + columns). Query cost depends on the number of
+    distinct terms sharing trigrams with the query and on `limit`, not on the number of columns.
+    """
+
+    def __init__(self, max_items: int = settings.METADATA_CACHE_MAX_ITEMS):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._version = 0
+        self._segments: "OrderedDict[int, _Segment]" = OrderedDict()
+        self._size = 0
+        self._vocabulary = _Vocabulary()
+
+    def invalidate(self, database_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._version += 1
+            if database_id is None:
+                self._segments.clear()
+                self._size = 0
+                self._vocabulary = _Vocabulary()
+            else:
+                self._evict(database_id)
+
+    def search(
+        self,
+        query: str,
+        limit: int = settings.SEARCH_DEFAULT_LIMIT,
+        database_name: Optional[str] = None,
+        kind: Optional[str] = None,
+        threshold: float = settings.SEARCH_SIMILARITY_THRESHOLD,
+    ) -> List[SearchHit]:
+        """Best matches first; `kind` is TABLE, COLUMN or None for both."""
+        query = query.strip().lower()
+        grams = trigrams(query)
+        if not grams:
+            return []
+        fields = _KIND_FIELDS[kind]
+
+        _, databases = metadata_cache.databases()
+        if database_name is not None:
+            databases = [database for database in databases if database.name == database_name]
+
+        segments, transient = self._load(databases)
+        segments.sort(key=lambda segment: segment.database.name)
+        with self._lock:
+            matches = self._vocabulary.match(query, grams, fields, threshold)
+            for segment in transient:
+                self._vocabulary.remove(segment.postings)
+        matches.sort(key=lambda match: (-match[0], match[1]))
+
+        hits: List[SearchHit] = []
+        seen: Set[Tuple[int, int]] = set()
+        for score, term in matches:
+            for segment in segments:
+                for index in segment.postings.get(term, ()):
+                    if self._collect(hits, seen, segment, index, score, limit):
+                        return hits
+        return hits
+
+    @staticmethod
+    def _collect(hits: List[SearchHit], seen: Set[Tuple[int, int]], segment: _Segment,
+                 index: int, score: float, limit: int) -> bool:
+        """Append entry to `hits` unless already there; return True when `limit` is reached."""
+        # Column may match both by name and by data type.
+        if (segment.database.id, index) in seen:
+            return False
+        seen.add((segment.database.id, index))
+        schema, table, column, data_type = segment.entries[index]
+        hits.append(SearchHit(
+            kind=TABLE if column is None else COLUMN,
+            database_id=segment.database.id,
+            database_name=segment.database.name,
+            schema_name=schema,
+            table_name=table,
+            column_name=column,
+            data_type=data_type,
+            score=round(score, 4),
+        ))
+        return len(hits) >= limit
+
+    def _load(self, databases: List[Database]) -> Tuple[List[_Segment], List[_Segment]]:
+        """
+        Return (segments of `databases`, segments not stored); missing ones are built from one tree query.
+        Terms of segments not stored are in the vocabulary until the caller removes them.
+        """
+        with self._lock:
+            version = self._version
+            segments: Dict[int, _Segment] = {}
+            for database in databases:
+                if database.id in self._segments:
+                    self._segments.move_to_end(database.id)
+                    segments[database.id] = self._segments[database.id]
+
+        transient: List[_Segment] = []
+        missing = [database.id for database in databases if database.id not in segments]
+        if missing:
+            built = [_Segment(tree) for tree in load_metadata_tree(missing)]
+            with self._lock:
+                for segment in built:
+                    # Don't store data read before a concurrent invalidation.
+                    if version != self._version or not self._put(segment):
+                        self._vocabulary.add(segment.postings)
+                        transient.append(segment)
+            segments.update({segment.database.id: segment for segment in built})
+
+        return [segments[database.id] for database in databases if database.id in segments], transient
+
+    def _put(self, segment: _Segment) -> bool:
+        size = len(segment.entries)
+        if size > self.max_items:
+            # Too big to keep: built again for every search.
+            return False
+        self._evict(segment.database.id)
+        self._segments[segment.database.id] = segment
+        self._size += size
+        self._vocabulary.add(segment.postings)
+        while self._size > self.max_items:
+            self._evict(next(iter(self._segments)))
+        return True
+
+    def _evict(self, database_id: int) -> None:
+        segment = self._segments.pop(database_id, None)
+        if segment is not None:
+            self._size -= len(segment.entries)
+            self._vocabulary.remove(segment.postings)
+
+
+# Global variable, like connection pool.
+search_index = MetadataSearchIndex()
+
+
+def _on_event(event: MetadataEvent) -> None:
+    if event.kind == METADATA:
+        search_index.invalidate(event.database_id)
+
+subscribe(_on_event)
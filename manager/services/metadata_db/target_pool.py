@@ -0,0 +1,238 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Tuple
+
+import psycopg2
+from psycopg2 import pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, connection
+
+from manager.config import settings
+from manager.schemas.metadata import Credential
+
+logger = logging.getLogger(__name__)
+
+
+def _credentials_key(creds: Credential) -> Tuple:
+    return (creds.host_ipv4, creds.port, creds.username, creds.password)
+
+
+@dataclass
+class _TargetPool:
+    """Connections of one target database, guarded by registry lock."""
+    database_id: int
+    key: Tuple
+    conn_params: Dict
+    idle: Deque[Tuple[connection, float]] = field(default_factory=deque)  # (conn, returned at)
+    in_use: int = 0
+    # Replaced pool (credentials changed) only closes connections given back to it.
+    retired: bool = False
+
+
+class TargetPoolRegistry:
+    """
+    Keyed registry of connection pools to target (user) databases, one bounded pool
+    per registered database.
+
+    - `max_per_database` connections per target, `max_total` across all targets;
+      when budget is exhausted, idle connections of other targets are closed first,
+      then checkout waits up to `checkout_timeout` seconds.
+    - connections idle longer than `idle_timeout` are closed;
+    - checkout validates connection (ping if it was idle more than `ping_after` seconds);
+    - pool is dropped when credentials of its database change.
+    """
+
+    def __init__(
+        self,
+        max_per_database: int,
+        max_total: int,
+        idle_timeout: float,
+        checkout_timeout: float,
+        ping_after: float,
+    ):
+        self.max_per_database = max_per_database
+        self.max_total = max_total
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.ping_after = ping_after
+        self._cond = threading.Condition()
+        self._pools: Dict[str, _TargetPool] = {}
+        self._total = 0
+
+    @contextmanager
+    def connection(self, database_name: str, creds: Credential):
+        """
+        Checkout connection to target database; commit on success, rollback on error.
+
+        Example:
+            with target_pools.connection(name, creds) as conn, conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+        """
+        target, conn = self._checkout(database_name, creds)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self._checkin(target, conn)
+
+    def evict(self, database_id: Optional[int] = None) -> None:
+        """Drop pool of database (or all pools); connections in use are closed on return."""
+        with self._cond:
+            for name, target in list(self._pools.items()):
+                if database_id is None or target.database_id == database_id:
+                    self._retire(name)
+
+    def close_all(self) -> None:
+        self.evict()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._cond:
+            return {name: {"in_use": t.in_use, "idle": len(t.idle)} for name, t in self._pools.items()}
+
+    # ---- internals (call with self._cond held unless stated) ----
+
+    def _checkout(self, database_name: str, creds: Credential) -> Tuple[_TargetPool, connection]:
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self._cond:
+                target = self._target(database_name, creds)
+                self._reap_idle()
+                if target.idle:
+                    conn, returned_at = target.idle.pop()
+                    target.in_use += 1
+                    reserved = False
+                elif self._reserve(target):
+                    conn, returned_at = None, 0.0
+                    reserved = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise pool.PoolError(f"connection pool of {database_name!r} exhausted")
+                    self._cond.wait(remaining)
+                    continue
+
+            # Network I/O happens without holding the lock.
+            if reserved:
+                try:
+                    conn = psycopg2.connect(**target.conn_params)
+                except Exception:
+                    self._release(target)
+                    raise
+                return target, conn
+
+            if self._healthy(conn, time.monotonic() - returned_at):
+                return target, conn
+            self._release(target, conn)
+
+    def _checkin(self, target: _TargetPool, conn: connection) -> None:
+        reusable = not conn.closed and conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+        with self._cond:
+            if reusable and not target.retired:
+                target.in_use -= 1
+                target.idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self._release(target, conn)
+
+    def _target(self, database_name: str, creds: Credential) -> _TargetPool:
+        target = self._pools.get(database_name)
+        key = _credentials_key(creds)
+        if target is not None and target.key != key:
+            # Credentials changed: old connections must not be reused.
+            self._retire(database_name)
+            target = None
+        if target is None:
+            target = _TargetPool(
+                database_id=creds.database_id,
+                key=key,
+                conn_params=dict(
+                    host=creds.host_ipv4,
+                    port=creds.port,
+                    user=creds.username,
+                    password=creds.password,
+                    dbname=database_name,
+                ),
+            )
+            self._pools[database_name] = target
+        return target
+
+    def _reserve(self, target: _TargetPool) -> bool:
+        """Reserve a slot for a new connection, closing idle ones of other targets if needed."""
+        if target.in_use + len(target.idle) >= self.max_per_database:
+            return False
+        if self._total >= self.max_total and not self._close_oldest_idle():
+            return False
+        target.in_use += 1
+        self._total += 1
+        return True
+
+    def _release(self, target: _TargetPool, conn: Optional[connection] = None) -> None:
+        """Forget in-use slot (closing its connection). Takes the lock itself."""
+        if conn is not None and not conn.closed:
+            conn.close()
+        with self._cond:
+            target.in_use -= 1
+            self._total -= 1
+            self._cond.notify()
+
+    def _retire(self, database_name: str) -> None:
+        target = self._pools.pop(database_name)
+        target.retired = True
+        while target.idle:
+            conn, _ = target.idle.popleft()
+            conn.close()
+            self._total -= 1
+        self._cond.notify_all()
+
+    def _close_oldest_idle(self) -> bool:
+        oldest: Optional[_TargetPool] = None
+        for target in self._pools.values():
+            if target.idle and (oldest is None or target.idle[0][1] < oldest.idle[0][1]):
+                oldest = target
+        if oldest is None:
+            return False
+        conn, _ = oldest.idle.popleft()
+        conn.close()
+        self._total -= 1
+        return True
+
+    def _reap_idle(self) -> None:
+        expire_before = time.monotonic() - self.idle_timeout
+        for target in self._pools.values():
+            while target.idle and target.idle[0][1] < expire_before:
+                conn, _ = target.idle.popleft()
+                conn.close()
+                self._total -= 1
+
+    def _healthy(self, conn: connection, idle_for: float) -> bool:
+        """Validate connection on checkout. No lock needed: connection isn't shared."""
+        if conn.closed or conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            return False
+        if idle_for < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            logger.info("dropping broken connection to %s", conn.dsn)
+            return False
+
+
+# Global variable, like connection pool of metadata DB.
+target_pools = TargetPoolRegistry(
+    max_per_database=settings.TARGET_POOL_MAX_PER_DATABASE,
+    max_total=settings.TARGET_POOL_MAX_TOTAL,
+    idle_timeout=settings.TARGET_POOL_IDLE_TIMEOUT,
+    checkout_timeout=settings.TARGET_POOL_CHECKOUT_TIMEOUT,
+    ping_after=settings.TARGET_POOL_PING_AFTER,
+)
+
@@ -1,12 +1,41 @@
 from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
 from psycopg2.extensions import connection
 from .pool import get_pool
 
+
+@dataclass(frozen=True)
+class _Pin:
+    conn: connection
+    readonly: bool
+
+
+# Connection shared by tx() calls inside pinned(); context-local, so threads never share it.
+_pinned: ContextVar[Optional[_Pin]] = ContextVar("metadata_pinned_connection", default=None)
+
+
+def _configure(conn: connection, readonly: bool, autocommit: bool) -> None:
+    """
+    Switch session only when it differs: pooled connection keeps its mode, and
+    in autocommit mode every set_session() is a SET sent to the server.
+    """
+    if conn.autocommit != autocommit or bool(conn.readonly) != readonly:
+        conn.set_session(readonly=readonly, autocommit=autocommit)
+
+
 @contextmanager
-def tx(readonly: bool = False):
+def tx(readonly: bool = False, autocommit: Optional[bool] = None):
     """
     Context for transactions.
 
+    Read-only work runs in autocommit by default: every statement is its own
+    transaction, no BEGIN/COMMIT round trips and nothing is left open on return to pool.
+    Pass `autocommit=False` when several reads must see one snapshot.
+    Inside pinned() the pinned connection (and its transaction) is used.
+
     Example:
         from manager.services.metadata_db.tx import tx
 
@@ -15,21 +44,48 @@ def tx(readonly: bool = False):
                 cur.execute("SELECT * FROM databases;")
                 rows = cur.fetchall()
     """
-    
+    pin = _pinned.get()
+    if pin is not None:
+        if pin.readonly and not readonly:
+            raise RuntimeError("Write transaction inside read-only pinned connection.")
+        yield pin.conn
+        return
+
+    autocommit = readonly if autocommit is None else autocommit
+    if autocommit and not readonly:
+        raise ValueError("Writes always run in a transaction.")
+
     pool = get_pool()
     conn: connection = pool.getconn()
     try:
-        if readonly:
-            conn.set_session(readonly=True, autocommit=False)
-        else:
-            conn.set_session(readonly=False, autocommit=False)
-
+        _configure(conn, readonly, autocommit)
         yield conn
-        if not readonly:
+        if not autocommit:
             conn.commit()
     except Exception:
-        if not readonly:
+        if not autocommit and not conn.closed:
             conn.rollback()
         raise
     finally:
         pool.putconn(conn)
+
+
+@contextmanager
+def pinned(readonly: bool = False, autocommit: Optional[bool] = None):
+    """
+    Pin one connection for a block: every tx() inside shares it (and its transaction),
+    instead of checking out a connection per repo call. Commit happens at the end of the block.
+
+    Example:
+        with pinned(readonly=True):
+            table = get_table(table_id)
+            columns = list_columns(table)
+    """
+    if _pinned.get() is not None:
+        raise RuntimeError("Connection is already pinned.")
+    with tx(readonly, autocommit) as conn:
+        token = _pinned.set(_Pin(conn=conn, readonly=readonly))
+        try:
+            yield conn
+        finally:
+            _pinned.reset(token)
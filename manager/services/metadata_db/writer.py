@@ -1,26 +1,46 @@
 from urllib.parse import ParseResult
 import dsnparse
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Sequence
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from psycopg2 import connect
 from psycopg2.extras import execute_values
 
 from manager.config import settings
-from manager.core.extractor.base import ColumnInfo, ForeignKeyInfo, PrimaryKeyInfo
+from manager.core.extractor.base import ColumnInfo, ForeignKeyInfo, PrimaryKeyInfo, TableMetadata
 from manager.schemas.metadata import Column, Database, Credential, ForeignKey, ForeignKeyColumn, PrimaryKey, PrimaryKeyColumn, Table
+from manager.services.metadata_db.lookup import database_lookup
+from manager.services.metadata_db.notify import METADATA, QUERY, dispatch, notify
+from manager.services.metadata_db.prepared import Prepared
 from manager.services.metadata_db.tx import tx
 
 from manager.core.extractor.postgres import PostgresExtractor
 
-def _ensure_database(cur, db_name: str) -> Database:
+logger = logging.getLogger(__name__)
+
+_DATABASE_ID = Prepared("writer_database_id", ("text",), "SELECT id FROM databases WHERE name = %s;")
+
+def _ensure_database(cur, db_name: str) -> Tuple[Database, bool]:
+    """Return registered database by name (inserting it if needed) and whether it was created."""
+    # Serialize concurrent syncs of the same database: both would diff against the same stored rows.
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (db_name,))
+    _DATABASE_ID.execute(cur, (db_name,))
+    row = cur.fetchone()
+    if row is not None:
+        return Database(id=row[0], name=db_name), False
+
     cur.execute("""--sql
         INSERT INTO databases(name)
         values (%s)
         returning id
     """, (db_name,))
-    return Database(id=cur.fetchone()[0], name=db_name)
+    return Database(id=cur.fetchone()[0], name=db_name), True
 
 def _ensure_credentials(cur, database_id: int, parsed_dsn) -> Credential:
     host = parsed_dsn.host
@@ -28,12 +48,17 @@ def _ensure_credentials(cur, database_id: int, parsed_dsn) -> Credential:
     username = parsed_dsn.username
     password = parsed_dsn.password
 
+    # One credentials row per database (UNIQUE database_id).
     cur.execute("""--sql
         INSERT INTO credentials (database_id, host_ipv4, port, username, password)
         VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (database_id) DO UPDATE
+        SET host_ipv4 = EXCLUDED.host_ipv4, port = EXCLUDED.port,
+            username = EXCLUDED.username, password = EXCLUDED.password
         RETURNING id
     """, (database_id, host, port, username, password))
-    cred_id = cur.fetchone()[0]
+    row = cur.fetchone()
+    cred_id = row[0]
 
     return Credential(
         id=cred_id,
@@ -44,160 +69,460 @@ def _ensure_credentials(cur, database_id: int, parsed_dsn) -> Credential:
         password=password,
     )
 
-def _ensure_tables(cur, database_id: int, tables: List[Dict[str, Any]]) -> List[Table]:
-    ensured: List[Table] = []
-    for tables in tables:
-        table_name: str = tables["table_name"]
-        cur.execute("""--sql
-            INSERT INTO tables (database_id, name)
-            VALUES (%s, %s)
-            RETURNING id
-        """, (database_id, table_name))
-        table_id = cur.fetchone()[0]
-        ensured.append(Table(id=table_id, database_id=database_id, name=table_name))
+def _table_fingerprint(metadata: TableMetadata) -> str:
+    """Hash of everything stored for a table; equal fingerprints mean nothing to re-sync."""
+    payload = {
+        "columns": [(column["name"], column["data_type"]) for column in metadata["columns"]],
+        "primary_keys": [pkey["columns"] for pkey in metadata["primary_keys"]],
+        "foreign_keys": [
+            (fkey["columns"], fkey["referenced_schema"], fkey["referenced_table"], fkey["referenced_columns"])
+            for fkey in metadata["foreign_keys"]
+        ],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
 
-    return ensured
+def _insert_many(cur, sql: str, rows: Sequence[tuple], fetch: bool = False) -> List[tuple]:
+    """
+    Insert all rows of one hierarchy level with a single multi-row INSERT.
+    `sql` must contain one `VALUES %s` placeholder (see psycopg2.extras.execute_values).
+    """
+    if not rows:
+        return []
+    result = execute_values(cur, sql, rows, page_size=len(rows), fetch=fetch)
+    return result if fetch else []
 
-def _ensure_columns(cur, table_id: int, columns: List[ColumnInfo]) -> List[Column]:
-    ensured: List[Column] = []
-    for column in columns:
-        cur.execute("""--sql
-            INSERT INTO columns (table_id, name, data_type)
-            VALUES (%s, %s, %s)
-            RETURNING id
-        """, (table_id, column["name"], column["data_type"]))
-        column_id = cur.fetchone()[0]
-        ensured.append(Column(id=column_id, table_id=table_id, name=column["name"], data_type=column["data_type"]))
+# (schema, table name): tables are unique by it within database.
+TableKey = Tuple[str, str]
+
+def _ensure_tables(cur, database_id: int, fingerprints: Dict[TableKey, str]) -> List[Table]:
+    rows = _insert_many(cur, """--sql
+        INSERT INTO tables (database_id, schema_name, name, fingerprint)
+        VALUES %s
+        RETURNING id, schema_name, name
+    """, [(database_id, schema_name, name, fingerprint) for (schema_name, name), fingerprint in fingerprints.items()],
+        fetch=True)
+
+    return [Table(id=table_id, database_id=database_id, schema_name=schema_name, name=name)
+            for table_id, schema_name, name in rows]
+
+def _ensure_columns(cur, columns_by_table: Dict[int, List[ColumnInfo]]) -> Dict[int, List[Column]]:
+    rows = _insert_many(cur, """--sql
+        INSERT INTO columns (table_id, name, data_type)
+        VALUES %s
+        RETURNING id, table_id, name, data_type
+    """, [
+        (table_id, column["name"], column["data_type"])
+        for table_id, columns in columns_by_table.items()
+        for column in columns
+    ], fetch=True)
+
+    ensured: Dict[int, List[Column]] = {table_id: [] for table_id in columns_by_table}
+    for column_id, table_id, name, data_type in rows:
+        ensured[table_id].append(Column(id=column_id, table_id=table_id, name=name, data_type=data_type))
 
     return ensured
 
-def _ensure_primary_key(cur, table_id: int) -> PrimaryKey:
-    cur.execute("""--sql
+def _ensure_primary_keys(cur, pkeys_by_table: Dict[int, List[PrimaryKeyInfo]]) -> Dict[int, PrimaryKey]:
+    # Table has at most one primary key, so table_id is its natural key.
+    rows = _insert_many(cur, """--sql
         INSERT INTO primary_keys (table_id)
-        VALUES (%s)
-        RETURNING id
-    """, (table_id,))
-    primary_key_id: int = cur.fetchone()[0]
-    return PrimaryKey(id=primary_key_id, table_id=table_id)
+        VALUES %s
+        RETURNING id, table_id
+    """, [(table_id,) for table_id, pkeys in pkeys_by_table.items() if pkeys], fetch=True)
 
-def _ensure_primary_key_columns(cur, primary_key_id: int, pkeys: List[PrimaryKeyInfo]) -> List[PrimaryKeyColumn]:
-    ensured: List[PrimaryKeyColumn] = []
-    for pkey in pkeys:
-        for column, ordinal_position in zip(pkey["columns"], pkey["ordinal_positions"]):
-            cur.execute("""--sql
-                        SELECT id FROM columns WHERE name = %s
-                        """, (column,))
+    return {table_id: PrimaryKey(id=primary_key_id, table_id=table_id) for primary_key_id, table_id in rows}
 
-            column_id: int = cur.fetchone()[0]
+def _ensure_primary_key_columns(
+    cur,
+    pk_by_table: Dict[int, PrimaryKey],
+    pkeys_by_table: Dict[int, List[PrimaryKeyInfo]],
+    column_ids: Dict[Tuple[int, str], int],
+) -> List[PrimaryKeyColumn]:
+    ensured: List[PrimaryKeyColumn] = []
+    for table_id, primary_key in pk_by_table.items():
+        for pkey in pkeys_by_table[table_id]:
+            for column, ordinal_position in zip(pkey["columns"], pkey["ordinal_positions"]):
+                ensured.append(PrimaryKeyColumn(
+                    pk_id=primary_key.id,
+                    column_id=column_ids[(table_id, column)],
+                    ordinal_position=ordinal_position,
+                ))
 
-            cur.execute("""--sql
-                INSERT INTO primary_key_columns (pk_id, column_id, ordinal_position)
-                VALUES (%s, %s, %s)
-            """, (primary_key_id, column_id, ordinal_position))
-            ensured.append(PrimaryKeyColumn(pk_id=primary_key_id, column_id=column_id, ordinal_position=ordinal_position))
+    _insert_many(cur, """--sql
+        INSERT INTO primary_key_columns (pk_id, column_id, ordinal_position)
+        VALUES %s
+    """, [(pkc.pk_id, pkc.column_id, pkc.ordinal_position) for pkc in ensured])
 
     return ensured
 
-def _ensure_foreign_keys(cur, table_id: int, fkeys: List[ForeignKeyInfo], db_id: int) -> List[ForeignKey]:
+def _allocate_ids(cur, table: str, count: int) -> List[int]:
+    """Reserve `count` ids from the serial sequence of `table` in one round trip."""
+    if count == 0:
+        return []
+    cur.execute("""--sql
+        SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)
+    """, (table, count))
+    return [row[0] for row in cur.fetchall()]
+
+def _ensure_foreign_keys(
+    cur,
+    fkeys_by_table: Dict[int, List[ForeignKeyInfo]],
+    table_ids: Dict[TableKey, int],
+    column_ids: Dict[Tuple[int, str], int],
+) -> List[ForeignKey]:
+    # Resolve every FK against ids we already know; nothing is looked up row by row.
+    resolved: List[Tuple[int, int, List[Tuple[int, int]]]] = []
+    for table_id, fkeys in fkeys_by_table.items():
+        for fkey in fkeys:
+            ref_table_id = table_ids.get((fkey["referenced_schema"], fkey["referenced_table"]))
+            if ref_table_id is None:
+                continue
+            try:
+                pairs = [
+                    (column_ids[(table_id, src_name)], column_ids[(ref_table_id, tgt_name)])
+                    for src_name, tgt_name in fkey["column_pairs"]
+                ]
+            except KeyError:
+                continue
+            resolved.append((table_id, ref_table_id, pairs))
+
+    # foreign_keys has no natural key (several FKs may link the same tables),
+    # so ids are reserved up front and inserted explicitly.
+    fk_ids = _allocate_ids(cur, "foreign_keys", len(resolved))
+
     ensured: List[ForeignKey] = []
-    for fkey in fkeys:
-        cur.execute("""--sql
-            SELECT id FROM tables WHERE name = %s AND database_id = %s;
-        """, (fkey["referenced_table"], db_id,))
-
-        rows = cur.fetchall()[0]
-        ref_table_id: int = rows[0]
-
-        cur.execute("""--sql
-            INSERT INTO foreign_keys (table_id, referenced_table_id)
-            VALUES (%s, %s)
-            RETURNING id
-        """, (table_id, ref_table_id,))
-        foreign_key_id: int = cur.fetchone()[0]
-        ensured.append(
-            ForeignKey(id=foreign_key_id, table_id=table_id, referenced_table_id=ref_table_id))
-        
-        for ordinal_position, (src_name, tgt_name) in enumerate(fkey["column_pairs"], start=1):
-            # Source column id.
-            cur.execute("""--sql
-                SELECT id FROM columns
-                WHERE table_id = %s AND name = %s
-            """, (table_id, src_name))
-            src_col_id = cur.fetchone()[0]
-
-            # Ref table id.
-            cur.execute("""--sql
-                SELECT id FROM columns
-                WHERE table_id = %s AND name = %s
-            """, (ref_table_id, tgt_name))
-            tgt_col_id = cur.fetchone()[0]
-
-            cur.execute("""--sql
-                INSERT INTO foreign_key_columns
-                    (fk_id, column_id, referenced_column_id, ordinal_position)
-                VALUES (%s, %s, %s, %s)
-            """, (foreign_key_id, src_col_id, tgt_col_id, ordinal_position))
+    fk_columns: List[ForeignKeyColumn] = []
+    for foreign_key_id, (table_id, ref_table_id, pairs) in zip(fk_ids, resolved):
+        ensured.append(ForeignKey(id=foreign_key_id, table_id=table_id, referenced_table_id=ref_table_id))
+        for ordinal_position, (src_col_id, tgt_col_id) in enumerate(pairs, start=1):
+            fk_columns.append(ForeignKeyColumn(
+                fk_id=foreign_key_id,
+                column_id=src_col_id,
+                referenced_column_id=tgt_col_id,
+                ordinal_position=ordinal_position,
+            ))
+
+    _insert_many(cur, """--sql
+        INSERT INTO foreign_keys (id, table_id, referenced_table_id)
+        VALUES %s
+    """, [(fk.id, fk.table_id, fk.referenced_table_id) for fk in ensured])
+
+    _insert_many(cur, """--sql
+        INSERT INTO foreign_key_columns
+            (fk_id, column_id, referenced_column_id, ordinal_position)
+        VALUES %s
+    """, [(fkc.fk_id, fkc.column_id, fkc.referenced_column_id, fkc.ordinal_position) for fkc in fk_columns])
 
     return ensured
 
-def fill_metadata_from_dsn(dsn: str) -> None:
+_STORED_TABLES = Prepared("writer_stored_tables", ("int",), """--sql
+        SELECT id, schema_name, name, fingerprint FROM tables WHERE database_id = %s
+    """)
+
+def _load_stored_tables(cur, database_id: int) -> Dict[TableKey, Tuple[int, Optional[str]]]:
+    """Return (schema, name) -> (id, fingerprint) of tables already stored for database."""
+    _STORED_TABLES.execute(cur, (database_id,))
+    return {(schema_name, name): (table_id, fingerprint) for table_id, schema_name, name, fingerprint in cur.fetchall()}
+
+_STORED_COLUMNS = Prepared("writer_stored_columns", ("int",), """--sql
+        SELECT c.id, c.table_id, c.name, c.data_type
+        FROM columns AS c
+        JOIN tables AS t ON t.id = c.table_id
+        WHERE t.database_id = %s
+    """)
+
+def _load_stored_columns(cur, database_id: int) -> Dict[Tuple[int, str], Tuple[int, str]]:
+    """Return (table_id, name) -> (id, data_type) of columns already stored for database."""
+    _STORED_COLUMNS.execute(cur, (database_id,))
+    return {(table_id, name): (column_id, data_type) for column_id, table_id, name, data_type in cur.fetchall()}
+
+def _sync_columns(
+    cur,
+    columns_by_table: Dict[int, List[ColumnInfo]],
+    stored_columns: Dict[Tuple[int, str], Tuple[int, str]],
+) -> Dict[Tuple[int, str], int]:
+    """
+    Bring columns of the given (changed) tables in line with extracted ones.
+    Unchanged columns keep their ids, so foreign keys of other tables stay valid.
+    Return (table_id, name) -> id for the given tables.
+    """
+    column_ids: Dict[Tuple[int, str], int] = {}
+    to_insert: Dict[int, List[ColumnInfo]] = {}
+    to_update: List[Tuple[int, str]] = []
+    live: set = set()
+    for table_id, columns in columns_by_table.items():
+        for column in columns:
+            key = (table_id, column["name"])
+            live.add(key)
+            if key not in stored_columns:
+                to_insert.setdefault(table_id, []).append(column)
+                continue
+            column_id, data_type = stored_columns[key]
+            column_ids[key] = column_id
+            if data_type != column["data_type"]:
+                to_update.append((column_id, column["data_type"]))
+
+    to_delete = [
+        column_id
+        for (table_id, name), (column_id, _data_type) in stored_columns.items()
+        if table_id in columns_by_table and (table_id, name) not in live
+    ]
+    if to_delete:
+        cur.execute("DELETE FROM columns WHERE id = ANY(%s);", (to_delete,))
+
+    if to_update:
+        execute_values(cur, """--sql
+            UPDATE columns SET data_type = v.data_type
+            FROM (VALUES %s) AS v(id, data_type)
+            WHERE columns.id = v.id
+        """, to_update, page_size=len(to_update))
+
+    for columns in _ensure_columns(cur, to_insert).values():
+        for column in columns:
+            column_ids[(column.table_id, column.name)] = column.id
+
+    return column_ids
+
+@dataclass
+class SyncResult:
+    """Outcome of syncing one database's metadata with its live catalog."""
+    database: Database
+    created: bool
+    tables_inserted: int
+    tables_updated: int
+    tables_deleted: int
+    tables_unchanged: int
+
+def _extract(conn_params: Dict[str, Any]) -> Dict[TableKey, TableMetadata]:
+    """Extract the live catalog of a database, keyed by (schema, table name)."""
+    with PostgresExtractor(conn_params,
+                           workers=settings.EXTRACT_WORKERS,
+                           max_connections=settings.EXTRACT_MAX_CONNECTIONS_PER_SOURCE) as extractor:
+        extracted_tables = extractor.list_tables(conn_params["dbname"])
+        catalog = extractor.extract_catalog(conn_params["dbname"])
+
+    return {
+        (table["schema"], table["table_name"]): catalog.get(
+            (table["schema"], table["table_name"]),
+            TableMetadata(columns=[], primary_keys=[], foreign_keys=[]),
+        )
+        for table in extracted_tables
+    }
+
+# Called after each step of fill with name of the step and number of items of the source catalog.
+Progress = Callable[[str, int], None]
+
+def _no_progress(phase: str, count: int) -> None:
+    pass
+
+def _apply_catalog(
+    cur,
+    database: Database,
+    created: bool,
+    live: Dict[TableKey, TableMetadata],
+    progress: Progress = _no_progress,
+) -> SyncResult:
+    """
+    Diff live catalog against stored rows and apply only inserts, updates and deletes.
+    Every step is one statement per hierarchy level regardless of catalog size.
+    """
+    fingerprints: Dict[TableKey, str] = {key: _table_fingerprint(metadata) for key, metadata in live.items()}
+    stored_tables = {} if created else _load_stored_tables(cur, database.id)
+
+    new_keys = [key for key in live if key not in stored_tables]
+    changed_keys = [
+        key for key in live
+        if key in stored_tables and stored_tables[key][1] != fingerprints[key]
+    ]
+    deleted_ids = [table_id for key, (table_id, _fp) in stored_tables.items() if key not in live]
+
+    # 2-level SQL tables.
+    if deleted_ids:
+        cur.execute("DELETE FROM tables WHERE id = ANY(%s);", (deleted_ids,))
+
+    changed_ids: Dict[TableKey, int] = {key: stored_tables[key][0] for key in changed_keys}
+    if changed_ids:
+        execute_values(cur, """--sql
+            UPDATE tables SET fingerprint = v.fingerprint
+            FROM (VALUES %s) AS v(id, fingerprint)
+            WHERE tables.id = v.id
+        """, [(table_id, fingerprints[key]) for key, table_id in changed_ids.items()], page_size=len(changed_ids))
+        # Keys of changed tables are rebuilt from scratch.
+        cur.execute("DELETE FROM primary_keys WHERE table_id = ANY(%s);", (list(changed_ids.values()),))
+        cur.execute("DELETE FROM foreign_keys WHERE table_id = ANY(%s);", (list(changed_ids.values()),))
+
+    inserted: List[Table] = _ensure_tables(cur, database.id, {key: fingerprints[key] for key in new_keys})
+
+    table_ids: Dict[TableKey, int] = {key: table_id for key, (table_id, _fp) in stored_tables.items() if key in live}
+    table_ids.update({(table.schema_name, table.name): table.id for table in inserted})
+    progress("tables", len(live))
+
+    # Only new and changed tables are touched below.
+    metadata_by_table: Dict[int, TableMetadata] = {table.id: live[(table.schema_name, table.name)] for table in inserted}
+    metadata_by_table.update({table_id: live[key] for key, table_id in changed_ids.items()})
+
+    # 3-level SQL tables.
+    stored_columns = {} if created else _load_stored_columns(cur, database.id)
+    column_ids: Dict[Tuple[int, str], int] = {
+        (table_id, name): column_id
+        for (table_id, name), (column_id, _data_type) in stored_columns.items()
+        if table_id not in metadata_by_table
+    }
+    column_ids.update(_sync_columns(
+        cur, {table_id: metadata["columns"] for table_id, metadata in metadata_by_table.items()}, stored_columns))
+    progress("columns", sum(len(metadata["columns"]) for metadata in live.values()))
+
+    pkeys_by_table: Dict[int, List[PrimaryKeyInfo]] = {
+        table_id: metadata["primary_keys"] for table_id, metadata in metadata_by_table.items()}
+    pk_by_table: Dict[int, PrimaryKey] = _ensure_primary_keys(cur, pkeys_by_table)
+    _ensure_primary_key_columns(cur, pk_by_table, pkeys_by_table, column_ids)
+    progress("primary_keys", sum(1 for metadata in live.values() if metadata["primary_keys"]))
+
+    _ensure_foreign_keys(
+        cur,
+        {table_id: metadata["foreign_keys"] for table_id, metadata in metadata_by_table.items()},
+        table_ids,
+        column_ids,
+    )
+    progress("foreign_keys", sum(len(metadata["foreign_keys"]) for metadata in live.values()))
+
+    return SyncResult(
+        database=database,
+        created=created,
+        tables_inserted=len(new_keys),
+        tables_updated=len(changed_keys),
+        tables_deleted=len(deleted_ids),
+        tables_unchanged=len(live) - len(new_keys) - len(changed_keys),
+    )
+
+def sync_metadata_from_dsn(dsn: str, progress: Progress = _no_progress) -> SyncResult:
     """
     Atomic filling of metadata from DSN string.
+
+    Registers the database on first call; afterwards only tables whose fingerprint changed
+    are rewritten, and tables gone from the source are deleted.
+    `progress` is told about every finished step (extract, tables, columns, primary_keys, foreign_keys).
     """
     parsed_dsn = dsnparse.parse(dsn)
 
     db_name = parsed_dsn.paths[0]
+
+    # Other metadata can get just from remote connection with PostgresExtractor.
+    live = _extract(
+        dict(
+            host=parsed_dsn.host,
+            port=parsed_dsn.port,
+            user=parsed_dsn.username,
+            password=parsed_dsn.password,
+            dbname=db_name,
+            )
+        )
+    progress("extract", len(live))
+
     with tx() as conn:
             with conn.cursor() as cur:
                 # 1-level SQL tables.
-                database: Database = _ensure_database(cur, db_name)
-                
+                database, created = _ensure_database(cur, db_name)
+
                 # 2-level SQL tables.
                 credentials: Credential = _ensure_credentials(cur, database.id, parsed_dsn)
 
-                # Other metadata can get just from remote connection with PostgresExtractor.
-                extractor: PostgresExtractor = PostgresExtractor(
-                    dict(
-                        host=parsed_dsn.host,
-                        port=parsed_dsn.port,
-                        user=parsed_dsn.username,
-                        password=parsed_dsn.password,
-                        dbname=db_name,
-                        )
-                    )
-                
-                tables: List[Table] = _ensure_tables(cur, database.id, extractor.list_tables(db_name))
-                
-                # 3-level SQL tables.
-                # Ensure columns for each tables.
-                columns_by_table: Dict[int, List[Column]] = {}
-                for table in tables: 
-                    # TODO: big abstarction problem with "public" here.
-                    # TODO: should add database_id?
-                    columns: List[Column] = _ensure_columns(cur, table.id, extractor.list_columns("public", table.name))
-                    columns_by_table[table.id] = columns
-                
-                pk_by_tables: Dict[int, PrimaryKey] = {}
-                for table in tables: 
-                    # TODO: big abstarction problem with "public" here.
-                    pkey: PrimaryKey = _ensure_primary_key(cur, table.id)
-                    pkey_columns: List[PrimaryKeyColumn] = \
-                        _ensure_primary_key_columns(cur, pkey.id, extractor.list_primary_keys("public", table.name))
-                    
-                # TODO make foreign keys
-                for table in tables:
-                    # TODO: should add database_id?
-                    fkeys = _ensure_foreign_keys(cur, table.id, extractor.list_foreign_keys("public", table.name), database.id)
+                result = _apply_catalog(cur, database, created, live, progress)
+                event = notify(cur, METADATA, database.id)
+
+    # Committed: let local caches know; other workers get NOTIFY.
+    dispatch(event)
+    return result
+
+def fill_metadata_from_dsn(dsn: str) -> None:
+    """
+    Atomic filling of metadata from DSN string.
+    Already registered database is re-synced instead of inserted again.
+    """
+    sync_metadata_from_dsn(dsn)
+
+@dataclass
+class FillOutcome:
+    """Result of filling metadata from one DSN of a batch."""
+    dsn: str
+    result: Optional[SyncResult]    # None when fill failed
+    error: Optional[str]
+    seconds: float
+
+def _timed_fill(dsn: str) -> FillOutcome:
+    started = time.monotonic()
+    try:
+        result = sync_metadata_from_dsn(dsn)
+        return FillOutcome(dsn=dsn, result=result, error=None, seconds=time.monotonic() - started)
+    except Exception as e:
+        # Not the DSN: it contains the password; caller gets it with the outcome.
+        logger.exception("batch fill of one source failed")
+        return FillOutcome(dsn=dsn, result=None, error=str(e), seconds=time.monotonic() - started)
+
+def fill_metadata_batch(dsns: Sequence[str], workers: int = settings.FILL_BATCH_WORKERS) -> List[FillOutcome]:
+    """
+    Fill metadata from many DSNs concurrently, at most `workers` at a time.
+
+    Every DSN is extracted and written in its own transaction, so one failing source
+    doesn't affect the others. Outcomes are returned in order of `dsns`.
+    """
+    if not dsns:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(dsns)), thread_name_prefix="fill") as executor:
+        return list(executor.map(_timed_fill, dsns))
+
+def resync_database(database_name: str) -> SyncResult:
+    """Re-sync an already registered database using its stored credentials."""
+    creds: Credential = database_lookup.credentials(database_name)
+
+    live = _extract(
+        dict(
+            host=creds.host_ipv4,
+            port=creds.port,
+            user=creds.username,
+            password=creds.password,
+            dbname=database_name,
+            )
+        )
+
+    with tx() as conn:
+            with conn.cursor() as cur:
+                database, created = _ensure_database(cur, database_name)
+                result = _apply_catalog(cur, database, created, live)
+                event = notify(cur, METADATA, database.id)
+
+    dispatch(event)
+    return result
                     
                     
 def save_query(database_name: str, sql_query: str):
+    entry = database_lookup.get(database_name)
+    if entry is None:
+        raise ValueError(f"Database {database_name} is not registered.")
+    database_id: int = entry.database.id
+
     with tx() as conn:
             with conn.cursor() as cur:
-                cur.execute("""--sql
-                            SELECT id FROM databases WHERE name = %s
-                            """, (database_name,))
-
-                database_id: int = cur.fetchone()[0]
                 cur.execute("""--sql
                             INSERT INTO saved_queries (database_id, sql_query) VALUES(%s, %s);    
-                            """, (database_id, sql_query))
\ No newline at end of file
+                            """, (database_id, sql_query))
+                event = notify(cur, QUERY, database_id)
+
+    dispatch(event)
+
+def save_queries(rows: Sequence[Tuple[int, str, float]]) -> None:
+    """
+    Save many queries with one multi-row INSERT: rows are (database_id, sql_query, age in seconds).
+    Age is subtracted from the server clock, so created_at matches execution time, not write time.
+    """
+    if not rows:
+        return
+    with tx() as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, """--sql
+                INSERT INTO saved_queries (database_id, sql_query, created_at) VALUES %s;
+                """, rows, template="(%s, %s, NOW() - make_interval(secs => %s))", page_size=len(rows))
+            events = [notify(cur, QUERY, database_id) for database_id in sorted({row[0] for row in rows})]
+
+    for event in events:
+        dispatch(event)
@@ -1,10 +1,19 @@
+import json
 import unittest
+from unittest import mock
 import httpx
 
 from fastapi.testclient import TestClient
+from manager.schemas.metadata import FillJob
+from manager.services.metadata_db.cache import metadata_cache
+from manager.services.metadata_db.jobs import run_next_job
+from manager.services.metadata_db.lookup import database_lookup
 from manager.services.metadata_db.repo import insert_database
+from manager.services.metadata_db.result_cache import query_cache
 from manager.services.metadata_db.tx import tx
+from manager.services.metadata_db.writer import save_query
 from manager.tests.conf.configure import config
+from manager.tests.conf.schema import reset_schema
 from manager.app import create_app
 
 
@@ -16,109 +25,26 @@ class HealthEndpointTestCase(unittest.TestCase):
         cls.app = create_app(test_dsn=cls.dsn)
         cls.client = TestClient(cls.app)
 
-        # Setting up database.
-        schema_sql = """--sql
-            -- =======================
-            -- DROP EXISTING TABLES (если уже есть)
-            -- =======================
-            DROP TABLE IF EXISTS
-                credentials,
-                foreign_key_columns,
-                foreign_keys,
-                primary_key_columns,
-                primary_keys,
-                columns,
-                tables,
-                databases
-            CASCADE;
-
-            -- =======================
-            -- DATABASES
-            -- =======================
-            CREATE TABLE databases (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(255) NOT NULL
-            );
-
-            -- =======================
-            -- TABLES
-            -- =======================
-            CREATE TABLE tables (
-                id SERIAL PRIMARY KEY,
-                database_id INT NOT NULL REFERENCES databases(id) ON DELETE CASCADE,
-                name VARCHAR(255) NOT NULL
-            );
-
-            -- =======================
-            -- COLUMNS
-            -- =======================
-            CREATE TABLE columns (
-                id SERIAL PRIMARY KEY,
-                table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE,
-                name VARCHAR(255) NOT NULL,
-                data_type VARCHAR(50) NOT NULL
-            );
-
-            -- =======================
-            -- PRIMARY KEYS
-            -- =======================
-            CREATE TABLE primary_keys (
-                id SERIAL PRIMARY KEY,
-                table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE
-            );
-
-            CREATE TABLE primary_key_columns (
-                pk_id INT NOT NULL REFERENCES primary_keys(id) ON DELETE CASCADE,
-                column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE,
-                ordinal_position INT NOT NULL,                  -- порядок колонки внутри PK
-                PRIMARY KEY (pk_id, ordinal_position),
-                UNIQUE (pk_id, column_id)
-            );
-
-            -- =======================
-            -- FOREIGN KEYS
-            -- =======================
-            CREATE TABLE foreign_keys (
-                id SERIAL PRIMARY KEY,
-                table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE,            -- таблица-источник
-                referenced_table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE  -- таблица-цель
-            );
-
-            CREATE TABLE foreign_key_columns (
-                fk_id INT NOT NULL REFERENCES foreign_keys(id) ON DELETE CASCADE,
-                column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE,            -- колонка-источник
-                referenced_column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE, -- колонка-цель
-                ordinal_position INT NOT NULL,                                              -- порядок в составе FK
-                PRIMARY KEY (fk_id, ordinal_position),
-                UNIQUE (fk_id, column_id, referenced_column_id)
-            );
-
-            -- =======================
-            -- CREDENTIALS
-            -- =======================
-            CREATE TABLE credentials (
-                id SERIAL PRIMARY KEY,
-                database_id INT NOT NULL REFERENCES databases(id) ON DELETE CASCADE,
-                host_ipv4 VARCHAR(255) NOT NULL,
-                port INT NOT NULL CHECK (port > 0 AND port <= 65535),
-                username VARCHAR(255) NOT NULL,
-                password VARCHAR(255) NOT NULL
-            );
-        """
-
-        with tx() as conn:
-            with conn.cursor() as cur:
-                cur.execute(schema_sql)
+        # Setting up database: same migrations as on startup.
+        reset_schema(cls.dsn)
         
         insert_database("database1")
         insert_database("database2")
         insert_database("database3")
+        # Rows above were written around the writer, so drop whatever is cached.
+        metadata_cache.invalidate()
+        database_lookup.invalidate()
 
     def test_health_endpoint(self):
         response: httpx.Response = self.client.get("/health")
         self.assertEqual(response.status_code, 200)
         self.assertDictEqual({"status": "ok"}, response.json())
 
+    def test_pool_stats_endpoint(self):
+        response: httpx.Response = self.client.get("/health/pools")
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual({"in_use", "idle", "waiters", "wait_seconds_total"}, set(response.json()["metadata"]))
+
     def test_get_databases_endpoint(self):
         response: httpx.Response = self.client.get("/api/databases")
         self.assertEqual(response.status_code, 200)
@@ -132,6 +58,317 @@ class HealthEndpointTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual("localhost:55432", response.json())
 
+        self.assertEqual(404, self.client.get("/api/databases/no_such_database/address").status_code)
+
+    def test_get_databases_with_address(self):
+        response: httpx.Response = self.client.post("/api/metadata/fill", json={"dsn": self.dsn})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get("/api/databases", params={"include": "address"})
+        self.assertEqual(response.status_code, 200)
+        databases = {database["name"]: database for database in response.json()}
+        # Registered without DSN: no credentials, no address.
+        self.assertIsNone(databases["database1"]["address"])
+        self.assertEqual("localhost:55432", databases["metadata_test"]["address"])
+        self.assertNotIn("address", self.client.get("/api/databases").json()[0])
+
+        page = self.client.get("/api/databases", params={"include": "address", "limit": 1})
+        self.assertEqual([databases["database1"]], page.json())
+        self.assertIn("X-Next-Cursor", page.headers)
+        self.assertEqual(422, self.client.get("/api/databases", params={"include": "tables"}).status_code)
+
+    def test_get_metadata_info(self):
+        response: httpx.Response = self.client.post("/api/metadata/fill", json={"dsn": self.dsn})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get("/api/metadata/info")
+        self.assertEqual(response.status_code, 200)
+        by_name = {db["database_name"]: db for db in response.json()["metadata"]}
+        self.assertEqual([], by_name["database1"]["tables"])
+        tables = {t["table_name"]: t["columns"] for t in by_name["metadata_test"]["tables"]}
+        self.assertEqual(["id", "name"], tables["databases"])
+
+    def test_get_metadata_info_not_modified(self):
+        response: httpx.Response = self.client.get("/api/metadata/info")
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+
+        response = self.client.get("/api/metadata/info", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        # Fill commits -> new version.
+        response = self.client.post("/api/metadata/fill", json={"dsn": self.dsn})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get("/api/metadata/info", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(etag, response.headers["ETag"])
+
+    def _all_pages(self, url: str, limit: int) -> list:
+        rows, cursor = [], None
+        while True:
+            params = {"limit": limit} if cursor is None else {"limit": limit, "cursor": cursor}
+            response: httpx.Response = self.client.get(url, params=params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.json()), limit)
+            rows.extend(response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                return rows
+
+    def test_drill_down_pages(self):
+        response: httpx.Response = self.client.post("/api/metadata/fill", json={"dsn": self.dsn})
+        self.assertEqual(response.status_code, 200)
+
+        databases = self._all_pages("/api/databases", 2)
+        self.assertEqual(self.client.get("/api/databases").json(), databases)
+
+        tables = self._all_pages("/api/databases/metadata_test/tables", 3)
+        names = [(table["schema_name"], table["name"]) for table in tables]
+        self.assertEqual(sorted(names), names)
+        self.assertIn(("public", "saved_queries"), names)
+
+        table_id = next(table["id"] for table in tables if table["name"] == "databases")
+        columns = self._all_pages(f"/api/tables/{table_id}/columns", 1)
+        self.assertEqual([("id", "integer"), ("name", "character varying(255)")],
+                         [(column["name"], column["data_type"]) for column in columns])
+
+        self.assertEqual(404, self.client.get("/api/databases/no_such_database/tables").status_code)
+        self.assertEqual(404, self.client.get("/api/tables/0/columns").status_code)
+        self.assertEqual(400, self.client.get(f"/api/tables/{table_id}/columns", params={"cursor": "garbage"}).status_code)
+
+    def test_search_metadata(self):
+        response: httpx.Response = self.client.post("/api/metadata/fill", json={"dsn": self.dsn})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get("/api/metadata/search", params={"q": "saved_queries", "kind": "table"})
+        self.assertEqual(response.status_code, 200)
+        hit = response.json()[0]
+        self.assertEqual(("table", "metadata_test", "public", "saved_queries", None),
+                         (hit["kind"], hit["database_name"], hit["schema_name"], hit["table_name"], hit["column_name"]))
+
+        # Typo still finds the column.
+        response = self.client.get("/api/metadata/search", params={"q": "sql_qery", "database": "metadata_test", "limit": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([("saved_queries", "sql_query")],
+                         [(hit["table_name"], hit["column_name"]) for hit in response.json()])
+
+        response = self.client.get("/api/metadata/search", params={"q": "id", "kind": "index"})
+        self.assertEqual(response.status_code, 422)
+
+    def test_execute_query(self):
+        response: httpx.Response = self.client.post("/api/metadata/fill", json={"dsn": self.dsn})
+        self.assertEqual(response.status_code, 200)
+
+        for _ in range(2):
+            response = self.client.post("/api/metadata/execute",
+                                        json={"database_name": "metadata_test", "sql_query": "SELECT 1 AS one;"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual({"status": "ok", "result": [{"one": 1}], "offset": 0, "has_more": False,
+                              "next_cursor": None, "total_estimate": 1}, response.json())
+
+        # EXPLAIN would wrap only the first statement and run the rest.
+        response = self.client.post("/api/metadata/execute", json={
+            "database_name": "metadata_test", "sql_query": "SELECT 1 AS one; CREATE TABLE explain_leak (id int)"})
+        self.assertEqual({"status": "error", "message": "Only one SQL statement can be executed at a time."},
+                         response.json()["result"])
+        with tx(readonly=True) as conn, conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('explain_leak')")
+            self.assertIsNone(cur.fetchone()[0])
+
+        response = self.client.post("/api/metadata/execute",
+                                    json={"database_name": "metadata_test", "sql_query": "SELECT ';' AS one"})
+        self.assertEqual([{"one": ";"}], response.json()["result"])
+
+    def test_execute_query_history(self):
+        response: httpx.Response = self.client.post("/api/metadata/fill", json={"dsn": self.dsn})
+        self.assertEqual(response.status_code, 200)
+
+        # Writer thread isn't started without lifespan: history is written at once.
+        for _ in range(3):
+            response = self.client.post("/api/metadata/execute",
+                                        json={"database_name": "metadata_test", "sql_query": "SELECT 'history' AS h;"})
+            self.assertEqual(response.status_code, 200)
+
+        response = self.client.get("/api/metadata/query_list", params={"q": "'history'"})
+        self.assertEqual(response.status_code, 200)
+        # Repeated query is saved once.
+        self.assertEqual(["SELECT 'history' AS h;"], [q["sql_query"] for q in response.json()])
+
+    def test_execute_query_cached(self):
+        response: httpx.Response = self.client.post("/api/metadata/fill", json={"dsn": self.dsn})
+        self.assertEqual(response.status_code, 200)
+        self.addCleanup(query_cache.invalidate)
+
+        with mock.patch.object(query_cache, "enabled", True):
+            request = {"database_name": "metadata_test", "sql_query": "SELECT current_database() AS name"}
+            first = self.client.post("/api/metadata/execute", json=request)
+            self.assertEqual("MISS", first.headers["X-Cache"])
+
+            second = self.client.post("/api/metadata/execute", json={**request, "sql_query": "SELECT  current_database()  AS name;"})
+            self.assertEqual("HIT", second.headers["X-Cache"])
+            self.assertEqual(first.json()["result"], second.json()["result"])
+
+            third = self.client.post("/api/metadata/execute", json={**request, "max_staleness": 0})
+            self.assertEqual("MISS", third.headers["X-Cache"])
+
+            # Re-sync drops cached results of the database.
+            response = self.client.post("/api/databases/metadata_test/resync")
+            self.assertEqual(response.status_code, 200)
+            fourth = self.client.post("/api/metadata/execute", json=request)
+            self.assertEqual("MISS", fourth.headers["X-Cache"])
+
+            # Volatile function: always executed, cache is not used.
+            volatile = self.client.post("/api/metadata/execute", json={**request, "sql_query": "SELECT now() AS ts"})
+            self.assertNotIn("X-Cache", volatile.headers)
+            volatile = self.client.post("/api/metadata/execute", json={**request, "sql_query": "SELECT now() AS ts"})
+            self.assertNotIn("X-Cache", volatile.headers)
+
+    def test_execute_query_pages(self):
+        response: httpx.Response = self.client.post("/api/metadata/fill", json={"dsn": self.dsn})
+        self.assertEqual(response.status_code, 200)
+
+        sql_query = "SELECT n FROM generate_series(1, 25) AS n ORDER BY n"
+        response = self.client.post("/api/metadata/execute",
+                                    json={"database_name": "metadata_test", "sql_query": sql_query, "limit": 10})
+        self.assertEqual(response.status_code, 200)
+        page = response.json()
+        self.assertEqual(list(range(1, 11)), [r["n"] for r in page["result"]])
+        self.assertTrue(page["has_more"])
+        self.assertIsInstance(page["total_estimate"], int)
+        first_cursor = page["next_cursor"]
+
+        seen = [r["n"] for r in page["result"]]
+        while page["has_more"]:
+            response = self.client.post("/api/metadata/execute",
+                                        json={"database_name": "metadata_test", "sql_query": sql_query,
+                                              "limit": 10, "cursor": page["next_cursor"]})
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            seen.extend(r["n"] for r in page["result"])
+        self.assertEqual(list(range(1, 26)), seen)
+        self.assertEqual(20, page["offset"])
+
+        # Token is bound to its query.
+        response = self.client.post("/api/metadata/execute",
+                                    json={"database_name": "metadata_test", "sql_query": "SELECT 1",
+                                          "cursor": first_cursor})
+        self.assertEqual(response.status_code, 400)
+
+    def test_execute_query_stream(self):
+        response: httpx.Response = self.client.post("/api/metadata/fill", json={"dsn": self.dsn})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post("/api/metadata/execute/stream",
+                                    json={"database_name": "metadata_test",
+                                          "sql_query": "SELECT n, n * 1.5 AS half FROM generate_series(1, 5000) AS n;"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual("application/x-ndjson", response.headers["content-type"])
+        lines = response.text.splitlines()
+        self.assertEqual(5000, len(lines))
+        self.assertEqual({"n": 5000, "half": 7500.0}, json.loads(lines[-1]))
+
+        response = self.client.post("/api/metadata/execute/stream",
+                                    json={"database_name": "metadata_test", "sql_query": "DELETE FROM databases;"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_fill_batch(self):
+        bad_dsn = self.dsn.rsplit("/", 1)[0] + "/no_such_database"
+        response: httpx.Response = self.client.post("/api/metadata/fill/batch", json={"dsns": [self.dsn, bad_dsn]})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual("partial", body["status"])
+        self.assertEqual(["ok", "error"], [r["status"] for r in body["results"]])
+        self.assertIsNotNone(body["results"][1]["error"])
+
+        response = self.client.post("/api/metadata/fill/batch", json={"dsns": []})
+        self.assertEqual(response.status_code, 422)
+
+    def test_fill_job(self):
+        response: httpx.Response = self.client.post("/api/metadata/fill/jobs", json={"dsn": self.dsn})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["id"]
+        self.assertEqual("queued", response.json()["status"])
+        self.assertNotIn("dsn", response.json())
+
+        # Lifespan (and its workers) doesn't run in this client: take the job here.
+        self.assertEqual(job_id, run_next_job())
+
+        response = self.client.get(f"/api/metadata/fill/jobs/{job_id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual("done", response.json()["status"])
+
+        response = self.client.get(f"/api/metadata/fill/jobs/{job_id}/events")
+        self.assertEqual("text/event-stream", response.headers["content-type"].split(";")[0])
+        events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+        self.assertEqual(["done"], [event["status"] for event in events])
+
+        response = self.client.get("/api/metadata/fill/jobs/0")
+        self.assertEqual(response.status_code, 404)
+
+    def test_fill_job_events_when_job_is_deleted(self):
+        response: httpx.Response = self.client.post("/api/metadata/fill/jobs", json={"dsn": self.dsn})
+        job_id = response.json()["id"]
+        queued = self.client.get(f"/api/metadata/fill/jobs/{job_id}").json()
+        with tx() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM fill_jobs WHERE id = %s;", (job_id,))
+
+        # Stream starts with the queued job; the row is gone on the next poll.
+        with mock.patch("manager.api.routers.metadata.get_fill_job", side_effect=[FillJob(**queued), None]), \
+                mock.patch("manager.api.routers.metadata.settings.FILL_JOB_EVENTS_INTERVAL", 0):
+            response = self.client.get(f"/api/metadata/fill/jobs/{job_id}/events")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(["data: " + json.dumps({"id": job_id})],
+                         [line for line in response.text.splitlines() if line.startswith("data: ")][1:])
+        self.assertIn("event: gone", response.text.splitlines())
+
+    def test_resync_database(self):
+        response: httpx.Response = self.client.post("/api/metadata/fill", json={"dsn": self.dsn})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post("/api/databases/metadata_test/resync")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual("metadata_test", response.json()["database_name"])
+        self.assertEqual(0, response.json()["tables_inserted"])
+        self.assertEqual(0, response.json()["tables_deleted"])
+
+        response = self.client.post("/api/databases/no_such_database/resync")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual("Database no_such_database not found or registered without credentials.", response.json()["detail"])
+        # Registered without DSN: nothing to connect with.
+        self.assertEqual(404, self.client.post("/api/databases/database1/resync").status_code)
+
+    def test_query_list_pages(self):
+        with tx() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM saved_queries;")
+        for i in range(5):
+            save_query("database1", f"SELECT {i}")
+        save_query("database2", "SELECT '100%' AS share")
+
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 2, "database": "database1"}
+            if cursor is not None:
+                params["cursor"] = cursor
+            response: httpx.Response = self.client.get("/api/metadata/query_list", params=params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(q["sql_query"] for q in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+        self.assertEqual([f"SELECT {i}" for i in reversed(range(5))], seen)
+
+        # % in search text is literal, not a wildcard.
+        response = self.client.get("/api/metadata/query_list", params={"q": "0%"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([("database2", "SELECT '100%' AS share")],
+                         [(q["database_name"], q["sql_query"]) for q in response.json()])
+
+        response = self.client.get("/api/metadata/query_list", params={"cursor": "garbage"})
+        self.assertEqual(response.status_code, 400)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
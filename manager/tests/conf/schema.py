@@ -0,0 +1,23 @@
+import psycopg2
+
+from manager.services.metadata_db.migrate import migrate
+
+
+def drop_schema(dsn: str) -> None:
+    """Drop every object of the test database (tables, migrations log, extensions)."""
+    conn = psycopg2.connect(dsn)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("""--sql
+                DROP SCHEMA IF EXISTS public CASCADE;
+                CREATE SCHEMA public;
+            """)
+    finally:
+        conn.close()
+
+
+def reset_schema(dsn: str) -> None:
+    """Empty test database and build metadata schema with migrations, as on startup."""
+    drop_schema(dsn)
+    migrate(dsn)
@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 import psycopg2
 from manager.core.extractor.postgres import PostgresExtractor
 from tests.conf.configure import config
@@ -125,6 +126,58 @@ class TestPostgresExtractor(unittest.TestCase):
         
         
 
+    def test_extract_catalog_groups_by_table(self):
+        """Check that one bulk extraction covers every table and matches per-table views."""
+        catalog = self.extractor.extract_catalog()
+
+        self.assertEqual({("public", "tmp_users"), ("public", "tmp_orders"), ("public", "tmp_products"), ("public", "tmp_managers")},
+                         set(catalog.keys()))
+
+        for (schema, table_name), table_metadata in catalog.items():
+            self.assertEqual(table_metadata["columns"], self.extractor.list_columns(schema, table_name))
+            self.assertEqual(table_metadata["primary_keys"], self.extractor.list_primary_keys(schema, table_name))
+            self.assertEqual(table_metadata["foreign_keys"], self.extractor.list_foreign_keys(schema, table_name))
+
+        self.assertEqual([{'constraint_name': 'tmp_managers_pkey', 'columns': ['passcard_id', 'passcard_region'], 'ordinal_positions': [1, 2]}],
+                         catalog[("public", "tmp_managers")]["primary_keys"])
+        self.assertEqual([('user_id', 'id')], catalog[("public", "tmp_orders")]["foreign_keys"][0]["column_pairs"])
+
+    def test_parallel_extract_catalog_matches_serial(self):
+        """Check that catalog split by schema over several connections equals the one-connection read."""
+        self._exec_sql("""--sql
+            DROP SCHEMA IF EXISTS tmp_sales, tmp_hr CASCADE;
+            CREATE SCHEMA tmp_sales;
+            CREATE SCHEMA tmp_hr;
+            CREATE TABLE tmp_hr.staff (id SERIAL PRIMARY KEY, user_id INT REFERENCES public.tmp_users(id));
+            CREATE TABLE tmp_sales.deals (id SERIAL PRIMARY KEY, staff_id INT REFERENCES tmp_hr.staff(id));
+            CREATE TABLE tmp_sales.regions (code TEXT PRIMARY KEY);
+        """)
+        self.addCleanup(self._exec_sql, "DROP SCHEMA IF EXISTS tmp_sales, tmp_hr CASCADE;")
+
+        with PostgresExtractor(self.conn_params) as serial_extractor:
+            serial = serial_extractor.extract_catalog()
+        # Spy: parallel read silently falls back to one connection when it can't split.
+        with PostgresExtractor(self.conn_params, workers=3, max_connections=4) as extractor, \
+                mock.patch.object(PostgresExtractor, "_fetch_in_snapshot", autospec=True,
+                                  side_effect=PostgresExtractor._fetch_in_snapshot) as fetch_in_snapshot:
+            parallel = extractor.extract_catalog()
+            # Connection of extractor is usable as before.
+            self.assertIn("tmp_users", {t["table_name"] for t in extractor.list_tables()})
+
+        calls = [c.args for c in fetch_in_snapshot.call_args_list]
+        self.assertEqual(3, len(calls))
+        self.assertEqual(1, len({snapshot_id for _, snapshot_id, _ in calls}))
+        schemas = [schema for _, _, chunk in calls for schema in chunk]
+        self.assertEqual(len(schemas), len(set(schemas)))
+        self.assertLessEqual({"public", "tmp_sales", "tmp_hr"}, set(schemas))
+
+        self.assertEqual(list(serial.items()), list(parallel.items()))
+        self.assertEqual("tmp_hr", parallel[("tmp_sales", "deals")]["foreign_keys"][0]["referenced_schema"])
+
+    def test_split_schemas_balances_relations(self):
+        chunks = PostgresExtractor._split_schemas([("a", 10), ("b", 6), ("c", 5), ("d", 1)], 2)
+        self.assertEqual([["a", "d"], ["b", "c"]], chunks)
+
     def test_table_schemas_are_valid(self):
         """Check that all returned schemas are non-empty and not system schemas."""
         tables = self.extractor.list_tables()
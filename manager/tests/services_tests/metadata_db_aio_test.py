@@ -0,0 +1,44 @@
+import threading
+import unittest
+
+import anyio
+
+from manager.config import settings
+from manager.services.metadata_db.aio import iterate_target, run_metadata, run_target
+
+
+class AioBulkheadTestCase(unittest.TestCase):
+    def test_busy_target_threads_dont_block_metadata_calls(self):
+        release = threading.Event()
+
+        async def main():
+            async with anyio.create_task_group() as tg:
+                # Occupy every target thread plus one waiter.
+                for _ in range(settings.TARGET_DB_THREADS + 1):
+                    tg.start_soon(run_target, release.wait)
+                await anyio.sleep(0.1)
+
+                with anyio.fail_after(5):
+                    self.assertEqual(42, await run_metadata(lambda: 42))
+                release.set()
+
+        anyio.run(main)
+
+    def test_iterate_target_drains_in_chunks_and_closes(self):
+        closed = []
+
+        def rows():
+            try:
+                yield from range(5)
+            finally:
+                closed.append(True)
+
+        async def main():
+            return [chunk async for chunk in iterate_target(rows(), 2)]
+
+        self.assertEqual([[0, 1], [2, 3], [4]], anyio.run(main))
+        self.assertEqual([True], closed)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
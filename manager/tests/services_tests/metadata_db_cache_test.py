@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+
+from manager.schemas.metadata import Column, Database, DatabaseTree, Table, TableTree
+from manager.services.metadata_db.cache import MetadataTreeCache
+
+
+def make_tree(database_id: int, columns: int) -> DatabaseTree:
+    table = Table(id=database_id, database_id=database_id, name=f"table{database_id}")
+    return DatabaseTree(
+        database=Database(id=database_id, name=f"database{database_id}"),
+        tables=[TableTree(table=table, columns=[
+            Column(id=i, table_id=table.id, name=f"col{i}", data_type="integer") for i in range(columns)
+        ])],
+    )
+
+
+class MetadataTreeCacheTestCase(unittest.TestCase):
+    """Cache logic only: repo functions are replaced with in-memory fakes."""
+
+    def setUp(self):
+        self.trees = {1: make_tree(1, 3), 2: make_tree(2, 3), 3: make_tree(3, 20)}
+        self.loaded = []
+
+        def load_metadata_tree(database_ids):
+            self.loaded.append(list(database_ids))
+            return [self.trees[database_id] for database_id in database_ids]
+
+        patches = [
+            mock.patch("manager.services.metadata_db.cache.list_databases",
+                       lambda: [tree.database for tree in self.trees.values()]),
+            mock.patch("manager.services.metadata_db.cache.load_metadata_tree", load_metadata_tree),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        # Each small tree costs 1 table + 3 columns.
+        self.cache = MetadataTreeCache(max_items=10)
+
+    def test_trees_are_served_from_memory(self):
+        etag, trees = self.cache.trees()
+        self.assertEqual(list(self.trees.values()), trees)
+        self.assertEqual([[1, 2, 3]], self.loaded)
+
+        # Third tree is larger than the whole budget and is never cached.
+        self.assertEqual((etag, trees), self.cache.trees())
+        self.assertEqual([[1, 2, 3], [3]], self.loaded)
+
+    def test_invalidate_bumps_version_and_reloads_one_database(self):
+        etag, _ = self.cache.trees()
+        self.cache.invalidate(1)
+        new_etag, _ = self.cache.trees()
+
+        self.assertNotEqual(etag, new_etag)
+        self.assertEqual([[1, 2, 3], [1, 3]], self.loaded)
+
+    def test_least_recently_used_tree_is_evicted(self):
+        self.trees[3] = make_tree(3, 3)
+        self.cache.trees()
+        # 3 trees * 4 items > 10: the first one loaded is evicted.
+        self.cache.trees()
+        self.assertEqual([[1, 2, 3], [1]], self.loaded)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
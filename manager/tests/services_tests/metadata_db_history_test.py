@@ -0,0 +1,164 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import psycopg2
+
+from manager.schemas.metadata import Database
+from manager.services.metadata_db.history import QueryLog
+
+
+class QueryLogTestCase(unittest.TestCase):
+    """Buffer logic only: lookup and batch INSERT are replaced with in-memory fakes."""
+
+    def setUp(self):
+        self.batches = []
+        self.fail = False
+        self.proceed = threading.Event()
+        self.proceed.set()
+        self.written = threading.Event()
+
+        def save_queries(rows):
+            self.proceed.wait()
+            if self.fail:
+                raise psycopg2.OperationalError("metadata database is down")
+            if any(sql_query == "BAD" for _, sql_query, _ in rows):
+                raise psycopg2.IntegrityError("violates foreign key constraint")
+            self.batches.append([(database_id, sql_query) for database_id, sql_query, _ in rows])
+            self.written.set()
+
+        databases = {"database1": 1, "database2": 2}
+        lookup = SimpleNamespace(get=lambda name: None if name not in databases else SimpleNamespace(
+            database=Database(id=databases[name], name=name)))
+        patches = [
+            mock.patch("manager.services.metadata_db.history.save_queries", save_queries),
+            mock.patch("manager.services.metadata_db.history.database_lookup", lookup),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_written_at_once_until_started_and_deduplicated(self):
+        log = QueryLog(batch_size=10, flush_interval=60)
+        self.assertTrue(log.log("database1", "SELECT 1"))
+        self.assertFalse(log.log("database1", "SELECT 1"))
+        self.assertTrue(log.log("database2", "SELECT 1"))
+        self.assertTrue(log.log("database1", "SELECT 2"))
+        self.assertTrue(log.log("database1", "SELECT 1"))
+
+        self.assertEqual([[(1, "SELECT 1")], [(2, "SELECT 1")], [(1, "SELECT 2")], [(1, "SELECT 1")]], self.batches)
+        self.assertEqual(1, log.stats()["deduplicated"])
+        with self.assertRaises(ValueError):
+            log.log("no_such_database", "SELECT 1")
+
+    def test_repeated_query_is_saved_again_after_window(self):
+        log = QueryLog(batch_size=10, flush_interval=60, dedup_window=0.05)
+        self.assertTrue(log.log("database1", "SELECT 1"))
+        self.assertTrue(log.log("database2", "SELECT 1"))
+        self.assertFalse(log.log("database1", "SELECT 1"))
+        time.sleep(0.06)
+        self.assertTrue(log.log("database1", "SELECT 1"))
+        # Expired entry of database2 is pruned.
+        self.assertEqual([1], list(log._last))
+
+    def test_batches_by_size_and_flush_on_stop(self):
+        log = QueryLog(batch_size=3, flush_interval=60)
+        log.start()
+        self.addCleanup(log.stop)
+        for i in range(7):
+            log.log("database1", f"SELECT {i}")
+
+        deadline = time.monotonic() + 5
+        while len(self.batches) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([3, 3], [len(batch) for batch in self.batches])
+
+        log.stop()
+        self.assertEqual([f"SELECT {i}" for i in range(7)], [sql for batch in self.batches for _, sql in batch])
+        self.assertEqual(0, log.stats()["pending"])
+
+    def test_batch_is_flushed_after_interval(self):
+        log = QueryLog(batch_size=100, flush_interval=0.05)
+        log.start()
+        self.addCleanup(log.stop)
+        # Writer is already waiting on the empty buffer when the first entry comes.
+        time.sleep(0.05)
+        log.log("database1", "SELECT 1")
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual([[(1, "SELECT 1")]], self.batches)
+
+    def test_full_buffer_blocks_then_drops(self):
+        # Slow metadata database: batch is taken, but entries leave the buffer only after commit.
+        self.proceed.clear()
+        log = QueryLog(batch_size=100, flush_interval=0.01, max_pending=2, put_timeout=0.05)
+        log.start()
+        self.addCleanup(log.stop)
+        self.addCleanup(self.proceed.set)
+        self.assertTrue(log.log("database1", "SELECT 1"))
+        self.assertTrue(log.log("database1", "SELECT 2"))
+
+        started = time.monotonic()
+        self.assertFalse(log.log("database1", "SELECT 3"))
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(1, log.stats()["dropped"])
+
+        self.proceed.set()
+        log.stop()
+        self.assertEqual([[(1, "SELECT 1"), (1, "SELECT 2")]], self.batches)
+
+    def test_unreachable_database_is_retried_and_drops_at_once(self):
+        self.fail = True
+        log = QueryLog(batch_size=100, flush_interval=0.01, max_pending=2, put_timeout=5, max_attempts=1000)
+        log.start()
+        self.addCleanup(log.stop)
+        self.assertTrue(log.log("database1", "SELECT 1"))
+        self.assertTrue(log.log("database1", "SELECT 2"))
+        deadline = time.monotonic() + 5
+        while log.stats()["failures"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # Writes are failing: full buffer doesn't hold the caller for put_timeout.
+        started = time.monotonic()
+        self.assertFalse(log.log("database1", "SELECT 3"))
+        self.assertLess(time.monotonic() - started, 1)
+
+        # Failed batch stays in the buffer and is written once the database is back.
+        self.fail = False
+        self.assertTrue(self.written.wait(5))
+        log.stop()
+        self.assertEqual([[(1, "SELECT 1"), (1, "SELECT 2")]], self.batches)
+        self.assertEqual(0, log.stats()["rejected"])
+
+    def test_rejected_entry_does_not_block_history(self):
+        log = QueryLog(batch_size=3, flush_interval=60)
+        log.start()
+        self.addCleanup(log.stop)
+        for sql_query in ("SELECT 1", "BAD", "SELECT 2", "SELECT 3"):
+            log.log("database1", sql_query)
+        log.stop()
+
+        # Batch with the bad entry is written entry by entry; the rest goes on in batches.
+        self.assertEqual([[(1, "SELECT 1")], [(1, "SELECT 2")], [(1, "SELECT 3")]], self.batches)
+        self.assertEqual({"pending": 0, "rejected": 1, "batches": 1},
+                         {key: log.stats()[key] for key in ("pending", "rejected", "batches")})
+
+    def test_batch_failing_too_many_times_is_split(self):
+        self.fail = True
+        log = QueryLog(batch_size=10, flush_interval=60, max_attempts=2)
+        # Not started: written at once, and the error reaches the caller.
+        with self.assertRaises(psycopg2.OperationalError):
+            log.log("database1", "SELECT 1")
+        # Second failure: entry by entry; database is still unreachable, so nothing is dropped.
+        with self.assertRaises(psycopg2.OperationalError):
+            log.flush()
+        self.assertEqual({"pending": 1, "rejected": 0}, {key: log.stats()[key] for key in ("pending", "rejected")})
+
+        self.fail = False
+        log.flush()
+        self.assertEqual([[(1, "SELECT 1")]], self.batches)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
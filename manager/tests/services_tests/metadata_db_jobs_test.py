@@ -0,0 +1,85 @@
+import unittest
+
+from tests.conf.configure import config
+from tests.conf.schema import drop_schema, reset_schema
+
+from manager.services.metadata_db.pool import init_pool, get_pool
+from manager.services.metadata_db.tx import tx
+from manager.services.metadata_db.jobs import DONE, FAILED, PHASES, QUEUED, enqueue_fill_job, get_fill_job, run_next_job
+
+
+class MetadataDBServiceJobsTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dsn = f"postgresql://{config.user}:{config.password}@{config.host}:{config.port}/{config.dbname}"
+        init_pool(cls.dsn)
+
+        # Setting up database: same migrations as on startup.
+        reset_schema(cls.dsn)
+
+    @classmethod
+    def tearDownClass(cls):
+        # Drop everything created by tests and close the pool
+        try:
+            drop_schema(cls.dsn)
+        finally:
+            # Ensure all connections are returned to the pool and the pool is closed
+            get_pool().closeall()
+
+    def setUp(self):
+        with tx() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM fill_jobs;")
+
+    def _stored_dsn(self, job_id: int):
+        with tx(readonly=True) as conn, conn.cursor() as cur:
+            cur.execute("SELECT dsn FROM fill_jobs WHERE id = %s;", (job_id,))
+            return cur.fetchone()[0]
+
+    def test_job_runs_through_every_phase(self):
+        job = enqueue_fill_job(self.dsn)
+        self.assertEqual(QUEUED, job.status)
+        self.assertEqual({}, job.progress)
+
+        self.assertEqual(job.id, run_next_job())
+        self.assertIsNone(run_next_job())
+
+        job = get_fill_job(job.id)
+        self.assertEqual(DONE, job.status)
+        self.assertEqual(set(PHASES), set(job.progress))
+        self.assertEqual("foreign_keys", job.phase)
+        self.assertEqual(job.progress["tables"], sum(job.result.values()))
+        self.assertIsNotNone(job.finished_at)
+        # Password isn't kept once the job is finished.
+        self.assertIsNone(self._stored_dsn(job.id))
+
+    def test_failed_job_keeps_error(self):
+        job = enqueue_fill_job(f"postgresql://{config.user}:{config.password}@{config.host}:1/{config.dbname}")
+        run_next_job()
+
+        job = get_fill_job(job.id)
+        self.assertEqual(FAILED, job.status)
+        self.assertIsNotNone(job.error)
+        self.assertIsNone(job.result)
+        self.assertIsNone(self._stored_dsn(job.id))
+
+    def test_job_of_lost_worker_is_taken_again(self):
+        with tx() as conn, conn.cursor() as cur:
+            cur.execute("""--sql
+                INSERT INTO fill_jobs (dsn, status, attempts, started_at, heartbeat_at)
+                VALUES (%s, 'running', 1, NOW() - INTERVAL '1 hour', NOW() - INTERVAL '1 hour')
+                RETURNING id;
+            """, (self.dsn,))
+            job_id = cur.fetchone()[0]
+
+        self.assertIsNone(run_next_job(stale_after=7200))
+        self.assertEqual(self.dsn, self._stored_dsn(job_id))
+        self.assertEqual(job_id, run_next_job(stale_after=60))
+        job = get_fill_job(job_id)
+        self.assertEqual((DONE, 2), (job.status, job.attempts))
+
+    def test_unknown_job(self):
+        self.assertIsNone(get_fill_job(-1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+
+from manager.schemas.metadata import Credential, Database
+from manager.services.metadata_db.lookup import DatabaseLookupCache
+
+
+def make_credentials(database_id: int) -> Credential:
+    return Credential(id=database_id, database_id=database_id, host_ipv4="10.0.0.1",
+                      port=5432 + database_id, username="user", password="secret")
+
+
+class DatabaseLookupCacheTestCase(unittest.TestCase):
+    """Cache logic only: repo function is replaced with an in-memory fake."""
+
+    def setUp(self):
+        self.rows = [
+            (Database(id=1, name="database1"), make_credentials(1)),
+            (Database(id=2, name="database2"), None),
+        ]
+        self.loads = 0
+
+        def list_database_credentials():
+            self.loads += 1
+            return list(self.rows)
+
+        patch = mock.patch("manager.services.metadata_db.lookup.list_database_credentials", list_database_credentials)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.cache = DatabaseLookupCache()
+
+    def test_lookups_are_served_from_one_query(self):
+        for _ in range(10):
+            self.assertEqual(make_credentials(1), self.cache.credentials("database1"))
+            self.assertEqual("10.0.0.1:5433", self.cache.get("database1").address)
+            self.assertIsNone(self.cache.get("database2").address)
+        self.assertEqual(["database1", "database2"], [entry.database.name for entry in self.cache.entries()])
+        self.assertEqual(1, self.loads)
+
+    def test_missing_database_reloads_once(self):
+        self.cache.entries()
+        self.rows.append((Database(id=3, name="database3"), make_credentials(3)))
+        self.assertEqual(3, self.cache.get("database3").database.id)
+        self.assertEqual(2, self.loads)
+
+        self.assertIsNone(self.cache.get("no_such_database"))
+        self.assertEqual(3, self.loads)
+        with self.assertRaises(ValueError):
+            self.cache.credentials("database2")
+
+    def test_invalidate_drops_entries(self):
+        self.cache.entries()
+        self.rows[1] = (Database(id=2, name="database2"), make_credentials(2))
+        self.cache.invalidate(2)
+        self.assertEqual("10.0.0.1:5434", self.cache.get("database2").address)
+        self.assertEqual(2, self.loads)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
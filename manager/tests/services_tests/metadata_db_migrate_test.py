@@ -0,0 +1,168 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import psycopg2
+from psycopg2 import errors
+
+from tests.conf.configure import config
+from tests.conf.schema import drop_schema
+
+from manager.services.metadata_db.migrate import discover, migrate, split_statements
+
+
+class MetadataDBServiceMigrateTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dsn = f"postgresql://{config.user}:{config.password}@{config.host}:{config.port}/{config.dbname}"
+
+    def setUp(self):
+        drop_schema(self.dsn)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+        drop_schema(self.dsn)
+
+    def _write(self, name: str, text: str) -> None:
+        (self.path / name).write_text(text, encoding="utf-8")
+
+    def _fetch(self, sql: str):
+        conn = psycopg2.connect(self.dsn)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+                return cur.fetchall()
+        finally:
+            conn.close()
+
+    def test_split_statements(self):
+        script = """
+            -- comment; not a separator
+            CREATE TABLE t (x TEXT DEFAULT 'a;b');
+            /* block; comment */
+            DO $body$ BEGIN PERFORM 1; END $body$;
+            SELECT ";" FROM t
+        """
+        self.assertEqual([
+            "-- comment; not a separator\n            CREATE TABLE t (x TEXT DEFAULT 'a;b');",
+            "/* block; comment */\n            DO $body$ BEGIN PERFORM 1; END $body$;",
+            'SELECT ";" FROM t',
+        ], split_statements(script))
+
+    def test_migrate_applies_pending_versions_once(self):
+        self._write("0001_items.sql", "CREATE TABLE items (id SERIAL PRIMARY KEY, name TEXT);")
+        self._write("0002_items_name_idx.sql",
+                    "-- migrate: no-transaction\n"
+                    "CREATE INDEX CONCURRENTLY IF NOT EXISTS items_name_idx ON items (name);\n")
+        self._write("0003_backfill.py",
+                    "from manager.services.metadata_db.migrate import backfill\n"
+                    "TRANSACTIONAL = False\n"
+                    "def upgrade(conn):\n"
+                    "    with conn.cursor() as cur:\n"
+                    "        cur.execute(\"INSERT INTO items (name) SELECT NULL FROM generate_series(1, 5);\")\n"
+                    "    backfill(conn, \"UPDATE items SET name = 'x' WHERE id IN "
+                    "(SELECT id FROM items WHERE name IS NULL LIMIT %(batch_size)s);\", batch_size=2)\n")
+        self._write("notes.txt", "not a migration")
+
+        applied = migrate(self.dsn, self.path, target=2)
+        self.assertEqual([1, 2], [m.version for m in applied])
+
+        applied = migrate(self.dsn, self.path)
+        self.assertEqual([3], [m.version for m in applied])
+        self.assertEqual([], migrate(self.dsn, self.path))
+
+        self.assertEqual([(1, "items"), (2, "items_name_idx"), (3, "backfill")],
+                         self._fetch("SELECT version, name FROM schema_migrations ORDER BY version;"))
+        self.assertEqual([(5,)], self._fetch("SELECT count(*) FROM items WHERE name = 'x';"))
+        self.assertEqual([(True,)], self._fetch("SELECT indisvalid FROM pg_index WHERE indexrelid = 'items_name_idx'::regclass;"))
+
+    def test_failed_migration_is_not_recorded(self):
+        self._write("0001_items.sql", "CREATE TABLE items (id INT);")
+        self._write("0002_broken.sql", "ALTER TABLE items ADD COLUMN name TEXT; SELECT * FROM no_such_table;")
+        with self.assertRaises(errors.UndefinedTable):
+            migrate(self.dsn, self.path)
+        # First migration stays, second is rolled back as a whole.
+        self.assertEqual([(1,)], self._fetch("SELECT version FROM schema_migrations;"))
+        self.assertEqual([(1,)], self._fetch("SELECT count(*) FROM information_schema.columns WHERE table_name = 'items';"))
+
+    def test_lock_timeout_instead_of_waiting(self):
+        self._write("0001_items.sql", "CREATE TABLE items (id INT);")
+        migrate(self.dsn, self.path)
+        self._write("0002_items_name.sql", "ALTER TABLE items ADD COLUMN name TEXT;")
+
+        # Long transaction holding a lock on the table.
+        holder = psycopg2.connect(self.dsn)
+        try:
+            with holder.cursor() as cur:
+                cur.execute("SELECT * FROM items;")
+            with self.assertRaises(errors.LockNotAvailable):
+                migrate(self.dsn, self.path, lock_timeout=0.1, retries=1, retry_delay=0.01)
+        finally:
+            holder.close()
+
+        self.assertEqual([2], [m.version for m in migrate(self.dsn, self.path, lock_timeout=0.1)])
+
+    def test_repo_migrations(self):
+        versions = [m.version for m in discover()]
+        self.assertEqual(list(range(1, len(versions) + 1)), versions)
+
+        migrate(self.dsn)
+        self.assertEqual([], migrate(self.dsn))
+        tables = {row[0] for row in self._fetch("SELECT tablename FROM pg_tables WHERE schemaname = 'public';")}
+        self.assertLessEqual({"databases", "tables", "columns", "saved_queries", "fill_jobs", "schema_migrations"}, tables)
+        self.assertEqual([("fill_jobs_status_id_idx",)],
+                         self._fetch("SELECT indexname FROM pg_indexes WHERE indexname = 'fill_jobs_status_id_idx';"))
+
+    def test_duplicates_of_old_fills_are_merged(self):
+        migrate(self.dsn, target=2)
+        conn = psycopg2.connect(self.dsn)
+        try:
+            with conn, conn.cursor() as cur:
+                # Two fills of "shop" (old fill inserted a new database row each time) and "shop" saved query
+                # on the older one; same-named tables of two schemas stored as public.orders.
+                cur.execute("""--sql
+                    INSERT INTO databases (id, name) VALUES (1, 'shop'), (2, 'other'), (3, 'shop');
+                    INSERT INTO credentials (database_id, host_ipv4, port, username, password)
+                    VALUES (1, 'old', 5432, 'u', 'p'), (3, 'new', 5432, 'u', 'p'), (3, 'newer', 5432, 'u', 'p');
+                    INSERT INTO saved_queries (database_id, sql_query) VALUES (1, 'SELECT 1');
+                    INSERT INTO tables (id, database_id, name, fingerprint)
+                    VALUES (10, 1, 'orders', 'a'), (11, 3, 'orders', 'b'), (12, 3, 'orders', 'c'), (13, 2, 'orders', 'd');
+                    INSERT INTO columns (table_id, name, data_type) VALUES (12, 'id', 'integer'), (12, 'id', 'bigint');
+                    INSERT INTO primary_keys (table_id) VALUES (12), (12);
+                """)
+        finally:
+            conn.close()
+
+        migrate(self.dsn)
+
+        self.assertEqual([(2, "other"), (3, "shop")], self._fetch("SELECT id, name FROM databases ORDER BY id;"))
+        self.assertEqual([(3, "newer")], self._fetch("SELECT database_id, host_ipv4 FROM credentials WHERE database_id = 3;"))
+        self.assertEqual([(3,)], self._fetch("SELECT database_id FROM saved_queries;"))
+        # Untouched database keeps its fingerprint; merged one is re-synced in full.
+        self.assertEqual([(12, None), (13, "d")], self._fetch("SELECT id, fingerprint FROM tables ORDER BY id;"))
+        self.assertEqual([("id", "bigint")], self._fetch("SELECT name, data_type FROM columns;"))
+        self.assertEqual([(1,)], self._fetch("SELECT count(*) FROM primary_keys;"))
+
+    def test_trigram_index_skipped_without_privilege(self):
+        """Role that may not CREATE EXTENSION: migration leaves the index out instead of failing."""
+        def execute(sql, *args):
+            if sql.startswith("CREATE EXTENSION"):
+                raise errors.InsufficientPrivilege("permission denied to create extension")
+
+        cur = mock.MagicMock()
+        cur.fetchone.return_value = (1,)
+        cur.execute.side_effect = execute
+        conn = mock.MagicMock()
+        conn.cursor.return_value.__enter__.return_value = cur
+
+        trigram = next(m for m in discover() if m.name.startswith("saved_queries_trigram"))
+        with self.assertLogs("manager.services.metadata_db.migrations", "WARNING"):
+            trigram.apply(conn)
+        self.assertEqual(["SELECT", "CREATE"], [c.args[0].split()[0] for c in cur.execute.call_args_list])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import json
+import queue
+import unittest
+import psycopg2
+
+from tests.conf.configure import config
+
+from manager.services.metadata_db import notify
+from manager.services.metadata_db.notify import CHANNEL, METADATA, MetadataEvent, MetadataListener
+
+
+class MetadataDBNotifyTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dsn = f"postgresql://{config.user}:{config.password}@{config.host}:{config.port}/{config.dbname}"
+
+    def setUp(self):
+        self.events: "queue.Queue[MetadataEvent]" = queue.Queue()
+        notify.subscribe(self.events.put)
+        self.addCleanup(notify.unsubscribe, self.events.put)
+
+        self.listener = MetadataListener(self.dsn, poll_timeout=0.1)
+        self.listener.start()
+        self.addCleanup(self.listener.stop)
+        self.assertTrue(self.listener.ready.wait(5))
+        # Connect always invalidates everything.
+        self.assertEqual(None, self.events.get(timeout=5).database_id)
+
+    def _notify(self, payload: dict):
+        with psycopg2.connect(self.dsn) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_notify(%s, %s);", (CHANNEL, json.dumps(payload)))
+
+    def test_event_of_other_worker_is_dispatched(self):
+        self._notify({"kind": METADATA, "database_id": 7, "origin": "other-worker"})
+        self.assertEqual(MetadataEvent(kind=METADATA, database_id=7, origin="other-worker"), self.events.get(timeout=5))
+
+    def test_own_event_is_skipped(self):
+        with psycopg2.connect(self.dsn) as conn:
+            with conn.cursor() as cur:
+                notify.notify(cur, METADATA, 1)
+        self._notify({"kind": METADATA, "database_id": 2, "origin": "other-worker"})
+
+        # Only the second one arrives: own changes are dispatched by the writer itself.
+        self.assertEqual(2, self.events.get(timeout=5).database_id)
+        self.assertTrue(self.events.empty())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
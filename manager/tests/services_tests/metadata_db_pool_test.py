@@ -0,0 +1,117 @@
+import threading
+import time
+import unittest
+
+import psycopg2
+from psycopg2 import pool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from tests.conf.configure import config
+
+from manager.services.metadata_db.pool import MetadataPool
+
+
+class MetadataPoolTestCase(unittest.TestCase):
+    """Test database serves as metadata database; no schema is needed."""
+
+    def setUp(self):
+        self.dsn = f"postgresql://{config.user}:{config.password}@{config.host}:{config.port}/{config.dbname}"
+
+    def _pool(self, **kwargs) -> MetadataPool:
+        options = dict(checkout_timeout=0.1, max_lifetime=60, ping_after=60)
+        options.update(kwargs)
+        metadata_pool = MetadataPool(0, options.pop("maxconn", 2), self.dsn, **options)
+        self.addCleanup(metadata_pool.closeall)
+        return metadata_pool
+
+    @staticmethod
+    def _backend_pid(conn) -> int:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_backend_pid();")
+            return cur.fetchone()[0]
+
+    def test_exhausted_pool_waits_then_times_out(self):
+        metadata_pool = self._pool(maxconn=1)
+        conn = metadata_pool.getconn()
+        with self.assertRaises(pool.PoolError):
+            metadata_pool.getconn()
+
+        # Connection given back while waiting is handed over to the waiter.
+        timer = threading.Timer(0.1, metadata_pool.putconn, (conn,))
+        timer.start()
+        self.assertIs(conn, metadata_pool.getconn(timeout=5))
+        timer.join()
+
+        stats = metadata_pool.stats()
+        self.assertEqual((1, 0, 0, 1, 2), (stats["in_use"], stats["idle"], stats["waiters"], stats["timeouts"], stats["checkouts"]))
+        self.assertGreater(stats["wait_seconds_max"], 0.05)
+
+    def test_open_transaction_is_rolled_back_on_return(self):
+        metadata_pool = self._pool()
+        conn = metadata_pool.getconn()
+        self._backend_pid(conn)
+        metadata_pool.putconn(conn)
+        self.assertEqual(TRANSACTION_STATUS_IDLE, conn.get_transaction_status())
+        self.assertIs(conn, metadata_pool.getconn())
+
+    def test_broken_connection_is_replaced_on_checkout(self):
+        metadata_pool = self._pool(ping_after=0)
+        conn = metadata_pool.getconn()
+        pid = self._backend_pid(conn)
+        metadata_pool.putconn(conn)
+
+        killer = psycopg2.connect(self.dsn)
+        try:
+            with killer.cursor() as cur:
+                cur.execute("SELECT pg_terminate_backend(%s);", (pid,))
+        finally:
+            killer.close()
+
+        conn = metadata_pool.getconn()
+        self.assertNotEqual(pid, self._backend_pid(conn))
+        self.assertEqual({"in_use": 1, "idle": 0}, {key: metadata_pool.stats()[key] for key in ("in_use", "idle")})
+
+    def test_old_connection_is_recycled(self):
+        metadata_pool = self._pool(max_lifetime=0)
+        conn = metadata_pool.getconn()
+        metadata_pool.putconn(conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(0, metadata_pool.stats()["idle"])
+
+    def test_concurrent_checkouts(self):
+        metadata_pool = self._pool(maxconn=3, checkout_timeout=10)
+        errors = []
+
+        def work():
+            try:
+                for _ in range(20):
+                    conn = metadata_pool.getconn()
+                    self._backend_pid(conn)
+                    metadata_pool.putconn(conn)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        stats = metadata_pool.stats()
+        self.assertEqual(0, stats["in_use"])
+        self.assertLessEqual(stats["idle"], 3)
+        self.assertEqual(240, stats["checkouts"])
+
+    def test_closed_pool_refuses_checkout(self):
+        metadata_pool = self._pool()
+        conn = metadata_pool.getconn()
+        metadata_pool.closeall()
+        with self.assertRaises(pool.PoolError):
+            metadata_pool.getconn()
+        metadata_pool.putconn(conn)
+        self.assertTrue(conn.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from unittest import mock
+
+import psycopg2
+
+from tests.conf.configure import config
+
+from manager.config import settings
+from manager.services.metadata_db.prepared import Prepared
+
+
+class PreparedStatementTestCase(unittest.TestCase):
+    """Test database serves as metadata database; statements don't touch its tables."""
+
+    def setUp(self):
+        dsn = f"postgresql://{config.user}:{config.password}@{config.host}:{config.port}/{config.dbname}"
+        self.conn = psycopg2.connect(dsn)
+        self.addCleanup(self.conn.close)
+        self.statement = Prepared("test_add", ("int", "int"), "SELECT %s + %s AS total;")
+
+    def _prepared_names(self):
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT name FROM pg_prepared_statements ORDER BY name;")
+            return [row[0] for row in cur.fetchall()]
+
+    def test_placeholders_become_numbered_parameters(self):
+        self.assertEqual("SELECT $1 + $2 AS total;", self.statement.server_sql)
+        with self.assertRaises(ValueError):
+            Prepared("test_bad", ("int",), "SELECT %s, %s;")
+
+    def test_statement_is_prepared_once_per_connection(self):
+        for a in range(3):
+            with self.conn.cursor() as cur:
+                self.statement.execute(cur, (a, 1))
+                self.assertEqual(a + 1, cur.fetchone()[0])
+            # Prepared statement outlives transaction end.
+            self.conn.rollback()
+        self.assertEqual(["test_add"], self._prepared_names())
+
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT generic_plans + custom_plans FROM pg_prepared_statements WHERE name = 'test_add';")
+            self.assertEqual(3, cur.fetchone()[0])
+
+    def test_disabled_runs_plain_query(self):
+        with mock.patch.object(settings, "METADATA_PREPARED_STATEMENTS", False), self.conn.cursor() as cur:
+            self.statement.execute(cur, (2, 3))
+            self.assertEqual(5, cur.fetchone()[0])
+        self.assertEqual([], self._prepared_names())
+
+
+if __name__ == "__main__":
+    unittest.main()
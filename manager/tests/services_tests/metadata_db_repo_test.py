@@ -1,131 +1,29 @@
 import unittest
 
 from tests.conf.configure import config
+from tests.conf.schema import drop_schema, reset_schema
 
 from manager.services.metadata_db.pool import init_pool, get_pool
 from manager.services.metadata_db.tx import tx
-from manager.services.metadata_db.repo import insert_database, list_databases
+from manager.services.metadata_db.repo import get_database_address_by_name, insert_database, list_databases, load_metadata_tree
 
-from manager.schemas.metadata import Database
+from manager.schemas.metadata import Column, Database, DatabaseTree, Table, TableTree
 
 
 class MetadataDBServiceRepoTestCase(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        dsn = f"postgresql://{config.user}:{config.password}@{config.host}:{config.port}/{config.dbname}"
+        cls.dsn = dsn = f"postgresql://{config.user}:{config.password}@{config.host}:{config.port}/{config.dbname}"
         init_pool(dsn)
 
-        schema_sql = """--sql
-            -- =======================
-            -- DROP EXISTING TABLES (если уже есть)
-            -- =======================
-            DROP TABLE IF EXISTS
-                credentials,
-                foreign_key_columns,
-                foreign_keys,
-                primary_key_columns,
-                primary_keys,
-                columns,
-                tables,
-                databases
-            CASCADE;
-
-            -- =======================
-            -- DATABASES
-            -- =======================
-            CREATE TABLE databases (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(255) NOT NULL
-            );
-
-            -- =======================
-            -- TABLES
-            -- =======================
-            CREATE TABLE tables (
-                id SERIAL PRIMARY KEY,
-                database_id INT NOT NULL REFERENCES databases(id) ON DELETE CASCADE,
-                name VARCHAR(255) NOT NULL
-            );
-
-            -- =======================
-            -- COLUMNS
-            -- =======================
-            CREATE TABLE columns (
-                id SERIAL PRIMARY KEY,
-                table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE,
-                name VARCHAR(255) NOT NULL,
-                data_type VARCHAR(50) NOT NULL
-            );
-
-            -- =======================
-            -- PRIMARY KEYS
-            -- =======================
-            CREATE TABLE primary_keys (
-                id SERIAL PRIMARY KEY,
-                table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE
-            );
-
-            CREATE TABLE primary_key_columns (
-                pk_id INT NOT NULL REFERENCES primary_keys(id) ON DELETE CASCADE,
-                column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE,
-                ordinal_position INT NOT NULL,                  -- порядок колонки внутри PK
-                PRIMARY KEY (pk_id, ordinal_position),
-                UNIQUE (pk_id, column_id)
-            );
-
-            -- =======================
-            -- FOREIGN KEYS
-            -- =======================
-            CREATE TABLE foreign_keys (
-                id SERIAL PRIMARY KEY,
-                table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE,            -- таблица-источник
-                referenced_table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE  -- таблица-цель
-            );
-
-            CREATE TABLE foreign_key_columns (
-                fk_id INT NOT NULL REFERENCES foreign_keys(id) ON DELETE CASCADE,
-                column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE,            -- колонка-источник
-                referenced_column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE, -- колонка-цель
-                ordinal_position INT NOT NULL,                                              -- порядок в составе FK
-                PRIMARY KEY (fk_id, ordinal_position),
-                UNIQUE (fk_id, column_id, referenced_column_id)
-            );
-
-            -- =======================
-            -- CREDENTIALS
-            -- =======================
-            CREATE TABLE credentials (
-                id SERIAL PRIMARY KEY,
-                database_id INT NOT NULL REFERENCES databases(id) ON DELETE CASCADE,
-                host_ipv4 VARCHAR(255) NOT NULL,
-                port INT NOT NULL CHECK (port > 0 AND port <= 65535),
-                username VARCHAR(255) NOT NULL,
-                password VARCHAR(255) NOT NULL
-            );
-        """
-
-        with tx() as conn:
-            with conn.cursor() as cur:
-                cur.execute(schema_sql)
+        # Setting up database: same migrations as on startup.
+        reset_schema(dsn)
 
     @classmethod
     def tearDownClass(cls):
         # Drop everything created by tests and close the pool
-        drop_sql = """--sql
-            DROP TABLE IF EXISTS
-                credentials,
-                foreign_key_columns,
-                foreign_keys,
-                primary_key_columns,
-                primary_keys,
-                columns,
-                tables,
-                databases
-            CASCADE;
-        """
         try:
-            with tx() as conn, conn.cursor() as cur:
-                cur.execute(drop_sql)
+            drop_schema(cls.dsn)
         finally:
             # Ensure all connections are returned to the pool and the pool is closed
             get_pool().closeall()
@@ -136,6 +34,44 @@ class MetadataDBServiceRepoTestCase(unittest.TestCase):
 
             self.assertEqual([Database(id=1, name="database1"), Database(id=2, name="database2")], list_databases())
 
+            # Name is unique: existing row is returned, no UniqueViolation.
+            self.assertEqual(Database(id=1, name="database1"), insert_database("database1"))
+            self.assertEqual(2, len(list_databases()))
+
+    def test_load_metadata_tree(self):
+        db = insert_database("tree_db")
+        empty_db = insert_database("tree_empty_db")
+        with tx() as conn, conn.cursor() as cur:
+            cur.execute("INSERT INTO tables(database_id, name) VALUES (%s, 'users'), (%s, 'no_columns') RETURNING id;",
+                        (db.id, db.id))
+            users_id, no_columns_id = [r[0] for r in cur.fetchall()]
+            cur.execute("INSERT INTO columns(table_id, name, data_type) VALUES (%s, 'id', 'integer'), (%s, 'name', 'text') RETURNING id;",
+                        (users_id, users_id))
+            id_id, name_id = [r[0] for r in cur.fetchall()]
+
+        expected = [
+            DatabaseTree(database=db, tables=[
+                TableTree(table=Table(id=users_id, database_id=db.id, name="users"), columns=[
+                    Column(id=id_id, table_id=users_id, name="id", data_type="integer"),
+                    Column(id=name_id, table_id=users_id, name="name", data_type="text"),
+                ]),
+                TableTree(table=Table(id=no_columns_id, database_id=db.id, name="no_columns"), columns=[]),
+            ]),
+            DatabaseTree(database=empty_db, tables=[]),
+        ]
+        self.assertEqual(expected, load_metadata_tree([db.id, empty_db.id]))
+        self.assertEqual(expected, [tree for tree in load_metadata_tree() if tree.database.name.startswith("tree_")])
+        self.assertEqual([], load_metadata_tree([]))
+
+    def test_lookup_address_by_name(self):
+        db = insert_database("address_db")
+        with tx() as conn, conn.cursor() as cur:
+            cur.execute("INSERT INTO credentials(database_id, host_ipv4, port, username, password) VALUES (%s, '10.0.0.1', 5433, 'u', 'p');",
+                        (db.id,))
+
+        self.assertEqual("10.0.0.1:5433", get_database_address_by_name("address_db"))
+        self.assertIsNone(get_database_address_by_name("no_such_database"))
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -0,0 +1,85 @@
+import unittest
+
+from manager.services.metadata_db.notify import METADATA, QUERY, MetadataEvent, dispatch
+from manager.services.metadata_db.query import QueryPage
+from manager.services.metadata_db.result_cache import QueryResultCache, query_cache
+
+
+def make_page(database_id: int, value: str) -> QueryPage:
+    return QueryPage(rows=[{"value": value}], offset=0, has_more=False, total_estimate=1, database_id=database_id)
+
+
+class QueryResultCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.cache = QueryResultCache(ttl=60.0, max_bytes=100, clock=lambda: self.now)
+
+    def test_key_normalizes_sql(self):
+        self.assertEqual(QueryResultCache.key("db", "SELECT  1\n FROM t;", 0, 10),
+                         QueryResultCache.key("db", "SELECT 1 FROM t", 0, 10))
+        self.assertNotEqual(QueryResultCache.key("db", "SELECT 'a  b'", 0, 10),
+                            QueryResultCache.key("db", "SELECT 'a b'", 0, 10))
+
+    def test_volatile_functions_are_not_cacheable(self):
+        self.assertTrue(QueryResultCache.cacheable("SELECT id, created_at FROM orders"))
+        self.assertTrue(QueryResultCache.cacheable("SELECT 'now()', \"random\" FROM t"))
+        self.assertTrue(QueryResultCache.cacheable("SELECT known() FROM t"))
+        for sql_query in ("SELECT now()", "SELECT * FROM t ORDER BY RANDOM ()", "SELECT nextval('s')",
+                          "SELECT clock_timestamp()", "SELECT * FROM t WHERE d > current_date"):
+            self.assertFalse(QueryResultCache.cacheable(sql_query), sql_query)
+
+    def test_ttl_and_max_staleness(self):
+        key = QueryResultCache.key("db", "SELECT 1", 0, 10)
+        self.cache.put(key, make_page(1, "x"))
+
+        self.now = 30.0
+        page, age = self.cache.get(key)
+        self.assertEqual([{"value": "x"}], page.rows)
+        self.assertEqual(30.0, age)
+        self.assertIsNone(self.cache.get(key, max_staleness=10.0))
+
+        self.now = 61.0
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual({"entries": 0, "bytes": 0, "hits": 1, "misses": 2}, self.cache.stats())
+
+    def test_lru_eviction_by_size(self):
+        # Each page is 16 bytes of JSON: three fit into 50.
+        cache = QueryResultCache(ttl=60.0, max_bytes=50, clock=lambda: self.now)
+        keys = [QueryResultCache.key("db", f"SELECT {i}", 0, 10) for i in range(4)]
+        for key in keys[:3]:
+            cache.put(key, make_page(1, "x"))
+        cache.get(keys[0])
+        cache.put(keys[3], make_page(1, "x"))
+
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(48, cache.stats()["bytes"])
+
+        big = QueryResultCache.key("db", "SELECT big", 0, 10)
+        cache.put(big, make_page(1, "x" * 100))
+        self.assertIsNone(cache.get(big))
+
+    def test_invalidate_database(self):
+        first = QueryResultCache.key("db1", "SELECT 1", 0, 10)
+        second = QueryResultCache.key("db2", "SELECT 1", 0, 10)
+        self.cache.put(first, make_page(1, "x"))
+        self.cache.put(second, make_page(2, "y"))
+
+        self.cache.invalidate(1)
+        self.assertIsNone(self.cache.get(first))
+        self.assertIsNotNone(self.cache.get(second))
+
+    def test_metadata_event_invalidates_global_cache(self):
+        key = QueryResultCache.key("db1", "SELECT 1", 0, 10)
+        query_cache.put(key, make_page(1, "x"))
+        self.addCleanup(query_cache.invalidate)
+
+        dispatch(MetadataEvent(kind=QUERY, database_id=1))
+        self.assertIsNotNone(query_cache.get(key))
+        dispatch(MetadataEvent(kind=METADATA, database_id=1))
+        self.assertIsNone(query_cache.get(key))
+
+
+if __name__ == "__main__":
+    unittest.main()
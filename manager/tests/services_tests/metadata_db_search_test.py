@@ -0,0 +1,114 @@
+import unittest
+from unittest import mock
+
+from manager.schemas.metadata import Column, Database, DatabaseTree, Table, TableTree
+from manager.services.metadata_db.search import COLUMN, TABLE, MetadataSearchIndex, trigrams
+
+
+def make_tree(database_id: int, tables: dict) -> DatabaseTree:
+    table_trees = []
+    for number, (name, columns) in enumerate(tables.items()):
+        table = Table(id=database_id * 100 + number, database_id=database_id, name=name)
+        table_trees.append(TableTree(table=table, columns=[
+            Column(id=table.id * 100 + i, table_id=table.id, name=column, data_type=data_type)
+            for i, (column, data_type) in enumerate(columns)
+        ]))
+    return DatabaseTree(database=Database(id=database_id, name=f"database{database_id}"), tables=table_trees)
+
+
+class MetadataSearchIndexTestCase(unittest.TestCase):
+    """Index logic only: repo functions are replaced with in-memory fakes."""
+
+    def setUp(self):
+        self.trees = {
+            1: make_tree(1, {
+                "customers": [("id", "integer"), ("customer_name", "text"), ("created_at", "timestamp")],
+                "orders": [("id", "integer"), ("customer_id", "integer"), ("total", "numeric")],
+            }),
+            2: make_tree(2, {
+                "customer": [("id", "bigint"), ("payload", "jsonb")],
+            }),
+        }
+        self.loaded = []
+
+        def load_metadata_tree(database_ids):
+            self.loaded.append(list(database_ids))
+            return [self.trees[database_id] for database_id in database_ids]
+
+        patches = [
+            mock.patch("manager.services.metadata_db.search.metadata_cache.databases",
+                       lambda: ("", [tree.database for tree in self.trees.values()])),
+            mock.patch("manager.services.metadata_db.search.load_metadata_tree", load_metadata_tree),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.index = MetadataSearchIndex()
+
+    def test_trigrams_split_words_like_pg_trgm(self):
+        self.assertEqual({"  i", " id", "id "}, trigrams("ID"))
+        self.assertEqual(trigrams("customer id"), trigrams("customer_id"))
+
+    def test_exact_prefix_and_fuzzy_matches_are_ranked(self):
+        hits = self.index.search("customer", kind=TABLE)
+        # Exact name first, then prefix.
+        self.assertEqual([("database2", "customer"), ("database1", "customers")],
+                         [(hit.database_name, hit.table_name) for hit in hits])
+
+        hits = self.index.search("custmer_nme", kind=COLUMN)
+        self.assertEqual(("customers", "customer_name", "text"), (hits[0].table_name, hits[0].column_name, hits[0].data_type))
+
+    def test_substring_of_snake_case_name(self):
+        hits = self.index.search("id", kind=COLUMN, database_name="database1")
+        self.assertEqual([("customers", "id"), ("orders", "id"), ("orders", "customer_id")],
+                         [(hit.table_name, hit.column_name) for hit in hits])
+
+    def test_data_type_matches_rank_below_names(self):
+        hits = self.index.search("jsonb")
+        self.assertEqual([("customer", "payload")], [(hit.table_name, hit.column_name) for hit in hits])
+
+        hits = self.index.search("integer", limit=2)
+        self.assertEqual(2, len(hits))
+        self.assertTrue(all(hit.data_type == "integer" for hit in hits))
+
+    def test_segments_are_built_once_and_dropped_on_invalidate(self):
+        self.index.search("orders")
+        self.index.search("orders")
+        self.assertEqual([[1, 2]], self.loaded)
+
+        self.trees[2] = make_tree(2, {"orders_archive": []})
+        self.index.invalidate(2)
+        hits = self.index.search("orders", kind=TABLE)
+        self.assertEqual([[1, 2], [2]], self.loaded)
+        self.assertEqual(["orders", "orders_archive"], [hit.table_name for hit in hits])
+
+    def test_terms_of_dropped_segments_leave_vocabulary(self):
+        self.index.search("payload")
+        self.assertIn((1, "payload"), self.index._vocabulary.refs)
+
+        self.trees[2] = make_tree(2, {"customer": [("id", "bigint")]})
+        self.index.invalidate(2)
+        self.assertNotIn((1, "payload"), self.index._vocabulary.refs)
+        self.assertEqual([], self.index.search("payload"))
+        # "id" is still used by database1.
+        self.assertEqual(2, self.index._vocabulary.refs[(1, "id")])
+
+    def test_segments_are_evicted_over_max_items(self):
+        # database1 has 8 entries, database2 has 3.
+        index = MetadataSearchIndex(max_items=10)
+        index.search("orders", database_name="database1")
+        index.search("payload", database_name="database2")
+        self.assertEqual([2], list(index._segments))
+        self.assertNotIn((0, "orders"), index._vocabulary.refs)
+
+        # Too big to keep: found, but built again every time.
+        small = MetadataSearchIndex(max_items=5)
+        self.assertEqual(["orders"], [hit.table_name for hit in small.search("orders", kind=TABLE, database_name="database1")])
+        small.search("orders", database_name="database1")
+        self.assertEqual({}, small._segments)
+        self.assertEqual({}, small._vocabulary.refs)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import time
+import unittest
+import psycopg2
+from psycopg2 import pool
+
+from tests.conf.configure import config
+
+from manager.schemas.metadata import Credential
+from manager.services.metadata_db.target_pool import TargetPoolRegistry
+
+
+class TargetPoolRegistryTestCase(unittest.TestCase):
+    """Test database is used as target database."""
+
+    def setUp(self):
+        self.creds = Credential(id=1, database_id=1, host_ipv4=config.host, port=config.port,
+                                username=config.user, password=config.password)
+        self.registry = TargetPoolRegistry(max_per_database=2, max_total=2, idle_timeout=60,
+                                           checkout_timeout=0.1, ping_after=60)
+        self.addCleanup(self.registry.close_all)
+
+    def _backend_pid(self, database_name=config.dbname, creds=None):
+        with self.registry.connection(database_name, creds or self.creds) as conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_backend_pid();")
+            return cur.fetchone()[0]
+
+    def test_connection_is_reused(self):
+        self.assertEqual(self._backend_pid(), self._backend_pid())
+        self.assertEqual({config.dbname: {"in_use": 0, "idle": 1}}, self.registry.stats())
+
+    def test_pool_is_bounded(self):
+        with self.registry.connection(config.dbname, self.creds), self.registry.connection(config.dbname, self.creds):
+            with self.assertRaises(pool.PoolError):
+                with self.registry.connection(config.dbname, self.creds):
+                    pass
+
+    def test_total_budget_closes_idle_connections_of_other_targets(self):
+        self._backend_pid()
+        self._backend_pid()
+        with self.registry.connection(config.dbname, self.creds), self.registry.connection(config.dbname, self.creds):
+            pass
+        # Two idle connections to test database take whole budget.
+        self._backend_pid("postgres")
+        self.assertEqual({config.dbname: {"in_use": 0, "idle": 1}, "postgres": {"in_use": 0, "idle": 1}},
+                         self.registry.stats())
+
+    def test_credentials_change_drops_pool(self):
+        pid = self._backend_pid()
+        changed = self.creds.model_copy(update={"host_ipv4": "127.0.0.1"})
+        self.assertNotEqual(pid, self._backend_pid(creds=changed))
+        self.assertEqual({config.dbname: {"in_use": 0, "idle": 1}}, self.registry.stats())
+
+    def test_idle_connections_expire(self):
+        self.registry.idle_timeout = 0
+        pid = self._backend_pid()
+        time.sleep(0.01)
+        self.assertNotEqual(pid, self._backend_pid())
+
+    def test_broken_connection_is_replaced_on_checkout(self):
+        self.registry.ping_after = 0
+        pid = self._backend_pid()
+        with psycopg2.connect(host=config.host, port=config.port, user=config.user,
+                              password=config.password, dbname=config.dbname) as conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_terminate_backend(%s);", (pid,))
+        time.sleep(0.1)
+        self.assertNotEqual(pid, self._backend_pid())
+
+    def test_failed_query_returns_connection(self):
+        with self.assertRaises(psycopg2.Error):
+            with self.registry.connection(config.dbname, self.creds) as conn, conn.cursor() as cur:
+                cur.execute("SELECT * FROM no_such_table;")
+        self.assertEqual({config.dbname: {"in_use": 0, "idle": 1}}, self.registry.stats())
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
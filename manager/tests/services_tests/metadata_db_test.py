@@ -1,129 +1,31 @@
 import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from psycopg2 import errors
 from psycopg2.extras import RealDictCursor
 
 from tests.conf.configure import config
+from tests.conf.schema import drop_schema, reset_schema
 
 from manager.services.metadata_db.pool import init_pool, get_pool
-from manager.services.metadata_db.tx import tx
+from manager.services.metadata_db.tx import _configure, pinned, tx
 
 
 class MetadataDBServiceTestCase(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        dsn = f"postgresql://{config.user}:{config.password}@{config.host}:{config.port}/{config.dbname}"
+        cls.dsn = dsn = f"postgresql://{config.user}:{config.password}@{config.host}:{config.port}/{config.dbname}"
         init_pool(dsn)
 
-        schema_sql = """--sql
-            -- =======================
-            -- DROP EXISTING TABLES (если уже есть)
-            -- =======================
-            DROP TABLE IF EXISTS
-                credentials,
-                foreign_key_columns,
-                foreign_keys,
-                primary_key_columns,
-                primary_keys,
-                columns,
-                tables,
-                databases
-            CASCADE;
-
-            -- =======================
-            -- DATABASES
-            -- =======================
-            CREATE TABLE databases (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(255) NOT NULL
-            );
-
-            -- =======================
-            -- TABLES
-            -- =======================
-            CREATE TABLE tables (
-                id SERIAL PRIMARY KEY,
-                database_id INT NOT NULL REFERENCES databases(id) ON DELETE CASCADE,
-                name VARCHAR(255) NOT NULL
-            );
-
-            -- =======================
-            -- COLUMNS
-            -- =======================
-            CREATE TABLE columns (
-                id SERIAL PRIMARY KEY,
-                table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE,
-                name VARCHAR(255) NOT NULL,
-                data_type VARCHAR(50) NOT NULL
-            );
-
-            -- =======================
-            -- PRIMARY KEYS
-            -- =======================
-            CREATE TABLE primary_keys (
-                id SERIAL PRIMARY KEY,
-                table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE
-            );
-
-            CREATE TABLE primary_key_columns (
-                pk_id INT NOT NULL REFERENCES primary_keys(id) ON DELETE CASCADE,
-                column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE,
-                ordinal_position INT NOT NULL,                  -- порядок колонки внутри PK
-                PRIMARY KEY (pk_id, ordinal_position),
-                UNIQUE (pk_id, column_id)
-            );
-
-            -- =======================
-            -- FOREIGN KEYS
-            -- =======================
-            CREATE TABLE foreign_keys (
-                id SERIAL PRIMARY KEY,
-                table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE,            -- таблица-источник
-                referenced_table_id INT NOT NULL REFERENCES tables(id) ON DELETE CASCADE  -- таблица-цель
-            );
-
-            CREATE TABLE foreign_key_columns (
-                fk_id INT NOT NULL REFERENCES foreign_keys(id) ON DELETE CASCADE,
-                column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE,            -- колонка-источник
-                referenced_column_id INT NOT NULL REFERENCES columns(id) ON DELETE CASCADE, -- колонка-цель
-                ordinal_position INT NOT NULL,                                              -- порядок в составе FK
-                PRIMARY KEY (fk_id, ordinal_position),
-                UNIQUE (fk_id, column_id, referenced_column_id)
-            );
-
-            -- =======================
-            -- CREDENTIALS
-            -- =======================
-            CREATE TABLE credentials (
-                id SERIAL PRIMARY KEY,
-                database_id INT NOT NULL REFERENCES databases(id) ON DELETE CASCADE,
-                host_ipv4 VARCHAR(255) NOT NULL,
-                port INT NOT NULL CHECK (port > 0 AND port <= 65535),
-                username VARCHAR(255) NOT NULL,
-                password VARCHAR(255) NOT NULL
-            );
-        """
-
-        with tx() as conn:
-            with conn.cursor() as cur:
-                cur.execute(schema_sql)
+        # Setting up database: same migrations as on startup.
+        reset_schema(dsn)
 
     @classmethod
     def tearDownClass(cls):
         # Drop everything created by tests and close the pool
-        drop_sql = """--sql
-            DROP TABLE IF EXISTS
-                credentials,
-                foreign_key_columns,
-                foreign_keys,
-                primary_key_columns,
-                primary_keys,
-                columns,
-                tables,
-                databases
-            CASCADE;
-        """
         try:
-            with tx() as conn, conn.cursor() as cur:
-                cur.execute(drop_sql)
+            drop_schema(cls.dsn)
         finally:
             # Ensure all connections are returned to the pool and the pool is closed
             get_pool().closeall()
@@ -148,6 +50,47 @@ class MetadataDBServiceTestCase(unittest.TestCase):
 
         self.assertEqual(["database1"], values)
 
+    def test_readonly_tx_runs_in_autocommit(self):
+        with tx(readonly=True) as conn, conn.cursor() as cur:
+            self.assertTrue(conn.autocommit)
+            with self.assertRaises(errors.ReadOnlySqlTransaction):
+                cur.execute("INSERT INTO databases(name) VALUES ('readonly');")
+
+        with tx(readonly=True, autocommit=False) as conn:
+            self.assertFalse(conn.autocommit)
+        # Read-only transaction is ended, not left open in the pool.
+        self.assertEqual(0, conn.get_transaction_status())
+
+    def test_session_is_switched_only_when_it_differs(self):
+        conn = SimpleNamespace(autocommit=True, readonly=True, set_session=mock.Mock())
+        _configure(conn, readonly=True, autocommit=True)
+        conn.set_session.assert_not_called()
+        _configure(conn, readonly=False, autocommit=False)
+        conn.set_session.assert_called_once_with(readonly=False, autocommit=False)
+
+    def test_pinned_connection_shares_transaction(self):
+        try:
+            with pinned() as pinned_conn:
+                with tx() as conn, conn.cursor() as cur:
+                    self.assertIs(pinned_conn, conn)
+                    cur.execute("INSERT INTO databases(name) VALUES ('pinned');")
+                # Not committed yet, but visible to the next repo call of the block.
+                with tx(readonly=True) as conn, conn.cursor() as cur:
+                    cur.execute("SELECT count(*) FROM databases WHERE name = 'pinned';")
+                    self.assertEqual(1, cur.fetchone()[0])
+                raise RuntimeError("force rollback")
+        except RuntimeError:
+            pass
+
+        with tx(readonly=True) as conn, conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM databases WHERE name = 'pinned';")
+            self.assertEqual(0, cur.fetchone()[0])
+
+        with pinned(readonly=True):
+            with self.assertRaises(RuntimeError):
+                with tx():
+                    pass
+
     def test_connection_reuse_from_pool(self):
         pool = get_pool()
         conn1 = pool.getconn()
@@ -0,0 +1,196 @@
+import unittest
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from tests.conf.configure import config
+from tests.conf.schema import drop_schema, reset_schema
+
+from manager.services.metadata_db.pool import init_pool, get_pool
+from manager.services.metadata_db.tx import tx
+from manager.services.metadata_db.writer import fill_metadata_batch, fill_metadata_from_dsn, resync_database, save_queries, sync_metadata_from_dsn
+
+
+class MetadataDBServiceWriterTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dsn = f"postgresql://{config.user}:{config.password}@{config.host}:{config.port}/{config.dbname}"
+        init_pool(cls.dsn)
+
+        # Setting up database: same migrations as on startup.
+        reset_schema(cls.dsn)
+
+    @classmethod
+    def tearDownClass(cls):
+        # Drop everything created by tests and close the pool
+        try:
+            drop_schema(cls.dsn)
+        finally:
+            # Ensure all connections are returned to the pool and the pool is closed
+            get_pool().closeall()
+
+    def _fetch_all(self, sql, params=()):
+        with tx(readonly=True) as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def test_fill_writes_every_level(self):
+        # Metadata database describes itself: its own tables are the source catalog.
+        fill_metadata_from_dsn(self.dsn)
+
+        tables = {r["name"] for r in self._fetch_all("SELECT name FROM tables;")}
+        self.assertTrue({"databases", "tables", "columns", "primary_keys", "primary_key_columns",
+                         "foreign_keys", "foreign_key_columns", "credentials"}.issubset(tables))
+
+        self.assertEqual(
+            [{"name": "id", "data_type": "integer"},
+             {"name": "table_id", "data_type": "integer"},
+             {"name": "name", "data_type": "character varying(255)"},
+             {"name": "data_type", "data_type": "character varying(50)"}],
+            self._fetch_all("""--sql
+                SELECT c.name, c.data_type
+                FROM columns AS c JOIN tables AS t ON t.id = c.table_id
+                WHERE t.name = 'columns'
+                ORDER BY c.id;
+            """))
+
+        # Composite primary key keeps column order.
+        self.assertEqual(
+            [{"name": "pk_id", "ordinal_position": 1}, {"name": "ordinal_position", "ordinal_position": 2}],
+            self._fetch_all("""--sql
+                SELECT c.name, pkc.ordinal_position
+                FROM primary_key_columns AS pkc
+                JOIN primary_keys AS pk ON pk.id = pkc.pk_id
+                JOIN tables AS t ON t.id = pk.table_id
+                JOIN columns AS c ON c.id = pkc.column_id
+                WHERE t.name = 'primary_key_columns'
+                ORDER BY pkc.ordinal_position;
+            """))
+
+        # Each foreign key points to the right table and column.
+        self.assertEqual(
+            [{"src_column": "table_id", "ref_table": "tables", "ref_column": "id"}],
+            self._fetch_all("""--sql
+                SELECT sc.name AS src_column, rt.name AS ref_table, rc.name AS ref_column
+                FROM foreign_keys AS fk
+                JOIN tables AS t ON t.id = fk.table_id
+                JOIN tables AS rt ON rt.id = fk.referenced_table_id
+                JOIN foreign_key_columns AS fkc ON fkc.fk_id = fk.id
+                JOIN columns AS sc ON sc.id = fkc.column_id
+                JOIN columns AS rc ON rc.id = fkc.referenced_column_id
+                WHERE t.name = 'columns';
+            """))
+        # foreign_key_columns -> foreign_keys, columns (twice).
+        self.assertEqual(3, len(self._fetch_all("""--sql
+            SELECT fk.id FROM foreign_keys AS fk
+            JOIN tables AS t ON t.id = fk.table_id
+            WHERE t.name = 'foreign_key_columns';
+        """)))
+
+    def _exec_sql(self, sql):
+        """Change the source catalog (metadata database describes itself)."""
+        with psycopg2.connect(self.dsn) as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+            conn.commit()
+
+    def test_fill_keeps_tables_of_every_schema(self):
+        self._exec_sql("""--sql
+            DROP SCHEMA IF EXISTS archive CASCADE;
+            DROP TABLE IF EXISTS public.orders;
+            CREATE SCHEMA archive;
+            CREATE TABLE public.orders (id SERIAL PRIMARY KEY, total NUMERIC);
+            CREATE TABLE archive.orders (id SERIAL PRIMARY KEY, closed_at TIMESTAMP);
+            CREATE TABLE archive.notes (id SERIAL PRIMARY KEY, order_id INT REFERENCES archive.orders(id));
+        """)
+        self.addCleanup(self._exec_sql, "DROP SCHEMA IF EXISTS archive CASCADE; DROP TABLE IF EXISTS public.orders;")
+
+        sync_metadata_from_dsn(self.dsn)
+
+        columns = self._fetch_all("""--sql
+            SELECT t.schema_name, c.name FROM columns AS c JOIN tables AS t ON t.id = c.table_id
+            WHERE t.name = 'orders' ORDER BY t.schema_name, c.id;
+        """)
+        self.assertEqual([("archive", "id"), ("archive", "closed_at"), ("public", "id"), ("public", "total")],
+                         [(r["schema_name"], r["name"]) for r in columns])
+
+        # FK points to the table of its own schema, not to the one with the same name.
+        referenced = self._fetch_all("""--sql
+            SELECT rt.schema_name FROM foreign_keys AS fk
+            JOIN tables AS t ON t.id = fk.table_id
+            JOIN tables AS rt ON rt.id = fk.referenced_table_id
+            WHERE t.schema_name = 'archive' AND t.name = 'notes';
+        """)
+        self.assertEqual(["archive"], [r["schema_name"] for r in referenced])
+
+        # Unchanged second pass: nothing is mixed up between schemas.
+        result = sync_metadata_from_dsn(self.dsn)
+        self.assertEqual((0, 0, 0), (result.tables_inserted, result.tables_updated, result.tables_deleted))
+
+    def test_fill_batch_reports_each_source(self):
+        bad_dsn = f"postgresql://{config.user}:{config.password}@{config.host}:1/{config.dbname}"
+        outcomes = fill_metadata_batch([self.dsn, bad_dsn, self.dsn], workers=3)
+
+        self.assertEqual([self.dsn, bad_dsn, self.dsn], [o.dsn for o in outcomes])
+        self.assertEqual([True, False, True], [o.error is None for o in outcomes])
+        self.assertIsNone(outcomes[1].result)
+        self.assertTrue(all(o.seconds >= 0 for o in outcomes))
+        # Same source filled twice at once still gives one database row.
+        self.assertEqual(1, len(self._fetch_all("SELECT id FROM databases WHERE name = %s;", (config.dbname,))))
+
+    def test_save_queries_keeps_execution_time(self):
+        fill_metadata_from_dsn(self.dsn)
+        database_id = self._fetch_all("SELECT id FROM databases WHERE name = %s;", (config.dbname,))[0]["id"]
+
+        # One INSERT for the whole batch; older entries get earlier created_at.
+        save_queries([(database_id, "SELECT 'batch' AS a", 60.0), (database_id, "SELECT 'batch' AS b", 0.0)])
+        rows = self._fetch_all("""--sql
+            SELECT sql_query, created_at FROM saved_queries WHERE sql_query LIKE %s ORDER BY id;
+            """, ("%'batch'%",))
+        self.assertEqual(["SELECT 'batch' AS a", "SELECT 'batch' AS b"], [r["sql_query"] for r in rows])
+        self.assertGreaterEqual((rows[1]["created_at"] - rows[0]["created_at"]).total_seconds(), 59)
+
+    def test_resync_applies_only_changes(self):
+        self._exec_sql("DROP TABLE IF EXISTS resync_probe;")
+        sync_metadata_from_dsn(self.dsn)
+
+        # Nothing changed: same database row, nothing rewritten.
+        result = sync_metadata_from_dsn(self.dsn)
+        self.assertFalse(result.created)
+        self.assertEqual((0, 0, 0), (result.tables_inserted, result.tables_updated, result.tables_deleted))
+        self.assertEqual(1, len(self._fetch_all("SELECT id FROM databases WHERE name = %s;", (config.dbname,))))
+
+        self._exec_sql("CREATE TABLE resync_probe (id SERIAL PRIMARY KEY, title TEXT);")
+        result = resync_database(config.dbname)
+        self.assertEqual((1, 0, 0), (result.tables_inserted, result.tables_updated, result.tables_deleted))
+
+        title_id = self._fetch_all("""--sql
+            SELECT c.id FROM columns AS c JOIN tables AS t ON t.id = c.table_id
+            WHERE t.name = 'resync_probe' AND c.name = 'title';
+        """)[0]["id"]
+
+        self._exec_sql("ALTER TABLE resync_probe ADD COLUMN amount NUMERIC(10, 2), ALTER COLUMN title TYPE VARCHAR(20);")
+        result = resync_database(config.dbname)
+        self.assertEqual((0, 1, 0), (result.tables_inserted, result.tables_updated, result.tables_deleted))
+
+        # Existing column keeps its id, type is updated in place.
+        self.assertEqual(
+            {"id": title_id, "name": "title", "data_type": "character varying(20)"},
+            self._fetch_all("""--sql
+                SELECT c.id, c.name, c.data_type FROM columns AS c JOIN tables AS t ON t.id = c.table_id
+                WHERE t.name = 'resync_probe' AND c.name = 'title';
+            """)[0])
+        self.assertEqual(
+            ["id", "title", "amount"],
+            [r["name"] for r in self._fetch_all("""--sql
+                SELECT c.name FROM columns AS c JOIN tables AS t ON t.id = c.table_id
+                WHERE t.name = 'resync_probe' ORDER BY c.id;
+            """)])
+
+        self._exec_sql("DROP TABLE resync_probe;")
+        result = resync_database(config.dbname)
+        self.assertEqual((0, 0, 1), (result.tables_inserted, result.tables_updated, result.tables_deleted))
+        self.assertEqual([], self._fetch_all("SELECT id FROM tables WHERE name = 'resync_probe';"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)